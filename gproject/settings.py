@@ -3,8 +3,11 @@ Django settings for gproject project.
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 from django.contrib import messages
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import dj_database_url
 
@@ -46,7 +49,8 @@ INSTALLED_APPS = [
     'authcart',
 
     'widget_tweaks',
-    'cloudinary',
+    # The storage backend imports the cloudinary SDK on first use; its own
+    # 'cloudinary' app (template tags, model field) isn't used here
     'cloudinary_storage',
 ]
 
@@ -54,6 +58,10 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'gprojectapp.middleware.MetricsMiddleware',
+    'gprojectapp.middleware.SamplingProfilerMiddleware',
+    'gprojectapp.middleware.RateLimitMiddleware',
+    'gprojectapp.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +87,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'gprojectapp.context_processors.categories_processor',
                 'gprojectapp.context_processors.mega_menu',
+                'gprojectapp.context_processors.cart',
             ],
         },
     },
@@ -105,6 +114,76 @@ else:
         }
     }
 
+# Read replicas: comma-separated DATABASE_REPLICA_URLS in production. Locally,
+# point SQLITE_REPLICA at a copy of db.sqlite3 (re-copy it to "replicate").
+if ENVIRONMENT == 'production':
+    replica_configs = [
+        dj_database_url.parse(url.strip(), conn_max_age=600, ssl_require=True)
+        for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+    ]
+elif os.getenv('SQLITE_REPLICA'):
+    replica_configs = [{
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, os.getenv('SQLITE_REPLICA')),
+    }]
+else:
+    replica_configs = []
+
+for i, config in enumerate(replica_configs, start=1):
+    # Tests run against the primary only
+    config['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{i}'] = config
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+# `manage.py test` also gets a "replica" alias mirroring the test database,
+# for the router tests (they route to it by overriding REPLICA_DATABASES)
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['gprojectapp.routers.PrimaryReplicaRouter']
+# How long a visitor's reads stay on the primary after they write
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+REPLICA_PIN_COOKIE = 'db_primary_until'
+
+# ---------------- CACHE ----------------
+# The cache must be shared by every process: the catalog version, page cache,
+# menu and suggest memos, rate-limit buckets and single-flight locks all live
+# in it, and gunicorn runs several workers next to the Procfile workers. A
+# per-process LocMemCache would keep the other workers serving old pages
+# after a catalog edit, so production refuses to start without Redis, and
+# development falls back to files shared by the processes on this machine.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif ENVIRONMENT == 'production':
+    raise ImproperlyConfigured("REDIS_URL must be set in production: every process has to share one cache.")
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get("CACHE_DIR", os.path.join(tempfile.gettempdir(), "gproject-cache")),
+            'OPTIONS': {'MAX_ENTRIES': 10_000},
+        }
+    }
+
+# Anonymous catalog pages (index, product list, about, ...)
+PAGE_CACHE_TIMEOUT = int(os.environ.get("PAGE_CACHE_TIMEOUT", 60 * 15))
+
+# Token-bucket rate limits (see gprojectapp/ratelimit.py):
+# scope -> (requests, per seconds, burst)
+RATE_LIMITS = {
+    "global": (20, 1, 100),  # every request, per IP (RateLimitMiddleware)
+    "cart": (2, 1, 20),      # cart changes, per user or IP
+    "track": (30, 60, 10),   # order tracking polls, per user
+}
+# Proxies in front of the app that append to X-Forwarded-For (Railway's router in production)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 1 if ENVIRONMENT == "production" else 0))
+
 # ---------------- EMAIL ----------------
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
@@ -118,12 +197,83 @@ EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# Built by gprojectapp.staticfiles.OptimizedStaticFilesStorage during collectstatic
+STATIC_BUNDLES = {
+    "assets/bundle/site.css": [
+        "assets/vendor/bootstrap/css/bootstrap.min.css",
+        "assets/vendor/bootstrap-icons/bootstrap-icons.css",
+        "assets/vendor/aos/aos.css",
+        "assets/vendor/glightbox/css/glightbox.min.css",
+        "assets/vendor/swiper/swiper-bundle.min.css",
+        "assets/css/main.css",
+    ],
+    "assets/bundle/site.js": [
+        "assets/vendor/bootstrap/js/bootstrap.bundle.min.js",
+        "assets/vendor/aos/aos.js",
+        "assets/vendor/glightbox/js/glightbox.min.js",
+        "assets/vendor/swiper/swiper-bundle.min.js",
+        "assets/js/main.js",
+    ],
+}
+STATIC_WEBP_MIN_SIZE = 100 * 1024
+STATIC_WEBP_MAX_WIDTH = 1920
 
 # ---------------- MEDIA ----------------
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Chunked review media uploads (see gprojectapp/uploads.py); chunks are kept
+# in the database until the process_uploads worker stores the file
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+REVIEW_UPLOAD_MAX_SIZE = {
+    "image": 10 * 1024 * 1024,
+    "video": 250 * 1024 * 1024,
+}
+
+# Files handed between process types (catalog import sources, order exports): the
+# "private" storage below, shared by every container through Cloudinary.
+# Without Cloudinary (development) they stay in this directory.
+PRIVATE_FILES_DIR = os.environ.get("PRIVATE_FILES_DIR", os.path.join(tempfile.gettempdir(), "gproject-private"))
+
+# Bulk catalog imports (see gprojectapp/catalog_import.py)
+CATALOG_IMPORT_CHUNK_SIZE = 1000
+
+# Order exports (see gprojectapp/exports.py); bigger ranges are written by the worker
+ORDER_EXPORT_CHUNK_SIZE = 2000
+ORDER_EXPORT_STREAM_MAX_ROWS = 200_000
+
+# "Frequently bought together" (see gprojectapp/recommendations.py)
+RECOMMENDATIONS_TOP_K = 12
+RECOMMENDATIONS_MIN_SUPPORT = 2
+RECOMMENDATIONS_CACHE_TIMEOUT = 60 * 60
+
+# Offline pincode lookup for checkout (see gprojectapp/pincodes.py). The
+# source CSV can be swapped for the full India Post directory.
+PINCODE_SOURCE = os.environ.get("PINCODE_SOURCE", str(BASE_DIR / "gprojectapp" / "data" / "pincodes.csv"))
+PINCODE_INDEX_PATH = os.environ.get("PINCODE_INDEX_PATH", os.path.join(tempfile.gettempdir(), "gproject-pincodes.idx"))
+SHIP_FROM_PINCODE = os.environ.get("SHIP_FROM_PINCODE", "201301")
+# Reject pincodes missing from the index (only sensible with the full directory)
+PINCODE_REQUIRE_KNOWN = os.environ.get("PINCODE_REQUIRE_KNOWN") == "on"
+
+# Sharded sitemaps (see gprojectapp/sitemaps.py), written by the web process
+SITE_URL = os.environ.get("SITE_URL", f"https://{RAILWAY_HOST}" if RAILWAY_HOST else "http://localhost:8000")
+SITEMAP_DIR = os.environ.get("SITEMAP_DIR", os.path.join(tempfile.gettempdir(), "gproject-sitemaps"))
+SITEMAP_SHARD_SIZE = 50_000
+
+# Prometheus metrics served at /metrics (see gprojectapp/metrics.py); each
+# process keeps its counters in a file here
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "gproject-metrics"))
+
+# Sampling request profiler (see gprojectapp/profiling.py). Off unless
+# REQUEST_PROFILER=on; staff can then force a profile with the signed header
+# shown on /monitoring/profiles/.
+PROFILER_ENABLED = os.environ.get("REQUEST_PROFILER") == "on"
+PROFILER_SAMPLE_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", 0.01))
+PROFILER_INTERVAL = 0.005  # seconds between stack samples
+PROFILER_HEADER = "X-Profile-Token"
+PROFILER_DIR = os.environ.get("PROFILER_DIR", os.path.join(tempfile.gettempdir(), "gproject-profiles"))
+
 # ---------------- CLOUDINARY ----------------
 CLOUDINARY_STORAGE = {
     "CLOUD_NAME": os.environ.get("CLOUD_NAME"),
@@ -133,6 +283,37 @@ CLOUDINARY_STORAGE = {
 
 DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
 
+# Django 5.x only reads storage backends from STORAGES
+STORAGES = {
+    "default": {
+        # Memoizes media URLs over content-addressed, deduplicated files
+        # (see gprojectapp/storage.py)
+        "BACKEND": "gprojectapp.storage.CachedURLStorage",
+        "OPTIONS": {
+            "backend": "gprojectapp.storage.DedupStorage",
+            "options": {
+                "backend": DEFAULT_FILE_STORAGE if CLOUDINARY_STORAGE["CLOUD_NAME"] else "django.core.files.storage.FileSystemStorage",
+            },
+        },
+    },
+    # Uploaded on the web process, read by the Procfile workers (and the
+    # other way round), so never a container's local disk in production.
+    # Also keeps the recommendation job's co-occurrence snapshot between runs.
+    # Order exports hold customer PII: on Cloudinary they use the
+    # "authenticated" delivery type and are only ever read through Django.
+    "private": {
+        # Built on first use, so the cloudinary SDK stays out of startup
+        "BACKEND": "gprojectapp.storage.WrappedStorage",
+        "OPTIONS": {
+            "backend": "gprojectapp.private_storage.AuthenticatedCloudinaryStorage" if CLOUDINARY_STORAGE["CLOUD_NAME"] else "django.core.files.storage.FileSystemStorage",
+            "options": {} if CLOUDINARY_STORAGE["CLOUD_NAME"] else {"location": PRIVATE_FILES_DIR},
+        },
+    },
+    "staticfiles": {
+        "BACKEND": "gprojectapp.staticfiles.OptimizedStaticFilesStorage",
+    },
+}
+
 # ---------------- AUTH ----------------
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "/"
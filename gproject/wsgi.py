@@ -17,3 +17,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gproject.settings')
 
 application = get_wsgi_application()
+
+# URL resolver, templates, menu and search suggest index before the first
+# request. Under gunicorn's preload_app this runs once in the master and the
+# workers inherit it (see gunicorn.conf.py).
+from django.db import connections  # noqa: E402
+from gprojectapp.warmup import warm_up  # noqa: E402
+
+warm_up()
+# Workers must not share the master's database sockets
+connections.close_all()
@@ -1,10 +1,16 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import FileResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.utils.html import format_html
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
 from django.urls import path, reverse
+from django.conf import settings
 from .models import (
     Contact, Product, Order, UserProfile, Review, Banner,
-    Category, SubCategory, Specification, Color, MegaMenu
+    Category, SubCategory, Specification, Color, MegaMenu, CatalogImport, OrderExport, Promotion
+)
+from .exports import (
+    EXPORT_FORMATS, clean_export_filters, export_queryset, export_lines, encode_stream, export_filename
 )
 
 
@@ -63,9 +69,9 @@ class SubCategoryAdmin(admin.ModelAdmin):
 # -------------------------
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("name", "price", "category", "subcategory", "show_image")
+    list_display = ("name", "sku", "price", "category", "subcategory", "show_image")
     list_filter = ("category", "subcategory", "price")
-    search_fields = ("name", "category__name", "subcategory__name")
+    search_fields = ("name", "sku", "category__name", "subcategory__name")
     list_editable = ("price",)
     ordering = ("-id",)
 
@@ -76,6 +82,56 @@ class ProductAdmin(admin.ModelAdmin):
     show_image.short_description = "Preview"
 
 
+# -------------------------
+# Promotion Admin
+# -------------------------
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ("name", "kind", "value", "scope", "target", "min_cart_total", "starts_at", "ends_at", "is_active")
+    list_filter = ("is_active", "kind", "scope")
+    search_fields = ("name", "brand", "product__name", "category__name", "subcategory__name")
+    list_editable = ("is_active",)
+    raw_id_fields = ("product",)
+    fieldsets = (
+        (None, {"fields": ("name", "kind", "value", "is_active")}),
+        ("Applies to", {"fields": ("scope", "product", "category", "subcategory", "brand", "min_cart_total")}),
+        ("Validity", {"fields": ("starts_at", "ends_at")}),
+    )
+
+
+# -------------------------
+# Catalog Import (bulk CSV / JSONL upload)
+# -------------------------
+@admin.register(CatalogImport)
+class CatalogImportAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "status", "rows_done", "created_count", "updated_count", "error_count", "uploaded_by", "created_at")
+    list_filter = ("status",)
+    readonly_fields = ("status", "rows_done", "created_count", "updated_count", "error_count", "errors", "uploaded_by", "created_at", "updated_at")
+    actions = ["requeue"]
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ("file",)
+        return ("file",) + self.readonly_fields
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ()
+        return ("file",) + self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.uploaded_by = request.user
+        super().save_model(request, obj, form, change)
+        if not change:
+            self.message_user(request, "Import queued. The import worker will pick it up shortly; refresh to see progress.")
+
+    @admin.action(description="Re-queue (resumes after the last committed chunk)")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status="done").update(status="pending")
+        self.message_user(request, f"{count} import(s) queued again.")
+
+
 # -------------------------
 # Order Admin (with action buttons)
 # -------------------------
@@ -89,6 +145,8 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ("status", "payment_status", "payment_method", "order_date")
     search_fields = ("user__username", "product__name", "phone", "address", "id")
     ordering = ("-order_date",)
+    actions = ["export_selected"]
+    change_list_template = "admin/gprojectapp/order/change_list.html"
 
     readonly_fields = (
         "pending_at", "processing_at", "dispatched_at",
@@ -97,7 +155,7 @@ class OrderAdmin(admin.ModelAdmin):
 
     fieldsets = (
         ("Customer Info", {"fields": ("user", "phone", "address")}),
-        ("Order Details", {"fields": ("product", "quantity", "total_price", "payment_method")}),
+        ("Order Details", {"fields": ("product", "quantity", "total_price", "discount", "promotion", "payment_method")}),
         ("Status & Payment", {"fields": ("status", "payment_status")}),
         ("Tracking", {"fields": ("courier_name", "expected_delivery")}),
         ("Timeline (Auto)", {"fields": (
@@ -131,32 +189,72 @@ class OrderAdmin(admin.ModelAdmin):
             path("mark-shipped/<int:order_id>/", self.admin_site.admin_view(self.mark_shipped), name="mark_shipped"),
             path("mark-delivered/<int:order_id>/", self.admin_site.admin_view(self.mark_delivered), name="mark_delivered"),
             path("mark-cancelled/<int:order_id>/", self.admin_site.admin_view(self.mark_cancelled), name="mark_cancelled"),
+            path("export/", self.admin_site.admin_view(self.export_orders), name="gprojectapp_order_export"),
         ]
         return custom_urls + urls
 
+    # Export (streamed, or handed to the worker for very large ranges)
+    def export_orders(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get("format", "csv")
+        compress = request.GET.get("gzip") == "1"
+        if fmt not in EXPORT_FORMATS:
+            return HttpResponseBadRequest("Unknown export format.")
+        try:
+            filters = clean_export_filters(request.GET)
+        except ValidationError as e:
+            return HttpResponseBadRequest(e.messages[0])
+
+        queryset = export_queryset(filters)
+        if request.GET.get("background") == "1" or queryset.count() > settings.ORDER_EXPORT_STREAM_MAX_ROWS:
+            OrderExport.objects.create(format=fmt, compress=compress, filters=filters, requested_by=request.user)
+            self.message_user(request, "This export is large, so it is being prepared in the background. Download it here when it is done.")
+            return redirect(reverse("admin:gprojectapp_orderexport_changelist"))
+
+        return self.stream_export(queryset, fmt, compress)
+
+    @admin.action(description="Export selected orders (CSV)")
+    def export_selected(self, request, queryset):
+        return self.stream_export(export_queryset({}).filter(pk__in=queryset.values("pk")), "csv", False)
+
+    def stream_export(self, queryset, fmt, compress):
+        response = StreamingHttpResponse(
+            encode_stream(export_lines(queryset, fmt), compress),
+            content_type="application/gzip" if compress else f"{EXPORT_FORMATS[fmt]}; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{export_filename(fmt, compress)}"'
+        return response
+
     # Actions
+    def update_status(self, order_id, status):
+        # A real save, so the timeline field is stamped and the change feed gets its event
+        order = get_object_or_404(Order, pk=order_id)
+        order.status = status
+        order.save(update_fields=["status"])
+
     def mark_processing(self, request, order_id):
-        Order.objects.filter(pk=order_id).update(status="Processing")
+        self.update_status(order_id, "Processing")
         self.message_user(request, f"Order {order_id} marked as Processing ⚙️")
         return redirect(reverse("admin:gprojectapp_order_changelist"))
 
     def mark_dispatched(self, request, order_id):
-        Order.objects.filter(pk=order_id).update(status="Dispatched")
+        self.update_status(order_id, "Dispatched")
         self.message_user(request, f"Order {order_id} marked as Dispatched 📦")
         return redirect(reverse("admin:gprojectapp_order_changelist"))
 
     def mark_shipped(self, request, order_id):
-        Order.objects.filter(pk=order_id).update(status="Shipped")
+        self.update_status(order_id, "Shipped")
         self.message_user(request, f"Order {order_id} marked as Shipped 🚚")
         return redirect(reverse("admin:gprojectapp_order_changelist"))
 
     def mark_delivered(self, request, order_id):
-        Order.objects.filter(pk=order_id).update(status="Delivered")
+        self.update_status(order_id, "Delivered")
         self.message_user(request, f"Order {order_id} marked as Delivered ✅")
         return redirect(reverse("admin:gprojectapp_order_changelist"))
 
     def mark_cancelled(self, request, order_id):
-        Order.objects.filter(pk=order_id).update(status="Cancelled")
+        self.update_status(order_id, "Cancelled")
         self.message_user(request, f"Order {order_id} marked as Cancelled ❌")
         return redirect(reverse("admin:gprojectapp_order_changelist"))
 
@@ -164,6 +262,49 @@ class OrderAdmin(admin.ModelAdmin):
         css = {"all": ("admin/css/admin.css",)}  # ✅ use your custom file
 
 
+# -------------------------
+# Order Export (files generated by the worker)
+# -------------------------
+@admin.register(OrderExport)
+class OrderExportAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "status", "rows", "filters", "requested_by", "created_at", "finished_at", "download_link")
+    list_filter = ("status", "format")
+    readonly_fields = ("format", "compress", "filters", "status", "file", "rows", "requested_by", "created_at", "finished_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        # Exports hold customer details; staff only see the ones they asked for
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(requested_by=request.user)
+
+    def download_link(self, obj):
+        if obj.status != "done":
+            return "-"
+        return format_html('<a href="{}">Download</a>', reverse("admin:gprojectapp_orderexport_download", args=[obj.id]))
+    download_link.short_description = "File"
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path("<int:export_id>/download/", self.admin_site.admin_view(self.download), name="gprojectapp_orderexport_download"),
+        ]
+        return custom_urls + urls
+
+    def download(self, request, export_id):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        order_export = get_object_or_404(self.get_queryset(request), pk=export_id, status="done")
+        try:
+            f = order_export.file.open("rb")
+        except OSError:
+            raise Http404("Export file is gone; run the export again.")
+        return FileResponse(f, as_attachment=True, filename=order_export.file.name.rsplit("/", 1)[-1])
+
+
 # -------------------------
 # UserProfile
 # -------------------------
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class GprojectappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gprojectapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Connects the per-request SQL timer to new database connections
+        from . import metrics  # noqa: F401
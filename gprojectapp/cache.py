@@ -0,0 +1,144 @@
+import hashlib
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .metrics import cache_lookup
+from .routers import primary_db
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_CHANGED_KEY = "catalog:recently-changed"
+CATALOG_IMPORTING_KEY = "catalog:importing"
+# Refreshed after every chunk, so a worker that dies mid-import doesn't leave it set
+CATALOG_IMPORTING_TIMEOUT = 10 * 60
+
+# How long a single_flight() computation may hold its key, and how often
+# the requests waiting on it look for the result
+SINGLE_FLIGHT_TIMEOUT = 10
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+
+# -------------------- CATALOG VERSION --------------------
+def catalog_version():
+    """
+    Version number shared by every cache entry derived from the catalog.
+    Bumped on any product/category change, so old entries simply stop being read.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from a timestamp so a lost key never reuses an old version
+        version = int(time.time() * 1000)
+        if not cache.add(CATALOG_VERSION_KEY, version, None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    # Replicas may not have the change yet; see fresh_catalog_reads()
+    cache.set(CATALOG_CHANGED_KEY, True, settings.REPLICA_STICKY_SECONDS)
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        return catalog_version()
+
+
+def fresh_catalog_reads():
+    """
+    Read from the primary for a few seconds after a catalog change, so nothing
+    stale from a lagging replica gets cached under the new catalog version.
+    """
+    return primary_db() if cache.get(CATALOG_CHANGED_KEY) else nullcontext()
+
+
+def mark_catalog_import(running=True):
+    """
+    Flag a catalog import as in progress (or finished). Its chunks bump the
+    catalog version one after another; expensive derived data like the
+    search suggest index waits for the end instead of following each bump.
+    """
+    if running:
+        cache.set(CATALOG_IMPORTING_KEY, True, CATALOG_IMPORTING_TIMEOUT)
+    else:
+        cache.delete(CATALOG_IMPORTING_KEY)
+
+
+def catalog_import_running():
+    return cache.get(CATALOG_IMPORTING_KEY) is not None
+
+
+# -------------------- SINGLE FLIGHT --------------------
+def single_flight(key, compute, timeout):
+    """
+    Cache compute() under `key` after a miss, letting only one request (in
+    any worker) run it. The others poll the cache for its result, and only
+    compute it themselves if that request gives up or takes longer than
+    SINGLE_FLIGHT_TIMEOUT.
+    """
+    lock_key = f"{key}:computing"
+    if cache.add(lock_key, True, SINGLE_FLIGHT_TIMEOUT):
+        try:
+            with fresh_catalog_reads():
+                value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        # Lock first: the result is stored before the lock is released
+        computing = cache.get(lock_key) is not None
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if not computing:
+            break
+    with fresh_catalog_reads():
+        return compute()
+
+
+# -------------------- ANONYMOUS PAGE CACHE --------------------
+def page_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"page:{catalog_version()}:{path}"
+
+
+def anonymous_page_cache(view_func):
+    """
+    Cache the rendered page for anonymous GET requests, shared by all visitors.
+
+    Per-visitor bits (cart badge, CSRF token) are left out of the cached HTML and
+    filled in by the browser from the `cart_summary` endpoint.
+    """
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if request.method != "GET" or request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        cache_lookup("page", cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Page-Cache"] = "hit"
+            return response
+
+        # Tell the context processors not to render anything visitor-specific
+        request.page_cache_shared = True
+        with fresh_catalog_reads():
+            response = view_func(request, *args, **kwargs)
+        # A real CSRF token was rendered after all (get_token() flags it): never share it
+        shareable = not response.cookies and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        if response.status_code == 200 and not response.streaming and shareable:
+            cache.set(key, (response.content, response["Content-Type"]), settings.PAGE_CACHE_TIMEOUT)
+            response["X-Page-Cache"] = "miss"
+        return response
+
+    return _wrapped
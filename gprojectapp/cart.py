@@ -0,0 +1,89 @@
+from decimal import Decimal
+
+from .models import Product
+
+
+MAX_CART_OPERATIONS = 50
+MAX_QUANTITY = 999
+CART_OPERATIONS = ("add", "set", "remove")
+
+
+class CartError(Exception):
+    pass
+
+
+def parse_key(key):
+    """(product id, color id or None) from a cart key: "<product id>" or "<product id>-<color id>"."""
+    product_id, _, color_id = str(key).partition("-")
+    if not product_id.isdigit() or (color_id and not color_id.isdigit()):
+        raise CartError(f"Invalid cart key {key!r}.")
+    return int(product_id), color_id or None
+
+
+def clean_operations(operations):
+    """Validated (op, key, quantity) tuples; raises CartError before anything is applied."""
+    if not isinstance(operations, list) or not operations:
+        raise CartError("Expected a non-empty list of operations.")
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise CartError(f"At most {MAX_CART_OPERATIONS} operations per request.")
+
+    cleaned = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in CART_OPERATIONS:
+            raise CartError(f"Operations must be one of {', '.join(CART_OPERATIONS)}.")
+        key = str(operation.get("key", ""))
+        parse_key(key)
+        quantity = operation.get("quantity", 1 if operation["op"] == "add" else 0)
+        if operation["op"] != "remove" and (
+            not isinstance(quantity, int) or isinstance(quantity, bool) or abs(quantity) > MAX_QUANTITY
+        ):
+            raise CartError(f"Invalid quantity for {key!r}.")
+        cleaned.append((operation["op"], key, quantity))
+    return cleaned
+
+
+def apply_operations(cart, operations):
+    """
+    The cart after applying the operations in order, leaving `cart` untouched:
+      add    -- change the quantity by `quantity` (negative to take some away)
+      set    -- set the quantity
+      remove -- drop the line
+    A line whose quantity reaches 0 is dropped. New products are looked up in one query.
+    """
+    operations = clean_operations(operations)
+    cart = {key: dict(item) for key, item in cart.items()}
+
+    new_ids = {parse_key(key)[0] for op, key, _ in operations if op != "remove" and key not in cart}
+    products = Product.objects.only("id", "name", "price").in_bulk(new_ids)
+
+    for op, key, quantity in operations:
+        if op == "remove":
+            cart.pop(key, None)
+            continue
+        current = cart[key]["quantity"] if key in cart else 0
+        quantity = current + quantity if op == "add" else quantity
+        if quantity <= 0:
+            cart.pop(key, None)
+            continue
+        if key not in cart:
+            product_id, color_id = parse_key(key)
+            if product_id not in products:
+                raise CartError(f"Product {product_id} does not exist.")
+            product = products[product_id]
+            cart[key] = {
+                "product_id": product.id,
+                "name": product.name,
+                "price": str(product.price),
+                "quantity": 0,
+                "color": color_id,
+            }
+        cart[key]["quantity"] = min(quantity, MAX_QUANTITY)
+    return cart
+
+
+def summarize(cart):
+    return {
+        "cart_count": sum(item["quantity"] for item in cart.values()),
+        "items": {key: item["quantity"] for key, item in cart.items()},
+        "total": str(sum((Decimal(item["price"]) * item["quantity"] for item in cart.values()), Decimal(0))),
+    }
@@ -0,0 +1,309 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version, mark_catalog_import
+from .models import Product, Category, SubCategory, Specification, Color, CatalogImport, CARD_FIELDS, CARD_SOURCE_FIELDS
+
+
+# Plain product columns written as-is when present and non-empty
+TEXT_FIELDS = ("name", "brand", "description", "about", "image")
+REQUIRED_FOR_NEW = ("name", "price", "image")
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n")
+MAX_STORED_ERRORS = 1000
+
+
+class ImportRowError(Exception):
+    pass
+
+
+# -------------------- READERS --------------------
+def read_rows(f, name):
+    """
+    Rows of a CSV or JSON Lines file as dicts, read lazily from a binary file.
+    Lines that are not valid JSON come through as None.
+    """
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    if name.lower().endswith((".jsonl", ".ndjson")):
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    else:
+        yield from csv.DictReader(text)
+
+
+def split_list(value):
+    """"Red | Blue" in CSV, ["Red", "Blue"] in JSON."""
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split("|") if v.strip()]
+
+
+def split_specs(value):
+    """"Material: Cotton | Fit: Regular" in CSV, an object or [key, value] pairs in JSON."""
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, list):
+        pairs = value
+    else:
+        pairs = [item.split(":", 1) for item in split_list(value)]
+
+    specs = {}
+    for pair in pairs:
+        if len(pair) != 2 or not str(pair[0]).strip():
+            raise ImportRowError(f"Bad specification {pair!r}, expected 'Key: Value'.")
+        specs[str(pair[0]).strip()[:100]] = str(pair[1]).strip()[:255]
+    return specs
+
+
+# -------------------- LOOKUPS --------------------
+class CatalogMaps:
+    """Slug and name lookups loaded once per import instead of once per row."""
+
+    def __init__(self):
+        self.categories = dict(Category.objects.values_list("slug", "id"))
+        self.subcategories = {
+            slug: (pk, category_id)
+            for slug, pk, category_id in SubCategory.objects.values_list("slug", "id", "category_id")
+        }
+        self.colors = {name.lower(): pk for name, pk in Color.objects.values_list("name", "id")}
+
+    def color_ids(self, names):
+        missing = {name for name in names if name.lower() not in self.colors}
+        if missing:
+            Color.objects.bulk_create([Color(name=name) for name in missing], ignore_conflicts=True)
+            self.colors = {name.lower(): pk for name, pk in Color.objects.values_list("name", "id")}
+        return [self.colors[name.lower()] for name in names]
+
+
+def parse_row(row, maps):
+    """Validate one input row into (sku, product fields, color names or None, specs or None)."""
+    if row is None:
+        raise ImportRowError("Not a valid JSON object.")
+    row = {key.strip().lower(): value for key, value in row.items() if key}
+
+    def value(key):
+        v = row.get(key)
+        return v.strip() if isinstance(v, str) else v
+
+    sku = value("sku")
+    if not sku:
+        raise ImportRowError("Missing sku.")
+    if len(str(sku)) > 64:
+        raise ImportRowError("sku is longer than 64 characters.")
+
+    fields = {}
+    for key in TEXT_FIELDS:
+        if value(key) not in (None, ""):
+            fields[key] = str(value(key))
+    if "name" in fields:
+        fields["name"] = fields["name"][:255]
+
+    if value("price") not in (None, ""):
+        try:
+            fields["price"] = Decimal(str(value("price"))).quantize(Decimal("0.01"))
+        except InvalidOperation:
+            raise ImportRowError(f"Bad price {value('price')!r}.")
+        if fields["price"] < 0 or fields["price"] >= Decimal("1e8"):
+            raise ImportRowError(f"Price {value('price')!r} is out of range.")
+
+    if value("is_active") not in (None, ""):
+        flag = str(value("is_active")).lower()
+        if flag not in TRUE_VALUES + FALSE_VALUES:
+            raise ImportRowError(f"Bad is_active {value('is_active')!r}.")
+        fields["is_active"] = flag in TRUE_VALUES
+
+    category_slug, subcategory_slug = value("category"), value("subcategory")
+    if subcategory_slug:
+        if subcategory_slug not in maps.subcategories:
+            raise ImportRowError(f"Unknown subcategory {subcategory_slug!r}.")
+        fields["subcategory_id"], fields["category_id"] = maps.subcategories[subcategory_slug]
+    if category_slug:
+        if category_slug not in maps.categories:
+            raise ImportRowError(f"Unknown category {category_slug!r}.")
+        if subcategory_slug and maps.categories[category_slug] != fields["category_id"]:
+            raise ImportRowError(f"Subcategory {subcategory_slug!r} is not in category {category_slug!r}.")
+        fields["category_id"] = maps.categories[category_slug]
+
+    colors = split_list(value("colors")) if value("colors") not in (None, "") else None
+    specs = split_specs(value("specifications")) if value("specifications") not in (None, "") else None
+    return str(sku), fields, colors, specs
+
+
+# -------------------- CHUNK UPSERT --------------------
+def upsert_chunk(parsed, maps):
+    """
+    Write one chunk of parsed rows with a fixed number of bulk queries.
+    Returns (created, updated, errors) where errors are (row number, message).
+    """
+    errors = []
+    existing = Product.objects.in_bulk([sku for sku in parsed], field_name="sku")
+
+    new_products, changed, touched = [], [], set()
+    # bulk_update() doesn't apply auto_now
+    now = timezone.now()
+    for sku, (line, fields, _, _) in parsed.items():
+        product = existing.get(sku)
+        if product is None:
+            missing = [key for key in REQUIRED_FOR_NEW if key not in fields]
+            if missing:
+                errors.append((line, f"New product {sku} needs {', '.join(missing)}."))
+                continue
+            product = Product(sku=sku, **fields)
+            product.refresh_card()
+            new_products.append(product)
+        else:
+            for key, v in fields.items():
+                setattr(product, key, v)
+            touched.update(fields)
+            if CARD_SOURCE_FIELDS & set(fields):
+                product.refresh_card()
+                touched.update(CARD_FIELDS)
+            product.updated_at = now
+            touched.add("updated_at")
+            changed.append(product)
+
+    Product.objects.bulk_create(new_products)
+    if changed and touched:
+        Product.objects.bulk_update(changed, sorted(touched))
+
+    product_ids = dict(Product.objects.filter(sku__in=list(parsed)).values_list("sku", "id"))
+    specs = {product_ids[sku]: row[3] for sku, row in parsed.items() if sku in product_ids and row[3] is not None}
+    colors = {product_ids[sku]: row[2] for sku, row in parsed.items() if sku in product_ids and row[2] is not None}
+    upsert_specifications(specs)
+    replace_color_links(colors, maps)
+
+    return len(new_products), len(changed), errors
+
+
+def upsert_specifications(specs_by_product):
+    """Update values in place, add new keys, and drop keys the row no longer lists."""
+    if not specs_by_product:
+        return
+    current = {}
+    for spec in Specification.objects.filter(product_id__in=list(specs_by_product)):
+        current[(spec.product_id, spec.key)] = spec
+
+    to_create, to_update, keep = [], [], set()
+    for product_id, specs in specs_by_product.items():
+        for key, v in specs.items():
+            spec = current.get((product_id, key))
+            if spec is None:
+                to_create.append(Specification(product_id=product_id, key=key, value=v))
+            else:
+                keep.add(spec.id)
+                if spec.value != v:
+                    spec.value = v
+                    to_update.append(spec)
+
+    Specification.objects.bulk_create(to_create)
+    Specification.objects.bulk_update(to_update, ["value"])
+    stale = [spec.id for spec in current.values() if spec.id not in keep]
+    if stale:
+        Specification.objects.filter(id__in=stale).delete()
+
+
+def replace_color_links(colors_by_product, maps):
+    if not colors_by_product:
+        return
+    Link = Product.colors.through
+    wanted = set()
+    for product_id, names in colors_by_product.items():
+        wanted.update((product_id, color_id) for color_id in maps.color_ids(names))
+
+    current = Link.objects.filter(product_id__in=list(colors_by_product)).values_list("id", "product_id", "color_id")
+    stale = [pk for pk, product_id, color_id in current if (product_id, color_id) not in wanted]
+    existing = {(product_id, color_id) for _, product_id, color_id in current}
+
+    Link.objects.bulk_create(
+        [Link(product_id=p, color_id=c) for p, c in wanted - existing],
+        ignore_conflicts=True,
+    )
+    if stale:
+        Link.objects.filter(id__in=stale).delete()
+
+
+# -------------------- IMPORT RUN --------------------
+def run_import(catalog_import, chunk_size=None, on_chunk=None):
+    """
+    Stream the import's file and upsert it chunk by chunk. Each chunk and the
+    progress counters are committed together, so an interrupted import picks
+    up after the last committed chunk when run again.
+    """
+    chunk_size = chunk_size or settings.CATALOG_IMPORT_CHUNK_SIZE
+    maps = CatalogMaps()
+    catalog_import.status = "running"
+    catalog_import.save(update_fields=["status", "updated_at"])
+    mark_catalog_import()
+
+    try:
+        with catalog_import.file.open("rb") as f:
+            rows = islice(read_rows(f, catalog_import.file.name), catalog_import.rows_done, None)
+            line = catalog_import.rows_done
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                parsed, errors = {}, []
+                for row in chunk:
+                    line += 1
+                    try:
+                        sku, fields, colors, specs = parse_row(row, maps)
+                    except ImportRowError as e:
+                        errors.append((line, str(e)))
+                        continue
+                    # A SKU repeated within the chunk: the last row wins
+                    parsed[sku] = (line, fields, colors, specs)
+
+                with transaction.atomic():
+                    created, updated, write_errors = upsert_chunk(parsed, maps) if parsed else (0, 0, [])
+                    record_progress(catalog_import, len(chunk), created, updated, errors + write_errors)
+                bump_catalog_version()
+                mark_catalog_import()
+                if on_chunk:
+                    on_chunk(catalog_import)
+    except Exception as e:
+        catalog_import.status = "failed"
+        catalog_import.errors += f"Stopped after row {catalog_import.rows_done}: {e}\n"
+        catalog_import.save(update_fields=["status", "errors", "updated_at"])
+        raise
+    finally:
+        mark_catalog_import(running=False)
+
+    catalog_import.status = "done"
+    catalog_import.save(update_fields=["status", "updated_at"])
+    return catalog_import
+
+
+def record_progress(catalog_import, rows, created, updated, errors):
+    catalog_import.rows_done += rows
+    catalog_import.created_count += created
+    catalog_import.updated_count += updated
+    stored = catalog_import.errors.count("\n")
+    for line, message in sorted(errors):
+        if stored >= MAX_STORED_ERRORS:
+            break
+        catalog_import.errors += f"Row {line}: {message}\n"
+        stored += 1
+    catalog_import.error_count += len(errors)
+    catalog_import.save(update_fields=[
+        "rows_done", "created_count", "updated_count", "error_count", "errors", "updated_at",
+    ])
+
+
+def queued_imports():
+    """Admin uploads (and re-queued imports) waiting for the worker."""
+    return CatalogImport.objects.filter(status="pending").order_by("created_at")
@@ -1,13 +1,56 @@
+from django.core.cache import cache
+
+from .cache import catalog_version, fresh_catalog_reads
+from .metrics import cache_lookup
 from .models import Category
 
+
+MENU_CACHE_TIMEOUT = 60 * 60 * 24
+# Rendered by {% csrf_token %} on shared cached pages, then replaced in the browser
+CSRF_TOKEN_PLACEHOLDER = "page-cache-csrf-token"
+
+# (catalog version, categories) last loaded by this process
+_menu = (None, [])
+
+
+def menu_categories():
+    """
+    Categories with their subcategories prefetched. Shared through the cache
+    per catalog version and kept in process memory, so pages normally run no
+    category queries at all.
+    """
+    global _menu
+    version = catalog_version()
+    if _menu[0] != version:
+        key = f"menu:{version}"
+        categories = cache.get(key)
+        cache_lookup("menu", categories is not None)
+        if categories is None:
+            with fresh_catalog_reads():
+                categories = list(Category.objects.prefetch_related("subcategories"))
+            cache.set(key, categories, MENU_CACHE_TIMEOUT)
+        _menu = (version, categories)
+    return _menu[1]
+
+
 def categories_processor(request):
-    return {"menu_categories": Category.objects.prefetch_related("subcategories").all()}
+    return {"menu_categories": menu_categories()}
 
 def mega_menu(request):
     """
     Make categories and subcategories available globally to all templates
     """
-    categories = Category.objects.prefetch_related('subcategories').all()
     return {
-        'categories': categories # You can access this in templates as 'categories'
-    }
\ No newline at end of file
+        'categories': menu_categories() # You can access this in templates as 'categories'
+    }
+
+def cart(request):
+    """
+    Cart badge count for the navbar. Pages cached for all anonymous visitors
+    get placeholders for it and for {% csrf_token %} (instead of the first
+    visitor's token), which the browser fills in from `cart_summary`.
+    """
+    if getattr(request, "page_cache_shared", False):
+        return {"cart_count": 0, "cart_hole_punched": True, "csrf_token": CSRF_TOKEN_PLACEHOLDER}
+    cart = request.session.get("cart", {})
+    return {"cart_count": sum(item["quantity"] for item in cart.values())}
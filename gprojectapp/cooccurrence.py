@@ -0,0 +1,175 @@
+# Item–item co-occurrence for the recommendation job. Only the job imports
+# this module, so web processes never load NumPy/SciPy.
+from array import array
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db.models import Max
+from scipy import sparse
+
+from .models import Order, ProductAffinity
+from .recommendations import write_affinities
+
+
+READ_CHUNK_SIZE = 50_000
+# In STORAGES["private"], so one-off job containers share it and it outlives them
+SNAPSHOT_NAME = "recommendations/cooccurrence.npz"
+
+
+# -------------------- PURCHASE MATRIX --------------------
+def purchase_pairs(orders):
+    """Distinct (user, product) pairs of an Order queryset as two int arrays."""
+    users, products = array("q"), array("q")
+    pairs = orders.order_by().values_list("user_id", "product_id").distinct()
+    for user_id, product_id in pairs.iterator(chunk_size=READ_CHUNK_SIZE):
+        users.append(user_id)
+        products.append(product_id)
+    return np.frombuffer(users, dtype=np.int64), np.frombuffer(products, dtype=np.int64)
+
+
+def cooccurrence(users, products, size):
+    """
+    size x size matrix whose (i, j) entry is how many customers bought both
+    product i and product j; the diagonal holds each product's buyer count.
+    """
+    if not len(users):
+        return sparse.csr_matrix((size, size), dtype=np.int64)
+    _, user_rows = np.unique(users, return_inverse=True)
+    bought = sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.int64), (user_rows, products)),
+        shape=(user_rows.max() + 1, size),
+    )
+    bought.data[:] = 1
+    return (bought.T @ bought).tocsr()
+
+
+def full_matrix(last_order_id):
+    users, products = purchase_pairs(Order.objects.filter(id__lte=last_order_id))
+    size = int(products.max()) + 1 if len(products) else 1
+    return cooccurrence(users, products, size)
+
+
+def matrix_delta(since_order_id, last_order_id, size):
+    """
+    Change to the co-occurrence matrix from orders in (since, last]. Only the
+    customers with new orders are re-read: their baskets after the new orders
+    minus their baskets before.
+    """
+    new_orders = Order.objects.filter(id__gt=since_order_id, id__lte=last_order_id)
+    customers = new_orders.order_by().values("user_id").distinct()
+
+    after = purchase_pairs(Order.objects.filter(user_id__in=customers, id__lte=last_order_id))
+    before = purchase_pairs(Order.objects.filter(user_id__in=customers, id__lte=since_order_id))
+    size = max(size, int(after[1].max()) + 1 if len(after[1]) else 0)
+    delta = (cooccurrence(*after, size) - cooccurrence(*before, size)).tocsr()
+    delta.eliminate_zeros()
+    return delta
+
+
+def grow(matrix, size):
+    if matrix.shape[0] >= size:
+        return matrix
+    matrix = matrix.tocsr(copy=True)
+    matrix.resize((size, size))
+    return matrix
+
+
+# -------------------- SCORES --------------------
+def top_neighbours(matrix, rows, k, min_support):
+    """
+    Top-k (related product, score, count) per row, with scores normalised as
+    count / sqrt(buyers_i * buyers_j). Products bought together fewer than
+    `min_support` times are left out.
+    """
+    buyers = matrix.diagonal().astype(np.float64)
+    scale = np.zeros_like(buyers)
+    np.divide(1.0, np.sqrt(buyers), out=scale, where=buyers > 0)
+
+    neighbours = {}
+    for row in rows:
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        columns, counts = matrix.indices[start:end], matrix.data[start:end]
+        keep = (columns != row) & (counts >= min_support)
+        columns, counts = columns[keep], counts[keep]
+        if not len(columns):
+            neighbours[int(row)] = []
+            continue
+
+        scores = counts * scale[row] * scale[columns]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            columns, counts, scores = columns[best], counts[best], scores[best]
+        order = np.lexsort((columns, -scores))
+        neighbours[int(row)] = [
+            (int(columns[i]), float(scores[i]), int(counts[i])) for i in order
+        ]
+    return neighbours
+
+
+# -------------------- SNAPSHOT --------------------
+def load_snapshot(storage):
+    """(matrix, last order id) from the previous run, or None."""
+    if not storage.exists(SNAPSHOT_NAME):
+        return None
+    with storage.open(SNAPSHOT_NAME) as f:
+        content = BytesIO(f.read())
+    with np.load(content) as data:
+        matrix = sparse.csr_matrix(
+            (data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"])
+        )
+        return matrix, int(data["last_order_id"])
+
+
+def save_snapshot(storage, matrix, last_order_id):
+    buffer = BytesIO()
+    np.savez(
+        buffer,
+        data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+        shape=np.array(matrix.shape), last_order_id=np.array(last_order_id),
+    )
+    # Losing it between these two calls only costs the next run a full build
+    if storage.exists(SNAPSHOT_NAME):
+        storage.delete(SNAPSHOT_NAME)
+    storage.save(SNAPSHOT_NAME, ContentFile(buffer.getvalue()))
+
+
+# -------------------- JOB --------------------
+def update_recommendations(full=False):
+    """
+    Fold orders placed since the last run into the co-occurrence snapshot and
+    rewrite the neighbours of every product those orders touched. Without a
+    snapshot (or with full=True) the matrix is rebuilt from all orders.
+
+    Returns (orders considered up to, products rewritten, whether it was a full build).
+    """
+    storage = storages["private"]
+    last_order_id = Order.objects.aggregate(last=Max("id"))["last"] or 0
+    snapshot = None if full else load_snapshot(storage)
+
+    if snapshot is None:
+        matrix = full_matrix(last_order_id)
+        rows = np.flatnonzero(matrix.diagonal())
+        stale = set(ProductAffinity.objects.values_list("product_id", flat=True).distinct())
+        full = True
+    else:
+        matrix, since = snapshot
+        if since >= last_order_id:
+            return last_order_id, 0, False
+        delta = matrix_delta(since, last_order_id, matrix.shape[0])
+        matrix = (grow(matrix, delta.shape[0]) + delta).tocsr()
+        # Rows whose counts changed; other rows pick up new buyer totals on the next full build
+        rows = np.flatnonzero(np.diff(delta.indptr))
+        stale = set()
+
+    neighbours = top_neighbours(
+        matrix, rows, settings.RECOMMENDATIONS_TOP_K, settings.RECOMMENDATIONS_MIN_SUPPORT
+    )
+    # Products nobody buys any more lose their old rows on a full build
+    for product_id in stale - set(neighbours):
+        neighbours[product_id] = []
+    write_affinities(neighbours)
+    save_snapshot(storage, matrix, last_order_id)
+    return last_order_id, len(neighbours), full
@@ -0,0 +1,212 @@
+import csv
+import json
+import tempfile
+import zlib
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order
+
+
+# Query parameter -> ORM lookup. The names match OrderAdmin's changelist
+# filters, so the changelist query string can be passed through unchanged.
+ORDER_EXPORT_FILTERS = {
+    "status__exact": "status",
+    "payment_status__exact": "payment_status",
+    "payment_method__exact": "payment_method",
+    "order_date__gte": "order_date__gte",
+    "order_date__lt": "order_date__lt",
+}
+DATE_FILTERS = ("order_date__gte", "order_date__lt")
+# The changelist search box, matched exactly as OrderAdmin searches it
+SEARCH_PARAM = "q"
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# (column, value from an Order loaded with the export queryset)
+EXPORT_COLUMNS = (
+    ("order_id", lambda o: o.id),
+    ("order_date", lambda o: o.order_date.isoformat()),
+    ("status", lambda o: o.status),
+    ("payment_status", lambda o: o.payment_status),
+    ("payment_method", lambda o: o.payment_method),
+    ("customer", lambda o: o.user.username),
+    ("email", lambda o: o.user.email),
+    ("product_id", lambda o: o.product_id),
+    ("sku", lambda o: o.product.sku or ""),
+    ("product", lambda o: o.product.name),
+    ("quantity", lambda o: o.quantity),
+    ("total_price", lambda o: o.total_price),
+    ("phone", lambda o: o.phone),
+    ("address", lambda o: o.address),
+    ("courier", lambda o: o.courier_name or ""),
+    ("expected_delivery", lambda o: o.expected_delivery.isoformat() if o.expected_delivery else ""),
+    ("delivered_at", lambda o: o.delivered_at.isoformat() if o.delivered_at else ""),
+)
+
+
+# -------------------- QUERY --------------------
+def clean_export_filters(params):
+    """The supported filters and search from a query dict; raises ValidationError on a bad date."""
+    filters = {}
+    search = params.get(SEARCH_PARAM, "").strip()
+    if search:
+        filters[SEARCH_PARAM] = search
+    for param in ORDER_EXPORT_FILTERS:
+        value = params.get(param)
+        if not value:
+            continue
+        if param in DATE_FILTERS:
+            value = parse_filter_datetime(value)
+            if value is None:
+                raise ValidationError(f"{param} must be a date or datetime.")
+        filters[param] = value
+    return filters
+
+
+def parse_filter_datetime(value):
+    """An aware ISO datetime string for a date or datetime parameter, else None."""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment.isoformat()
+
+
+def search_orders(queryset, search):
+    from django.contrib import admin
+
+    queryset, may_have_duplicates = admin.site.get_model_admin(Order).get_search_results(None, queryset, search)
+    return queryset.distinct() if may_have_duplicates else queryset
+
+
+def export_queryset(filters):
+    queryset = Order.objects.filter(**{
+        ORDER_EXPORT_FILTERS[param]: value for param, value in filters.items() if param in ORDER_EXPORT_FILTERS
+    })
+    if filters.get(SEARCH_PARAM):
+        queryset = search_orders(queryset, filters[SEARCH_PARAM])
+    return (
+        queryset
+        .select_related("user", "product")
+        .only(
+            "id", "order_date", "status", "payment_status", "payment_method", "quantity",
+            "total_price", "phone", "address", "courier_name", "expected_delivery", "delivered_at",
+            "user__username", "user__email", "product__name", "product__sku",
+        )
+        .order_by("id")
+    )
+
+
+def iter_orders(queryset):
+    # iterator() keeps memory flat: rows are fetched and dropped chunk by chunk
+    return queryset.iterator(chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE)
+
+
+# -------------------- ENCODERS --------------------
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def spreadsheet_safe(value):
+    # Keep customer-entered text from being run as a formula when opened in Excel
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r") and not value[1:2].isdigit():
+        return "'" + value
+    return value
+
+
+def csv_lines(orders):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for order in orders:
+        yield writer.writerow([spreadsheet_safe(get(order)) for _, get in EXPORT_COLUMNS])
+
+
+def ndjson_lines(orders):
+    for order in orders:
+        yield json.dumps({name: get(order) for name, get in EXPORT_COLUMNS}, default=str) + "\n"
+
+
+def export_lines(queryset, fmt):
+    orders = iter_orders(queryset)
+    return csv_lines(orders) if fmt == "csv" else ndjson_lines(orders)
+
+
+def encode_stream(lines, compress=False, buffer_size=64 * 1024):
+    """UTF-8 bytes of the lines in ~64KB pieces, optionally as one gzip stream."""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            block = b"".join(pending)
+            pending, size = [], 0
+            block = gzip.compress(block) if gzip else block
+            if block:
+                yield block
+    block = b"".join(pending)
+    if gzip:
+        block = gzip.compress(block) + gzip.flush()
+    if block:
+        yield block
+
+
+def export_filename(fmt, compress, suffix=""):
+    return f"orders{suffix}.{fmt}" + (".gz" if compress else "")
+
+
+# -------------------- BACKGROUND EXPORT --------------------
+def write_export(order_export):
+    """Generate a queued export's file; used for ranges too large to stream."""
+    order_export.status = "running"
+    order_export.save(update_fields=["status"])
+
+    queryset = export_queryset(order_export.filters)
+    rows = 0
+
+    def counted(orders):
+        nonlocal rows
+        for order in orders:
+            rows += 1
+            yield order
+
+    orders = counted(iter_orders(queryset))
+    lines = csv_lines(orders) if order_export.format == "csv" else ndjson_lines(orders)
+    filename = export_filename(order_export.format, order_export.compress, f"-{order_export.id}")
+    try:
+        # Written locally, then handed to the shared storage the admin downloads from
+        with tempfile.TemporaryFile() as f:
+            for block in encode_stream(lines, order_export.compress):
+                f.write(block)
+            f.seek(0)
+            order_export.file.save(filename, File(f, filename), save=False)
+    except Exception:
+        order_export.status = "failed"
+        order_export.save(update_fields=["status"])
+        raise
+
+    order_export.rows = rows
+    order_export.status = "done"
+    order_export.finished_at = timezone.now()
+    order_export.save(update_fields=["file", "rows", "status", "finished_at"])
+    return order_export
@@ -0,0 +1,34 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+
+THUMBNAIL_SIZE = (240, 240)
+
+
+def make_thumbnail(image, size=THUMBNAIL_SIZE):
+    """A small WebP copy of an image field's file, ready to assign to another image field."""
+    from PIL import Image
+
+    # A fresh upload is still needed by the storage afterwards: rewind it
+    # instead of closing it
+    was_closed = image.closed
+    image.open("rb")
+    try:
+        img = Image.open(image)
+        img.load()
+    finally:
+        if was_closed:
+            image.close()
+        else:
+            image.seek(0)
+
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+    buffer = BytesIO()
+    img.save(buffer, format="WEBP", quality=80)
+    name = os.path.splitext(os.path.basename(image.name))[0]
+    return ContentFile(buffer.getvalue(), name=f"{name}_thumb.webp")
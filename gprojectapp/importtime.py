@@ -0,0 +1,76 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+
+
+# Heavy optional dependencies that must only be imported where they are used:
+# PIL when an image is processed, cloudinary when media is stored or served,
+# NumPy/SciPy by the recommendations job.
+LAZY_MODULES = ("PIL", "cloudinary", "cloudinary_storage.storage", "numpy", "scipy")
+
+# Import time allowed for STARTUP_CODE (checked in tests; about 300 ms on a laptop)
+IMPORT_BUDGET_MS = 800
+
+# What a web process runs before it can serve: settings, app registry, URLconf
+STARTUP_CODE = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+import sys
+print(" ".join(sorted(sys.modules)))
+"""
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+ModuleImport = namedtuple("ModuleImport", "name depth self_us cumulative_us")
+
+
+class StartupProfile:
+    def __init__(self, imports, loaded):
+        self.imports = imports
+        # Names in sys.modules once startup finished
+        self.loaded = loaded
+
+    @property
+    def total_ms(self):
+        return sum(module.self_us for module in self.imports) / 1000
+
+    def by_package(self):
+        """[(package, ms spent importing its own modules, module count)], slowest first."""
+        spent, counts = defaultdict(int), defaultdict(int)
+        for module in self.imports:
+            package = module.name.split(".")[0]
+            spent[package] += module.self_us
+            counts[package] += 1
+        return sorted(((package, us / 1000, counts[package]) for package, us in spent.items()), key=lambda row: -row[1])
+
+    def slowest_modules(self, limit=10):
+        return sorted(self.imports, key=lambda module: -module.self_us)[:limit]
+
+    def eager_lazy_modules(self):
+        return [name for name in LAZY_MODULES if name in self.loaded]
+
+
+def profile_startup(code=STARTUP_CODE):
+    """Run `code` in a fresh interpreter under -X importtime and parse the report."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "gproject.settings"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append(ModuleImport(name, len(indent) // 2, int(self_us), int(cumulative_us)))
+    loaded = set(result.stdout.split()) if result.stdout.strip() else set()
+    return StartupProfile(imports, loaded)
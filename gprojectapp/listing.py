@@ -0,0 +1,76 @@
+from .models import Product
+from .promotions import offer_label, promotion_index
+
+
+# Columns a product card needs; `image` is only read for rows saved before
+# card_image_url existed, the category, subcategory and brand only to find
+# the card's promotion
+CARD_COLUMNS = (
+    "id", "name", "price", "card_blurb", "card_image_url", "image",
+    "category_id", "subcategory_id", "brand",
+)
+
+
+class ProductCard:
+    """One product as listing pages show it, built from a narrow row instead of a full Product."""
+
+    __slots__ = ("id", "name", "price", "offer", "blurb", "image_url")
+
+    def __init__(self, id, name, price, offer, blurb, image_url):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.offer = offer
+        self.blurb = blurb
+        self.image_url = image_url
+
+
+def _card(row, storage, promotions):
+    id, name, price, blurb, image_url, image, category_id, subcategory_id, brand = row
+    if not image_url and image:
+        image_url = storage.url(image)
+    offer = offer_label(*promotions.best(price, id, category_id, subcategory_id, brand))
+    return ProductCard(id, name, price, offer, blurb, image_url)
+
+
+def product_cards(queryset):
+    """Cards for a filtered/ordered Product queryset, in one narrow query."""
+    storage = Product._meta.get_field("image").storage
+    promotions = promotion_index()
+    return [_card(row, storage, promotions) for row in queryset.values_list(*CARD_COLUMNS)]
+
+
+def product_cards_in_order(ids):
+    """Cards for a list of product ids, in that order; ids of products since deleted are skipped."""
+    cards = {card.id: card for card in product_cards(Product.objects.filter(id__in=ids))}
+    return [cards[id] for id in ids if id in cards]
+
+
+def product_cards_by_category(queryset):
+    """{category id: [cards]} for a Product queryset, in one query."""
+    storage = Product._meta.get_field("image").storage
+    promotions = promotion_index()
+    grouped = {}
+    for row in queryset.values_list(*CARD_COLUMNS):
+        grouped.setdefault(row[6], []).append(_card(row, storage, promotions))
+    return grouped
+
+
+# Context every listing page (product_list.html) needs, so none can miss a
+# variable the filter sidebar or badges read
+LISTING_DEFAULTS = {
+    "query": "",
+    "selected_categories": [],
+    "selected_subcategories": [],
+    "selected_brands": [],
+    "min_price": None,
+    "max_price": None,
+    "rating_filter": None,
+    "sort_by": None,
+}
+
+
+def listing_context(products, **context):
+    """Template context for a Product queryset, or a list of cards already built."""
+    cards = products if isinstance(products, list) else product_cards(products)
+    return {**LISTING_DEFAULTS, **context, "products": cards}
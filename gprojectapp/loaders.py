@@ -0,0 +1,15 @@
+from django.shortcuts import get_object_or_404
+
+from .models import Product
+
+
+# -------------------- PRODUCT DETAIL --------------------
+def load_product_detail(product_id):
+    """
+    Load a product with everything product_detail.html needs outside its
+    cached fragments, in one query: the product row with category,
+    subcategory and the stored rating summary joined in. Colors and
+    specifications are only read (one query each) when their fragment misses.
+    """
+    queryset = Product.objects.select_related("category", "subcategory", "rating_summary")
+    return get_object_or_404(queryset, id=product_id)
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_PATHS = ["/", "/about/", "/search/suggest/?q=sh"]
+
+
+class Command(BaseCommand):
+    help = "Compare first-request latency of a fresh process with and without the gunicorn warm-up."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", action="append", dest="paths", help=f"URL to request (repeatable). Default: {' '.join(DEFAULT_PATHS)}")
+        parser.add_argument("--runs", type=int, default=5, help="Fresh processes per mode.")
+        # Internal: run one measurement in this (fresh) process
+        parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or DEFAULT_PATHS
+        if options["child"]:
+            return self.child(options["child"], paths)
+
+        results = {"cold": [], "warm": []}
+        # Alternate the modes so drift on the machine affects both equally
+        for _ in range(options["runs"]):
+            for mode in results:
+                results[mode].append(self.spawn(mode, paths))
+
+        width = max(len(path) for path in paths)
+        self.stdout.write(f"{'first request':<{width}}  {'cold ms':>9}  {'warm ms':>9}")
+        for path in paths:
+            cold = statistics.median(run["requests"][path] for run in results["cold"])
+            warm = statistics.median(run["requests"][path] for run in results["warm"])
+            self.stdout.write(f"{path:<{width}}  {cold:>9.1f}  {warm:>9.1f}")
+        cold_total = statistics.median(sum(run["requests"].values()) for run in results["cold"])
+        warm_total = statistics.median(sum(run["requests"].values()) for run in results["warm"])
+        warm_up = statistics.median(run["warm_up"] for run in results["warm"])
+        self.stdout.write(f"{'total':<{width}}  {cold_total:>9.1f}  {warm_total:>9.1f}")
+        self.stdout.write(f"warm-up itself (paid before the worker takes traffic): {warm_up:.1f} ms")
+
+    def spawn(self, mode, paths):
+        command = [sys.executable, str(settings.BASE_DIR / "manage.py"), "benchmark_warmup", "--child", mode]
+        for path in paths:
+            command += ["--path", path]
+        # An empty file cache per process, so one run's page cache can't serve the next
+        with tempfile.TemporaryDirectory(prefix="gproject-benchmark-") as cache_dir:
+            env = {key: value for key, value in os.environ.items() if key != "REDIS_URL"}
+            env["CACHE_DIR"] = cache_dir
+            output = subprocess.run(command, capture_output=True, text=True, env=env)
+        if output.returncode:
+            raise CommandError(output.stderr)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def child(self, mode, paths):
+        from django.core.wsgi import get_wsgi_application
+        from django.test import Client
+        from gprojectapp.warmup import warm_up
+
+        get_wsgi_application()
+        warm_up_ms = 0
+        if mode == "warm":
+            started = time.perf_counter()
+            warm_up()
+            warm_up_ms = (time.perf_counter() - started) * 1000
+
+        client = Client(raise_request_exception=False)
+        timings = {}
+        for path in paths:
+            started = time.perf_counter()
+            client.get(path)
+            timings[path] = (time.perf_counter() - started) * 1000
+        self.stdout.write(json.dumps({"warm_up": warm_up_ms, "requests": timings}))
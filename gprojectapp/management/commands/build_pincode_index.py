@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gprojectapp.pincodes import build_index
+
+
+class Command(BaseCommand):
+    help = "Build the pincode lookup index from a CSV (pincode, city/district, state[, serviceable, delivery_days])."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", help=f"CSV file. Default: {settings.PINCODE_SOURCE}")
+        parser.add_argument("--output", help=f"Index file. Default: {settings.PINCODE_INDEX_PATH}")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            count = build_index(options["source"], options["output"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"{count} pincodes written to {options['output'] or settings.PINCODE_INDEX_PATH} "
+            f"in {time.monotonic() - started:.2f}s"
+        )
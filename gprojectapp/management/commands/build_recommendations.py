@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gprojectapp.cooccurrence import update_recommendations
+
+
+class Command(BaseCommand):
+    help = "Update \"frequently bought together\" neighbours from new orders (run it from a scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild from every order instead of only the new ones.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        last_order_id, products, full = update_recommendations(full=options["full"])
+        self.stdout.write(
+            f"{'Full build' if full else 'Incremental update'} up to order {last_order_id}: "
+            f"{products} products rewritten in {time.monotonic() - started:.1f}s"
+        )
@@ -0,0 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gprojectapp.sitemaps import update_sitemaps
+
+
+class Command(BaseCommand):
+    help = "Bring the sitemap files up to date, rewriting only shards with changed products."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rewrite every shard.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        shards, pages = update_sitemaps(full=options["full"])
+        self.stdout.write(
+            f"{len(shards)} product shard(s){' and the pages file' if pages else ''} written to "
+            f"{settings.SITEMAP_DIR} in {time.monotonic() - started:.1f}s"
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from gprojectapp.images import make_thumbnail
+from gprojectapp.models import Product
+
+
+class Command(BaseCommand):
+    help = "Create missing product thumbnails (e.g. for bulk-imported products)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Recreate every thumbnail, not just missing ones.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="").only("id", "image", "thumbnail")
+        if not options["all"]:
+            products = products.filter(thumbnail="")
+
+        done = failed = 0
+        for product in products.iterator(chunk_size=200):
+            try:
+                product.thumbnail = make_thumbnail(product.image)
+                product.save(update_fields=["thumbnail"])
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Product {product.id}: {e}")
+        self.stdout.write(f"{done} thumbnails created, {failed} failed")
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from gprojectapp.storage import ORPHAN_GRACE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Recount references to deduplicated media files and delete the ones no longer used."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted.")
+        parser.add_argument(
+            "--grace-hours", type=float, default=ORPHAN_GRACE.total_seconds() / 3600,
+            help="Keep unreferenced files younger than this.",
+        )
+
+    def handle(self, *args, **options):
+        removed, freed = collect_garbage(timedelta(hours=options["grace_hours"]), dry_run=options["dry_run"])
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(f"{verb} {removed} unreferenced file(s), {freed / 1024 / 1024:.1f} MB")
@@ -0,0 +1,76 @@
+import os
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from gprojectapp.catalog_import import run_import, queued_imports
+from gprojectapp.models import CatalogImport
+
+
+class Command(BaseCommand):
+    help = "Upsert products, specifications and colors from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="CSV or .jsonl file to import.")
+        parser.add_argument("--resume", type=int, metavar="IMPORT_ID", help="Continue an earlier import after its last committed chunk.")
+        parser.add_argument("--queued", action="store_true", help="Run imports uploaded through the admin, polling for new ones.")
+        parser.add_argument("--once", action="store_true", help="With --queued: run the current queue and exit.")
+        parser.add_argument("--interval", type=float, default=10.0, help="With --queued: seconds to sleep when the queue is empty.")
+        parser.add_argument("--chunk-size", type=int, help="Rows per transaction.")
+
+    def handle(self, *args, **options):
+        self.chunk_size = options["chunk_size"]
+
+        if options["queued"]:
+            while True:
+                imports = list(queued_imports())
+                for catalog_import in imports:
+                    self.run(catalog_import, raise_errors=False)
+                if options["once"]:
+                    return
+                if not imports:
+                    time.sleep(options["interval"])
+
+        if options["resume"]:
+            try:
+                catalog_import = CatalogImport.objects.get(pk=options["resume"])
+            except CatalogImport.DoesNotExist:
+                raise CommandError(f"No import with id {options['resume']}.")
+            if catalog_import.status == "done":
+                raise CommandError(f"Import {catalog_import.id} already finished.")
+        elif options["path"]:
+            if not os.path.isfile(options["path"]):
+                raise CommandError(f"{options['path']} is not a file.")
+            catalog_import = CatalogImport(status="running")
+            with open(options["path"], "rb") as f:
+                catalog_import.file.save(os.path.basename(options["path"]), File(f))
+            self.stdout.write(f"Import {catalog_import.id} started; resume with --resume {catalog_import.id}")
+        else:
+            raise CommandError("Give a file to import, --resume IMPORT_ID or --queued.")
+
+        self.run(catalog_import)
+
+    def run(self, catalog_import, raise_errors=True):
+        started = time.monotonic()
+        try:
+            run_import(catalog_import, chunk_size=self.chunk_size, on_chunk=self.report)
+        except Exception as e:
+            self.stderr.write(f"{catalog_import} failed after {catalog_import.rows_done} rows: {e}")
+            if raise_errors:
+                raise CommandError(f"Fix the problem and run again with --resume {catalog_import.id}.")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{catalog_import} done in {time.monotonic() - started:.1f}s: "
+            f"{catalog_import.created_count} created, {catalog_import.updated_count} updated, "
+            f"{catalog_import.error_count} rows skipped"
+        ))
+        if catalog_import.errors:
+            self.stderr.write(catalog_import.errors.rstrip())
+
+    def report(self, catalog_import):
+        self.stdout.write(
+            f"{catalog_import.rows_done} rows: {catalog_import.created_count} created, "
+            f"{catalog_import.updated_count} updated, {catalog_import.error_count} errors"
+        )
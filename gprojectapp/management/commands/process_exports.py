@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gprojectapp.exports import write_export
+from gprojectapp.models import OrderExport
+
+
+class Command(BaseCommand):
+    help = "Write queued order exports to files for download from the admin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the current queue and exit.")
+        parser.add_argument("--interval", type=float, default=10.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            for order_export in OrderExport.objects.filter(status="pending").order_by("created_at"):
+                started = time.monotonic()
+                try:
+                    write_export(order_export)
+                    processed += 1
+                    self.stdout.write(f"{order_export}: {order_export.rows} rows in {time.monotonic() - started:.1f}s")
+                except Exception as e:
+                    self.stderr.write(f"{order_export} failed: {e}")
+
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["interval"])
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gprojectapp.uploads import pending_uploads, store_upload, expire_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Move finished review media uploads to the storage backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the current queue and exit.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            for upload in pending_uploads()[:20]:
+                try:
+                    store_upload(upload)
+                    processed += 1
+                    self.stdout.write(f"Stored {upload.filename} for review {upload.review_id}")
+                except Exception as e:
+                    self.stderr.write(f"Upload {upload.id} failed: {e}")
+
+            expired = expire_stale_uploads()
+            if expired:
+                self.stdout.write(f"Removed {expired} stale uploads")
+
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["interval"])
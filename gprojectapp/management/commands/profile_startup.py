@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gprojectapp.importtime import IMPORT_BUDGET_MS, LAZY_MODULES, profile_startup
+
+
+class Command(BaseCommand):
+    help = "Report per-package import time of django.setup() in a fresh interpreter (python -X importtime)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=15, help="Packages and modules to list.")
+        parser.add_argument("--threshold", type=float, default=10.0, help="Flag packages taking longer than this many ms.")
+        parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_MS, help="Fail if the total exceeds this many ms.")
+
+    def handle(self, *args, **options):
+        try:
+            profile = profile_startup()
+        except RuntimeError as e:
+            raise CommandError(f"Startup failed: {e}")
+
+        self.stdout.write(f"{'package':<28} {'ms':>8} {'modules':>8}")
+        for package, ms, count in profile.by_package()[:options["limit"]]:
+            line = f"{package:<28} {ms:>8.1f} {count:>8}"
+            self.stdout.write(self.style.WARNING(line + "  <- slow") if ms > options["threshold"] else line)
+
+        self.stdout.write(f"\n{'slowest modules (self time)':<44} {'ms':>8} {'incl. deps':>10}")
+        for module in profile.slowest_modules(options["limit"]):
+            self.stdout.write(f"{module.name:<44} {module.self_us / 1000:>8.1f} {module.cumulative_us / 1000:>10.1f}")
+
+        eager = profile.eager_lazy_modules()
+        if eager:
+            self.stdout.write(self.style.WARNING(
+                f"\nImported at startup but meant to load on first use: {', '.join(eager)}"
+            ))
+        else:
+            self.stdout.write(f"\nNone of {', '.join(LAZY_MODULES)} imported at startup.")
+
+        summary = f"Total import time: {profile.total_ms:.1f} ms across {len(profile.imports)} modules (budget {options['budget']:.0f} ms)"
+        if profile.total_ms > options["budget"]:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,346 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .ratelimit import rate_limit_counters
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STORE_INITIAL_SIZE = 64 * 1024
+ARCHIVE_FILE = "archive.json"
+
+
+# -------------------- PER-PROCESS STORE --------------------
+# Every process writes its own file in METRICS_DIR: an 8-byte header holding
+# the bytes in use, then one entry per series -- uint32 key length, uint32
+# value count, the JSON key [metric, label values], padding to 8 bytes and
+# the float64 values in native byte order (readers are on the same host): one
+# for a counter; the bucket counts, then the sum, for a histogram. Entries
+# are only appended, and the header is written last, so a reader never sees
+# half an entry. /metrics sums the files of every worker.
+HEADER_SIZE = 8
+USED = struct.Struct("<I")
+ENTRY = struct.Struct("<II")
+
+
+class MetricStore:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget the file; the next write opens a new one (a forked worker must not share its parent's)."""
+        self.lock = threading.Lock()
+        self.index = {}
+        self.map = None
+        self.values = None
+
+    def open(self):
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        self.path = os.path.join(settings.METRICS_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.metrics")
+        self.file = open(self.path, "w+b")
+        self.remap(STORE_INITIAL_SIZE)
+        self.used = HEADER_SIZE
+        USED.pack_into(self.map, 0, self.used)
+
+    def remap(self, size):
+        if self.values is not None:
+            self.values.release()
+            self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.values = memoryview(self.map).cast("d")
+
+    def allocate(self, key, size):
+        """Slot of the first of `size` values for a new series; caller holds the lock."""
+        if self.map is None:
+            self.open()
+        data = json.dumps(key).encode("utf-8")
+        value_offset = self.used + ENTRY.size + len(data)
+        value_offset += -value_offset % 8
+        end = value_offset + 8 * size
+        if end > len(self.map):
+            self.remap(max(2 * len(self.map), end))
+        ENTRY.pack_into(self.map, self.used, len(data), size)
+        self.map[self.used + ENTRY.size:self.used + ENTRY.size + len(data)] = data
+        self.used = end
+        USED.pack_into(self.map, 0, end)
+        slot = self.index[key] = value_offset // 8
+        return slot
+
+    def add(self, key, amount):
+        with self.lock:
+            slot = self.index.get(key)
+            if slot is None:
+                slot = self.allocate(key, 1)
+            self.values[slot] += amount
+
+    def observe(self, key, buckets, value):
+        # A count per bucket (the last is +Inf), then the sum
+        with self.lock:
+            slot = self.index.get(key)
+            if slot is None:
+                slot = self.allocate(key, len(buckets) + 2)
+            self.values[slot + bisect_left(buckets, value)] += 1
+            self.values[slot + len(buckets) + 1] += value
+
+
+_store = MetricStore()
+os.register_at_fork(after_in_child=_store.reset)
+
+
+def read_store(path):
+    """{(metric, label values): [values]} from one process's file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        return {}
+    used = min(USED.unpack_from(data)[0], len(data))
+    series, pos = {}, HEADER_SIZE
+    while pos + ENTRY.size <= used:
+        length, size = ENTRY.unpack_from(data, pos)
+        metric, labels = json.loads(data[pos + ENTRY.size:pos + ENTRY.size + length])
+        value_offset = pos + ENTRY.size + length
+        value_offset += -value_offset % 8
+        series[(metric, tuple(labels))] = list(struct.unpack_from(f"{size}d", data, value_offset))
+        pos = value_offset + 8 * size
+    return series
+
+
+def add_series(totals, series):
+    for key, values in series.items():
+        current = totals.get(key)
+        if current is None or len(current) != len(values):
+            totals[key] = list(values)
+        else:
+            totals[key] = [a + b for a, b in zip(current, values)]
+
+
+def load_archive():
+    try:
+        with open(os.path.join(settings.METRICS_DIR, ARCHIVE_FILE), encoding="utf-8") as f:
+            archive = json.load(f)
+    except (OSError, ValueError):
+        return set(), {}
+    series = {(metric, tuple(labels)): values for metric, labels, values in archive["series"]}
+    return set(archive["merged"]), series
+
+
+def collect():
+    """Totals over every process, live or merged into the archive."""
+    merged, totals = load_archive()
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.metrics")):
+        if os.path.basename(path) in merged:
+            continue
+        try:
+            add_series(totals, read_store(path))
+        except (OSError, ValueError, struct.error):
+            continue
+    return totals
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_dead_processes():
+    """
+    Fold the files of exited processes into the archive, so recycled
+    gunicorn workers (max_requests) don't leave a growing pile of files.
+    Called by the master from gunicorn's child_exit hook, one at a time.
+
+    A file is listed as merged in the same atomic write that adds its values,
+    and only deleted on a later merge, so a concurrent collect() counts it
+    exactly once.
+    """
+    merged, totals = load_archive()
+    for name in merged:
+        try:
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+        except FileNotFoundError:
+            pass
+
+    newly_merged = []
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.metrics")):
+        name = os.path.basename(path)
+        pid = name.partition("-")[0]
+        if not pid.isdigit() or pid_alive(int(pid)):
+            continue
+        try:
+            add_series(totals, read_store(path))
+        except (OSError, ValueError, struct.error):
+            pass
+        newly_merged.append(name)
+    if not newly_merged and not merged:
+        return 0
+
+    path = os.path.join(settings.METRICS_DIR, ARCHIVE_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "merged": newly_merged,
+            "series": [[metric, list(labels), values] for (metric, labels), values in totals.items()],
+        }, f)
+    os.replace(tmp, path)
+    return len(newly_merged)
+
+
+# -------------------- METRIC TYPES --------------------
+REGISTRY = {}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY[name] = self
+
+
+class Counter(Metric):
+    kind = "counter"
+    size = 1
+
+    def inc(self, *labels, amount=1):
+        """Add to the series for these label values (positional, in `labels` order)."""
+        _store.add((self.name, labels), amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.size = len(buckets) + 2
+
+    def observe(self, value, *labels):
+        # Bucket counts are made cumulative when exported
+        _store.observe((self.name, labels), self.buckets, value)
+
+
+# -------------------- EXPOSITION --------------------
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def label_text(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def number(value):
+    return repr(float(value)) if value != int(value) else f"{int(value)}"
+
+
+def render_metrics():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    by_metric = {}
+    for (metric, labels), values in collect().items():
+        by_metric.setdefault(metric, []).append((labels, values))
+
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, values in sorted(by_metric.get(metric.name, [])):
+            # Left behind by an older definition of the metric
+            if len(labels) != len(metric.labels) or len(values) != metric.size:
+                continue
+            if metric.kind == "counter":
+                lines.append(f"{metric.name}{label_text(metric.labels, labels)} {number(values[0])}")
+                continue
+            cumulative = 0
+            for count, bound in zip(values, (*map(number, metric.buckets), "+Inf")):
+                cumulative += count
+                lines.append(f"{metric.name}_bucket{label_text(metric.labels, labels, [('le', bound)])} {number(cumulative)}")
+            lines.append(f"{metric.name}_sum{label_text(metric.labels, labels)} {number(values[-1])}")
+            lines.append(f"{metric.name}_count{label_text(metric.labels, labels)} {number(cumulative)}")
+
+    # Already shared through the cache, so read rather than recorded here
+    lines.append("# HELP rate_limit_requests_total Requests checked against each rate-limit scope.")
+    lines.append("# TYPE rate_limit_requests_total counter")
+    for scope, outcomes in rate_limit_counters().items():
+        for outcome, count in outcomes.items():
+            lines.append(f"rate_limit_requests_total{label_text(('scope', 'outcome'), (scope, outcome))} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- DATABASE TIME --------------------
+# [seconds, queries] for the request being handled, set by MetricsMiddleware
+_db_time = ContextVar("metrics_db_time", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    spent = _db_time.get()
+    if spent is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        spent[0] += time.perf_counter() - started
+        spent[1] += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Fired again on reconnects of the same connection object
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def measure_request(get_response, request):
+    """Run the request, recording its latency, status and database time under its URL name."""
+    spent = [0.0, 0]
+    token = _db_time.set(spent)
+    started = time.perf_counter()
+    try:
+        response = get_response(request)
+    finally:
+        _db_time.reset(token)
+    duration = time.perf_counter() - started
+
+    match = getattr(request, "resolver_match", None)
+    view = (match.view_name if match else None) or "unresolved"
+    REQUESTS.inc(view, request.method, str(response.status_code))
+    REQUEST_LATENCY.observe(duration, view)
+    DB_TIME.observe(spent[0], view)
+    DB_QUERIES.inc(view, amount=spent[1])
+    return response
+
+
+def cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.inc(cache_name, "hit" if hit else "miss")
+
+
+# -------------------- METRICS --------------------
+REQUESTS = Counter("http_requests_total", "Requests by URL name, method and status.", ("view", "method", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time to produce the response, by URL name.", ("view",))
+DB_TIME = Histogram("http_request_db_seconds", "Time spent in SQL queries per request, by URL name.", ("view",))
+DB_QUERIES = Counter("http_request_db_queries_total", "SQL queries run, by URL name.", ("view",))
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Application cache reads by cache and result.", ("cache", "result"))
+CARTS_CREATED = Counter("carts_created_total", "Session carts that got their first item.")
+ORDERS_PLACED = Counter("orders_placed_total", "Checkouts completed, by payment method.", ("payment_method",))
+ORDER_LINES = Counter("order_lines_total", "Order rows created at checkout.")
+ORDER_REVENUE = Counter("order_revenue_total", "Order totals after discounts, in rupees.")
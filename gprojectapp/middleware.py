@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import measure_request
+from .ratelimit import take_token, client_ip, too_many_requests
+from .routers import routing, choose_replica
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from a replica (see gprojectapp.routers).
+
+    After a request writes to the primary the visitor gets a short-lived cookie,
+    and their reads stay on the primary until it expires, so they see their own
+    order or review even if the replicas lag behind.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.REPLICA_PIN_COOKIE
+        try:
+            pinned_until = float(request.COOKIES.get(cookie, 0))
+        except ValueError:
+            pinned_until = 0
+        use_replica = request.method in SAFE_METHODS and pinned_until < time.time()
+
+        with routing(choose_replica() if use_replica else None) as state:
+            response = self.get_response(request)
+
+        if state.wrote:
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(cookie, str(time.time() + seconds), max_age=seconds, httponly=True, samesite="Lax")
+        return response
+
+
+class MetricsMiddleware:
+    """Records latency, status and SQL time per URL name for /metrics (see gprojectapp.metrics)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return measure_request(self.get_response, request)
+
+
+class RateLimitMiddleware:
+    """
+    Site-wide RATE_LIMITS["global"] bucket per client IP, checked before the
+    session or database is touched. Individual views can add tighter limits
+    with @rate_limit.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path.startswith(settings.MEDIA_URL):
+            return self.get_response(request)
+        decision = take_token("global", client_ip(request))
+        if not decision.allowed:
+            return too_many_requests(decision)
+        return self.get_response(request)
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profiles PROFILER_SAMPLE_RATE of requests, plus any carrying a valid
+    signed PROFILER_HEADER, with a stack sampler (see gprojectapp.profiling).
+    Unless PROFILER_ENABLED is set Django drops it at startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        from .profiling import install_template_timer
+
+        install_template_timer()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from .profiling import should_profile, profile_request
+
+        if not should_profile(request):
+            return self.get_response(request)
+        return profile_request(self.get_response, request)
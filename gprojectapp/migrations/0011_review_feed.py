@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_review_stats(apps, schema_editor):
+    Review = apps.get_model("gprojectapp", "Review")
+    RatingSummary = apps.get_model("gprojectapp", "RatingSummary")
+
+    Review.objects.exclude(Q(image="") | Q(image__isnull=True), Q(video="") | Q(video__isnull=True)).update(has_media=True)
+
+    summaries = {}
+    for product_id, rating, n in Review.objects.values_list("product_id", "rating").annotate(n=Count("id")).order_by():
+        summaries.setdefault(product_id, RatingSummary(product_id=product_id))
+        setattr(summaries[product_id], f"stars_{rating}", n)
+    RatingSummary.objects.bulk_create(summaries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0010_category_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='gprojectapp.product')),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Rating summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='has_media',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-created_at', '-id'], name='review_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-rating', '-created_at', '-id'], name='review_highest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'rating', '-created_at', '-id'], name='review_lowest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'has_media', '-created_at', '-id'], name='review_media_idx'),
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0014_order_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('together', models.PositiveIntegerField(help_text='Customers who bought both')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to='gprojectapp.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gprojectapp.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product affinities',
+                'ordering': ['product', '-score'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='unique_product_affinity')],
+            },
+        ),
+    ]
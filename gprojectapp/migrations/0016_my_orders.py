@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0015_product_affinity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='products/thumbs/'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-order_date', '-id'], name='order_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', '-order_date', '-id'], name='order_user_status_idx'),
+        ),
+    ]
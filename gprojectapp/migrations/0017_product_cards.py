@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:05
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_cards(apps, schema_editor):
+    Product = apps.get_model("gprojectapp", "Product")
+    batch = []
+    for product in Product.objects.only("id", "description", "image", "thumbnail").iterator(chunk_size=500):
+        product.card_blurb = Truncator(product.description or "").words(12)
+        image = product.thumbnail or product.image
+        product.card_image_url = image.url if image else ""
+        batch.append(product)
+        if len(batch) == 500:
+            Product.objects.bulk_update(batch, ["card_blurb", "card_image_url"])
+            batch = []
+    Product.objects.bulk_update(batch, ["card_blurb", "card_image_url"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0016_my_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='card_blurb',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='card_image_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:10
+
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def offers_to_promotions(apps, schema_editor):
+    """The old free-text offer was shown as "<offer>% off"; numeric ones become product promotions."""
+    Product = apps.get_model("gprojectapp", "Product")
+    Promotion = apps.get_model("gprojectapp", "Promotion")
+    promotions = []
+    for product in Product.objects.exclude(offer__isnull=True).exclude(offer="").only("id", "name", "offer"):
+        try:
+            value = Decimal(product.offer.strip().rstrip("%").strip())
+        except InvalidOperation:
+            continue
+        if 0 < value <= 100:
+            promotions.append(Promotion(
+                name=f"{product.name} offer"[:255], kind="percent", value=value, scope="product", product_id=product.id,
+            ))
+    Promotion.objects.bulk_create(promotions, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0017_product_cards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='promotion',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('kind', models.CharField(choices=[('percent', 'Percent off'), ('flat', 'Flat amount off each unit')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('scope', models.CharField(choices=[('all', 'Every product'), ('product', 'Product'), ('category', 'Category'), ('subcategory', 'Subcategory'), ('brand', 'Brand')], default='product', max_length=20)),
+                ('brand', models.CharField(blank=True, max_length=100)),
+                ('min_cart_total', models.DecimalField(decimal_places=2, default=0, help_text='Only applies once the cart subtotal (before discounts) reaches this amount', max_digits=10)),
+                ('starts_at', models.DateTimeField(blank=True, help_text='Leave empty to start immediately', null=True)),
+                ('ends_at', models.DateTimeField(blank=True, help_text='Leave empty to run until deactivated', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='gprojectapp.category')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='gprojectapp.product')),
+                ('subcategory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='gprojectapp.subcategory')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(offers_to_promotions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='product',
+            name='offer',
+        ),
+    ]
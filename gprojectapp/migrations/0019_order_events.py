@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:17
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def backfill_created_events(apps, schema_editor):
+    """One "created" event per existing order, so a consumer can sync everything from the start of the feed."""
+    Order = apps.get_model("gprojectapp", "Order")
+    OrderEvent = apps.get_model("gprojectapp", "OrderEvent")
+    fields = Order._meta.concrete_fields
+    batch = []
+    for order in Order.objects.order_by("id").iterator(chunk_size=500):
+        batch.append(OrderEvent(
+            order_id=order.id,
+            kind="created",
+            status=order.status,
+            payment_status=order.payment_status,
+            data={field.attname: getattr(order, field.attname) for field in fields},
+        ))
+        if len(batch) == 500:
+            OrderEvent.objects.bulk_create(batch)
+            batch = []
+    OrderEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0018_promotions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('status', 'Status changed'), ('payment', 'Payment status changed'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=20)),
+                ('status', models.CharField(max_length=50)),
+                ('previous_status', models.CharField(blank=True, max_length=50)),
+                ('payment_status', models.CharField(max_length=20)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(backfill_created_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:23
+
+from django.db import migrations, models
+
+
+def backfill_image_urls(apps, schema_editor):
+    Category = apps.get_model("gprojectapp", "Category")
+    for category in Category.objects.exclude(image="").exclude(image__isnull=True).only("id", "image"):
+        Category.objects.filter(pk=category.pk).update(image_url=category.image.url)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0020_sitemaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='image_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_image_urls, migrations.RunPython.noop),
+    ]
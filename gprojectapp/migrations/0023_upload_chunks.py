@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0022_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.PositiveBigIntegerField()),
+                ('data', models.BinaryField()),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='gprojectapp.mediaupload')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('upload', 'offset'), name='unique_upload_chunk')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:47
+
+import gprojectapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0023_upload_chunks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='catalogimport',
+            name='file',
+            field=models.FileField(help_text='CSV or JSON Lines (.jsonl)', storage=gprojectapp.models.catalog_import_storage, upload_to=gprojectapp.models.catalog_import_path),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 19:48
+
+import gprojectapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0024_catalog_import_path'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderexport',
+            name='file',
+            field=models.FileField(blank=True, storage=gprojectapp.models.order_export_storage, upload_to=gprojectapp.models.order_export_path),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 21:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_sold(apps, schema_editor):
+    Product = apps.get_model("gprojectapp", "Product")
+    Order = apps.get_model("gprojectapp", "Order")
+    batch = []
+    counts = Order.objects.order_by().values_list("product_id").annotate(n=Count("id"))
+    for product_id, n in counts.iterator(chunk_size=2000):
+        batch.append(Product(id=product_id, sold=n))
+        if len(batch) == 500:
+            Product.objects.bulk_update(batch, ["sold"])
+            batch = []
+    Product.objects.bulk_update(batch, ["sold"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gprojectapp', '0025_order_export_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sold',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_sold, migrations.RunPython.noop),
+    ]
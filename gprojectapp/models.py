@@ -1,12 +1,18 @@
-from django.db import models
+import logging
+import os
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from io import BytesIO
-from PIL import Image
-from django.core.files.base import ContentFile
+from django.utils.text import Truncator
+
+
+logger = logging.getLogger(__name__)
 
 
 # -------------------------
@@ -31,6 +37,9 @@ class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(unique=True)
     image = models.ImageField(upload_to="category_images/", blank=True, null=True)
+    # `image`'s URL, stored on save so menus and the home page don't build it
+    image_url = models.CharField(max_length=500, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -39,11 +48,25 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # A new file only gets its final name while saving, so its URL is stored afterwards
+        new_image = self.image and not self.image._committed
+        if not new_image:
+            self.image_url = self.image.url if self.image else ""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "image" in update_fields:
+            kwargs["update_fields"] = list({*update_fields, "image_url"})
+        super().save(*args, **kwargs)
+        if new_image:
+            self.image_url = self.image.url
+            Category.objects.filter(pk=self.pk).update(image_url=self.image_url)
+
 
 class SubCategory(models.Model):
     name = models.CharField(max_length=255)
     category = models.ForeignKey(Category, related_name="subcategories", on_delete=models.CASCADE)
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "SubCategories"
@@ -77,14 +100,25 @@ class Color(models.Model):
 # -------------------------
 # Product model
 # -------------------------
+CARD_BLURB_WORDS = 12
+# Card fields and the fields they are derived from
+CARD_FIELDS = ("card_blurb", "card_image_url")
+CARD_SOURCE_FIELDS = {"description", "image", "thumbnail"}
+
+
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text="Stock keeping unit, used by catalog imports")
     name = models.CharField(max_length=255)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     subcategory = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to="products/")
+    # Small WebP derivative of `image` for lists (orders, cart); made on save
+    thumbnail = models.ImageField(upload_to="products/thumbs/", blank=True, editable=False)
+    # What listing cards show, precomputed on save (see gprojectapp/listing.py)
+    card_blurb = models.CharField(max_length=300, blank=True, editable=False)
+    card_image_url = models.CharField(max_length=500, blank=True, editable=False)
     description = models.TextField(blank=True, null=True)
-    offer = models.CharField(max_length=255, blank=True, null=True)
     about = models.TextField(
         help_text="Enter each feature on a new line",
         blank=True
@@ -94,17 +128,60 @@ class Product(models.Model):
 
     # KEEP ONLY ONE
     created_at = models.DateTimeField(auto_now_add=True)
+    # Sitemap lastmod, and how the sitemap job finds changed products (see gprojectapp/sitemaps.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     is_active = models.BooleanField(default=True)
+    # Number of orders for this product, kept up to date by gprojectapp/signals.py
+    # so search suggestions rank without joining the orders table
+    sold = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # A newly uploaded image: derive the thumbnail from the file in hand
+        # (stored images without one are handled by `build_thumbnails`)
+        if self.image and not self.image._committed:
+            try:
+                from .images import make_thumbnail
+                self.thumbnail = make_thumbnail(self.image)
+                update_fields = kwargs.get("update_fields")
+                if update_fields is not None and "thumbnail" not in update_fields:
+                    kwargs["update_fields"] = [*update_fields, "thumbnail"]
+            except Exception:
+                logger.warning("Thumbnail for product %s failed", self.pk or self.name, exc_info=True)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or CARD_SOURCE_FIELDS & set(update_fields):
+            self.refresh_card()
+            if update_fields is not None:
+                kwargs["update_fields"] = list({*update_fields, *CARD_FIELDS})
+        # New files only get their final name while saving, so their URL is stored afterwards
+        new_files = (self.image and not self.image._committed) or (self.thumbnail and not self.thumbnail._committed)
+        super().save(*args, **kwargs)
+        if new_files and self.card_image_url != self.thumbnail_url:
+            self.card_image_url = self.thumbnail_url
+            Product.objects.filter(pk=self.pk).update(card_image_url=self.card_image_url)
+
+    def refresh_card(self):
+        """Precompute the listing card fields, so listings never load `description` or build URLs."""
+        self.card_blurb = Truncator(self.description or "").words(CARD_BLURB_WORDS)
+        self.card_image_url = self.thumbnail_url
+
+    @property
+    def thumbnail_url(self):
+        if self.thumbnail:
+            return self.thumbnail.url
+        return self.image.url if self.image else ""
 
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum([r.rating for r in reviews]) / reviews.count(), 1)
-        return 0
+        return self.get_rating_summary().average
+
+    def get_rating_summary(self):
+        try:
+            return self.rating_summary
+        except RatingSummary.DoesNotExist:
+            return RatingSummary(product=self)
 
     def get_about_points(self):
         return [point.strip() for point in self.about.splitlines() if point.strip()]
@@ -116,6 +193,68 @@ class Specification(models.Model):
 
     def __str__(self):
         return f"{self.key}: {self.value}"
+
+
+# -------------------------
+# Promotions (compiled for pricing by gprojectapp/promotions.py)
+# -------------------------
+class Promotion(models.Model):
+    KIND_CHOICES = (
+        ("percent", "Percent off"),
+        ("flat", "Flat amount off each unit"),
+    )
+
+    SCOPE_CHOICES = (
+        ("all", "Every product"),
+        ("product", "Product"),
+        ("category", "Category"),
+        ("subcategory", "Subcategory"),
+        ("brand", "Brand"),
+    )
+
+    name = models.CharField(max_length=255)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default="percent")
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, default="product")
+    product = models.ForeignKey(Product, related_name="promotions", on_delete=models.CASCADE, blank=True, null=True)
+    category = models.ForeignKey(Category, related_name="promotions", on_delete=models.CASCADE, blank=True, null=True)
+    subcategory = models.ForeignKey(SubCategory, related_name="promotions", on_delete=models.CASCADE, blank=True, null=True)
+    brand = models.CharField(max_length=100, blank=True)
+    min_cart_total = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0,
+        help_text="Only applies once the cart subtotal (before discounts) reaches this amount",
+    )
+    starts_at = models.DateTimeField(blank=True, null=True, help_text="Leave empty to start immediately")
+    ends_at = models.DateTimeField(blank=True, null=True, help_text="Leave empty to run until deactivated")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def target(self):
+        """What the rule applies to: a Product/Category/SubCategory, a brand name or None for everything."""
+        if self.scope == "all":
+            return None
+        if self.scope == "brand":
+            return self.brand
+        return getattr(self, self.scope)
+
+    def clean(self):
+        if self.scope != "all" and not self.target:
+            raise ValidationError({self.scope: "Choose what this promotion applies to."})
+        if self.value is not None and self.value <= 0:
+            raise ValidationError({"value": "The discount must be positive."})
+        if self.kind == "percent" and self.value is not None and self.value > 100:
+            raise ValidationError({"value": "A percentage can be at most 100."})
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({"ends_at": "The promotion must end after it starts."})
+
+
 # -------------------------
 # Order model with payment
 # -------------------------
@@ -145,6 +284,9 @@ class Order(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     total_price = models.FloatField()
+    # Promotion applied when the order was placed; total_price is after it
+    discount = models.FloatField(default=0)
+    promotion = models.CharField(max_length=255, blank=True)
     address = models.TextField()
     phone = models.CharField(max_length=15)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default="Pending")
@@ -164,6 +306,13 @@ class Order(models.Model):
     delivered_at = models.DateTimeField(blank=True, null=True)
     cancelled_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        # My Orders: newest first, per user and per user + status tab
+        indexes = [
+            models.Index(fields=["user", "-order_date", "-id"], name="order_user_recent_idx"),
+            models.Index(fields=["user", "status", "-order_date", "-id"], name="order_user_status_idx"),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -181,10 +330,53 @@ class Order(models.Model):
         elif self.status == "Cancelled" and not self.cancelled_at:
             self.cancelled_at = now
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        # What the change feed compares against to tell a status transition
+        order._saved_status = (order.__dict__.get("status"), order.__dict__.get("payment_status"))
+        return order
+
     def save(self, *args, **kwargs):
         # Before saving, auto-update timeline based on status
         self.update_timeline()
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "status" in update_fields:
+            kwargs["update_fields"] = list({*update_fields, f"{self.status.lower()}_at"})
+        # The change feed event is written by a post_save receiver; keep it in the same transaction
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+# -------------------------
+# Order change feed (see gprojectapp/order_events.py)
+# -------------------------
+class OrderEvent(models.Model):
+    KIND_CHOICES = (
+        ("created", "Created"),
+        ("status", "Status changed"),
+        ("payment", "Payment status changed"),
+        ("updated", "Updated"),
+        ("deleted", "Deleted"),
+    )
+
+    # Ids are handed out in commit order, so they double as the feed cursor
+    id = models.BigAutoField(primary_key=True)
+    # A plain id rather than a foreign key: the log outlives deleted orders
+    order_id = models.BigIntegerField(db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=50)
+    previous_status = models.CharField(max_length=50, blank=True)
+    payment_status = models.CharField(max_length=20)
+    # The order's fields after the change
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"Order {self.order_id} {self.kind} ({self.status})"
+
 
 # -------------------------
 # UserProfile model
@@ -213,20 +405,272 @@ def save_user_profile(sender, instance, **kwargs):
 # Review model
 # -------------------------
 class Review(models.Model):
+    MEDIA_STATUS_CHOICES = (
+        ("none", "No media"),
+        ("processing", "Processing"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    )
+
     product = models.ForeignKey(Product, related_name="reviews", on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     rating = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     comment = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to="reviews/images/", blank=True, null=True)
     video = models.FileField(upload_to="reviews/videos/", blank=True, null=True)
+    has_media = models.BooleanField(default=False, editable=False)
+    media_status = models.CharField(max_length=20, choices=MEDIA_STATUS_CHOICES, default="none")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        # One index per review feed sort (see gprojectapp/reviews.py)
+        indexes = [
+            models.Index(fields=["product", "-created_at", "-id"], name="review_recent_idx"),
+            models.Index(fields=["product", "-rating", "-created_at", "-id"], name="review_highest_idx"),
+            models.Index(fields=["product", "rating", "-created_at", "-id"], name="review_lowest_idx"),
+            models.Index(fields=["product", "has_media", "-created_at", "-id"], name="review_media_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.rating}⭐"
 
+    def save(self, *args, **kwargs):
+        self.has_media = bool(self.image or self.video)
+        super().save(*args, **kwargs)
+
+
+# -------------------------
+# Chunked review media upload
+# -------------------------
+class MediaUpload(models.Model):
+    KIND_CHOICES = (
+        ("image", "Image"),
+        ("video", "Video"),
+    )
+
+    STATUS_CHOICES = (
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),
+        ("stored", "Stored"),
+        ("failed", "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    review = models.ForeignKey(Review, related_name="uploads", on_delete=models.CASCADE, blank=True, null=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploading")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "updated_at"], name="mediaupload_status_idx")]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class UploadChunk(models.Model):
+    """
+    Bytes of an unfinished upload, kept in the database so the
+    process_uploads worker (a separate container) can read them.
+    """
+    upload = models.ForeignKey(MediaUpload, related_name="chunks", on_delete=models.CASCADE)
+    offset = models.PositiveBigIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["upload", "offset"], name="unique_upload_chunk"),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_id} @ {self.offset}"
+
+
+# -------------------------
+# Content-addressed media
+# -------------------------
+class MediaBlob(models.Model):
+    """One stored file, shared by every upload with the same content (see gprojectapp/storage.py)."""
+    digest = models.CharField(max_length=64, unique=True)  # SHA-256 of the content
+    name = models.CharField(max_length=255, unique=True)   # name in the wrapped backend
+    size = models.PositiveBigIntegerField()
+    # File fields pointing at it; recounted by `collect_media_garbage`
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
+
+# -------------------------
+# Stored star histogram per product
+# -------------------------
+class RatingSummary(models.Model):
+    product = models.OneToOneField(Product, primary_key=True, related_name="rating_summary", on_delete=models.CASCADE)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Rating summaries"
+
+    def __str__(self):
+        return f"{self.product} ({self.count} reviews)"
+
+    @property
+    def histogram(self):
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
+    @property
+    def count(self):
+        return sum(self.histogram)
+
+    @property
+    def average(self):
+        if not self.count:
+            return 0
+        return round(sum(star * n for star, n in enumerate(self.histogram, start=1)) / self.count, 1)
+
+    def histogram_rows(self):
+        """(star, count, percent) from 5 stars down, for the rating bars."""
+        total = self.count or 1
+        return [(star, n, round(n * 100 / total)) for star, n in reversed(list(enumerate(self.histogram, start=1)))]
+
+    @classmethod
+    def refresh_for(cls, product_id):
+        counts = dict(
+            Review.objects.filter(product_id=product_id)
+            .values_list("rating")
+            .annotate(n=models.Count("id"))
+        )
+        cls.objects.update_or_create(
+            product_id=product_id,
+            defaults={f"stars_{star}": counts.get(star, 0) for star in range(1, 6)},
+        )
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_rating_summary(sender, instance, origin=None, **kwargs):
+    # Nothing to keep in sync when the whole product is being deleted
+    if isinstance(origin, Product):
+        return
+    RatingSummary.refresh_for(instance.product_id)
+
+
+# -------------------------
+# "Frequently bought together" (built by build_recommendations)
+# -------------------------
+class ProductAffinity(models.Model):
+    product = models.ForeignKey(Product, related_name="affinities", on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name="+", on_delete=models.CASCADE)
+    # Co-purchase count normalised by how often each product is bought (cosine)
+    score = models.FloatField()
+    together = models.PositiveIntegerField(help_text="Customers who bought both")
+
+    class Meta:
+        ordering = ["product", "-score"]
+        verbose_name_plural = "Product affinities"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "related"], name="unique_product_affinity"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
+# -------------------------
+# Bulk catalog import
+# -------------------------
+def catalog_import_storage():
+    # Uploaded through the admin, read by the `importer` process
+    from django.core.files.storage import storages
+    return storages["private"]
+
+
+def catalog_import_path(instance, filename):
+    return f"catalog/{uuid.uuid4().hex}/{filename}"
+
+
+class CatalogImport(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    file = models.FileField(upload_to=catalog_import_path, storage=catalog_import_storage, help_text="CSV or JSON Lines (.jsonl)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    # Rows already committed; a resumed import skips this many
+    rows_done = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.TextField(blank=True)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import {self.id} ({os.path.basename(self.file.name)})"
+
+
+# -------------------------
+# Background order export
+# -------------------------
+def order_export_storage():
+    # Written by the `exporter` process, downloaded through the admin
+    from django.core.files.storage import storages
+    return storages["private"]
+
+
+def order_export_path(instance, filename):
+    return f"orders/{uuid.uuid4().hex}/{filename}"
+
+
+class OrderExport(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    FORMAT_CHOICES = (
+        ("csv", "CSV"),
+        ("ndjson", "NDJSON"),
+    )
+
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="csv")
+    compress = models.BooleanField(default=True)
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    file = models.FileField(upload_to=order_export_path, storage=order_export_storage, blank=True)
+    rows = models.PositiveIntegerField(default=0)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Order export {self.id} ({self.format})"
+
 
 # -------------------------
 # Banner model
@@ -250,7 +694,9 @@ class Banner(models.Model):
         return self.title or f"Banner {self.id}"
 
     def save(self, *args, **kwargs):
-        if self.image:
+        # Only a new upload is compressed; re-encoding the stored JPEG on every
+        # save would upload a slightly different copy each time
+        if self.image and not self.image._committed:
             try:
                 # Move PIL import inside the function
                 from PIL import Image
@@ -271,7 +717,8 @@ class Banner(models.Model):
                 buffer.seek(0)
 
                 # Save new file
-                self.image = ContentFile(buffer.read(), name=f"banner_{self.pk or ''}.jpg")
+                name = os.path.splitext(os.path.basename(self.image.name))[0]
+                self.image = ContentFile(buffer.read(), name=f"{name}_banner.jpg")
 
             except Exception as e:
                 print("Banner image compression failed:", e)
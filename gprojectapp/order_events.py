@@ -0,0 +1,105 @@
+import time
+
+from django.db import connections
+
+from .models import Order, OrderEvent
+from .pagination import decode_cursor, encode_cursor
+from .routers import primary_db
+
+
+FEED_ORDERING = ("id",)
+FEED_BATCH_SIZE = 200
+FEED_MAX_BATCH_SIZE = 1000
+# Long-poll wait cap; stays under the gunicorn worker timeout
+FEED_MAX_WAIT = 25
+FEED_POLL_INTERVAL = 1.0
+
+# Key of the Postgres advisory lock that serializes event writes
+EVENT_LOG_LOCK = 4503
+
+
+# -------------------- WRITING --------------------
+def order_snapshot(order):
+    """The order's own columns, as the feed sends them."""
+    return {field.attname: getattr(order, field.attname) for field in Order._meta.concrete_fields}
+
+
+def lock_event_log(using):
+    """
+    Make event ids follow commit order: hold a transaction-scoped lock from
+    taking an id until commit, so a reader never sees id N+1 before N. SQLite
+    already allows one writing transaction at a time.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [EVENT_LOG_LOCK])
+
+
+def record_order_event(order, kind=None, using="default"):
+    """
+    Append an event for a saved or deleted order. Must run inside the
+    transaction that changed the order (Order.save() opens one).
+    """
+    saved_status, saved_payment_status = getattr(order, "_saved_status", (None, None))
+    if kind is None:
+        if order.status != saved_status:
+            kind = "status"
+        elif order.payment_status != saved_payment_status:
+            kind = "payment"
+        else:
+            kind = "updated"
+
+    lock_event_log(using)
+    OrderEvent.objects.using(using).create(
+        order_id=order.pk,
+        kind=kind,
+        status=order.status,
+        previous_status=saved_status if kind == "status" and saved_status else "",
+        payment_status=order.payment_status,
+        data=order_snapshot(order),
+    )
+    order._saved_status = (order.status, order.payment_status)
+
+
+# -------------------- READING --------------------
+def event_json(event):
+    return {
+        "event_id": event.id,
+        "order_id": event.order_id,
+        "kind": event.kind,
+        "status": event.status,
+        "previous_status": event.previous_status or None,
+        "payment_status": event.payment_status,
+        "created_at": event.created_at,
+        "order": event.data,
+    }
+
+
+def order_changes(cursor=None, limit=FEED_BATCH_SIZE, wait=0):
+    """
+    Events after `cursor` in commit order: (events, next cursor, has_more).
+    With `wait`, an empty result is retried until something arrives or `wait`
+    seconds pass (long polling). The next cursor is the one given back when
+    nothing new arrived, so consumers can always store it.
+    """
+    after = 0
+    if cursor:
+        values = decode_cursor(cursor, FEED_ORDERING, OrderEvent)
+        if values is None:
+            raise ValueError("Invalid cursor.")
+        after = values[0]
+
+    deadline = time.monotonic() + min(wait, FEED_MAX_WAIT)
+    while True:
+        # Replicas can lag by seconds; consumers want changes as soon as they commit
+        with primary_db():
+            events = list(OrderEvent.objects.filter(id__gt=after).order_by(*FEED_ORDERING)[:limit + 1])
+        if events or time.monotonic() + FEED_POLL_INTERVAL > deadline:
+            break
+        time.sleep(FEED_POLL_INTERVAL)
+
+    has_more = len(events) > limit
+    events = events[:limit]
+    next_cursor = encode_cursor(events[-1], FEED_ORDERING) if events else cursor
+    return events, next_cursor, has_more
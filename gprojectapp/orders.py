@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Order
+from .pagination import keyset_page
+
+
+ORDER_PAGE_SIZE = 10
+# Backed by the order_user_recent_idx / order_user_status_idx indexes
+ORDER_ORDERING = ("-order_date", "-id")
+ORDER_STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+ORDER_COUNTS_TIMEOUT = 60 * 60
+
+
+# -------------------- STATUS COUNTS --------------------
+def order_counts_key(user_id):
+    return f"orders:counts:{user_id}"
+
+
+def order_status_counts(user_id):
+    """{status: count} for one customer plus an "all" total; cached until their orders change."""
+    key = order_counts_key(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        rows = Order.objects.filter(user_id=user_id).order_by().values_list("status").annotate(n=Count("id"))
+        counts = dict.fromkeys(ORDER_STATUSES, 0)
+        counts.update(dict(rows))
+        counts["all"] = sum(counts.values())
+        cache.set(key, counts, ORDER_COUNTS_TIMEOUT)
+    return counts
+
+
+def invalidate_order_counts(*user_ids):
+    cache.delete_many([order_counts_key(user_id) for user_id in user_ids])
+
+
+# -------------------- ORDER LIST --------------------
+def order_page(user_id, status=None, cursor=None, size=ORDER_PAGE_SIZE):
+    """One page of a customer's orders, newest first, and the next page's cursor."""
+    orders = (
+        Order.objects.filter(user_id=user_id)
+        .select_related("product")
+        .only(
+            "id", "quantity", "total_price", "status", "payment_status", "phone", "address", "order_date",
+            "product__id", "product__name", "product__image", "product__thumbnail",
+        )
+    )
+    if status in ORDER_STATUSES:
+        orders = orders.filter(status=status)
+    return keyset_page(orders, ORDER_ORDERING, cursor, size)
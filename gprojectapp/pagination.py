@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# -------------------- KEYSET CURSORS --------------------
+def encode_cursor(obj, ordering):
+    """Opaque cursor holding the ordering values of the last row on a page."""
+    values = []
+    for field in ordering:
+        value = getattr(obj, field.lstrip("-"))
+        values.append(value.isoformat() if isinstance(value, date) else value)
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, ordering, model):
+    """The cursor's values converted back with the model's fields, or None if it is not valid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    try:
+        values = [
+            model._meta.get_field(field.lstrip("-")).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValidationError, TypeError, ValueError):
+        # Crafted cursors can hold lists or objects where a field expects a scalar
+        return None
+    return None if None in values else values
+
+
+def after_cursor(ordering, values):
+    """
+    Keyset condition for "rows after this one" under a mixed-direction ordering:
+    (a > x) OR (a = x AND b < y) OR ...
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip("-"): prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor, size):
+    """
+    One page of `queryset` in `ordering` after `cursor`, and the cursor for the
+    next page (None on the last page). Reads at most `size + 1` rows.
+    """
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, ordering, queryset.model) if cursor else None
+    if values:
+        queryset = queryset.filter(after_cursor(ordering, values))
+
+    page = list(queryset[:size + 1])
+    next_cursor = encode_cursor(page[size - 1], ordering) if len(page) > size else None
+    return page[:size], next_cursor
@@ -0,0 +1,197 @@
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+PINCODE_RE = re.compile(r"^[1-9][0-9]{5}$")
+
+# Days to deliver when the source has none: same sorting district (first 3
+# digits) as the warehouse, same postal circle (2), same region (1), elsewhere
+ZONE_DELIVERY_DAYS = (2, 3, 4, 6)
+
+# Stored delivery days: 0 = not serviceable, DEFAULT_DAYS = by zone
+DEFAULT_DAYS = 255
+
+# Source columns, first match wins; the India Post directory works as-is
+# (many rows per pincode, one per post office; the first is kept)
+SOURCE_COLUMNS = {
+    "pincode": ("pincode",),
+    "city": ("city", "districtname", "district", "divisionname"),
+    "state": ("state", "statename"),
+    "serviceable": ("serviceable",),
+    "delivery_days": ("delivery_days",),
+}
+FALSE_VALUES = ("0", "false", "no", "n")
+
+Pincode = namedtuple("Pincode", "pincode city state serviceable delivery_days")
+
+
+# -------------------- INDEX FILE --------------------
+# Header: magic, entry count, place count (16 bytes). Then three parallel
+# arrays sorted by pincode in native byte order -- uint32 pincodes, uint16
+# place numbers, uint8 delivery days -- and the places as a JSON list of
+# [city, state]. The file is built on the host that reads it.
+MAGIC = b"PIN1"
+HEADER = struct.Struct("<4sIII")
+
+
+def read_source(path):
+    """{pincode: (city, state, stored delivery days)} from a CSV file."""
+    entries = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        headers = {name.strip().lower(): name for name in reader.fieldnames or ()}
+        columns = {
+            field: next((headers[name] for name in names if name in headers), None)
+            for field, names in SOURCE_COLUMNS.items()
+        }
+        if not all(columns[field] for field in ("pincode", "city", "state")):
+            raise ValueError(f"{path}: needs pincode, city and state columns.")
+
+        for row in reader:
+            pincode = (row[columns["pincode"]] or "").strip()
+            if not PINCODE_RE.match(pincode) or int(pincode) in entries:
+                continue
+            serviceable = (row.get(columns["serviceable"]) or "").strip().lower() not in FALSE_VALUES
+            days = (row.get(columns["delivery_days"]) or "").strip()
+            if not serviceable:
+                days = 0
+            elif days.isdigit() and 0 < int(days) < DEFAULT_DAYS:
+                days = int(days)
+            else:
+                days = DEFAULT_DAYS
+            entries[int(pincode)] = (place_name(row[columns["city"]]), place_name(row[columns["state"]]), days)
+    return entries
+
+
+def place_name(value):
+    # The India Post directory is in capitals
+    value = (value or "").strip()
+    return value.title() if value.isupper() else value
+
+
+def write_index(entries, path):
+    """Write the index file for read_source() output, atomically."""
+    places, place_numbers = [], {}
+    pincodes, numbers, days = [], [], []
+    for pincode in sorted(entries):
+        city, state, delivery_days = entries[pincode]
+        place = (city, state)
+        if place not in place_numbers:
+            place_numbers[place] = len(places)
+            places.append(place)
+        pincodes.append(pincode)
+        numbers.append(place_numbers[place])
+        days.append(delivery_days)
+
+    count = len(pincodes)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, count, len(places), 0))
+        f.write(array("I", pincodes).tobytes())
+        f.write(array("H", numbers).tobytes())
+        f.write(bytes(days))
+        f.write(json.dumps(places, ensure_ascii=False).encode("utf-8"))
+    os.replace(tmp, path)
+    return count
+
+
+def build_index(source=None, path=None):
+    """Rebuild the index file from the CSV source; returns how many pincodes it holds."""
+    return write_index(read_source(source or settings.PINCODE_SOURCE), path or settings.PINCODE_INDEX_PATH)
+
+
+class PincodeIndex:
+    """
+    Read-only view of an index file. The file is memory-mapped, so preloaded
+    gunicorn workers share its pages, and a lookup is one bisect over the
+    pincode array.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, _, _ = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a pincode index.")
+        view = memoryview(self.map)
+        offset = HEADER.size
+        self.pincodes = view[offset:offset + 4 * count].cast("I")
+        offset += 4 * count
+        self.places = view[offset:offset + 2 * count].cast("H")
+        offset += 2 * count
+        self.days = view[offset:offset + count]
+        self.place_names = json.loads(bytes(view[offset + count:]).decode("utf-8"))
+
+    def __len__(self):
+        return len(self.pincodes)
+
+    def lookup(self, pincode):
+        """Pincode(...) for a six-digit string, or None if it isn't in the index."""
+        if not PINCODE_RE.match(pincode):
+            return None
+        number = int(pincode)
+        i = bisect_left(self.pincodes, number)
+        if i == len(self.pincodes) or self.pincodes[i] != number:
+            return None
+        city, state = self.place_names[self.places[i]]
+        days = self.days[i]
+        if days == DEFAULT_DAYS:
+            days = zone_delivery_days(pincode)
+        return Pincode(pincode, city, state, days > 0, days or None)
+
+
+def zone_delivery_days(pincode):
+    origin = settings.SHIP_FROM_PINCODE
+    for digits, days in zip((3, 2, 1), ZONE_DELIVERY_DAYS):
+        if pincode[:digits] == origin[:digits]:
+            return days
+    return ZONE_DELIVERY_DAYS[-1]
+
+
+# -------------------- LOOKUP --------------------
+_index = None
+_lock = threading.Lock()
+
+
+def pincode_index():
+    """The process-wide index, rebuilt first if the file is missing or older than the source."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                path = settings.PINCODE_INDEX_PATH
+                if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(settings.PINCODE_SOURCE):
+                    build_index(path=path)
+                _index = PincodeIndex(path)
+    return _index
+
+
+def lookup_pincode(pincode):
+    return pincode_index().lookup((pincode or "").strip())
+
+
+def expected_delivery(pincode_info, today=None):
+    """Delivery date for an order placed today, or None if the pincode isn't served."""
+    if not pincode_info or not pincode_info.serviceable:
+        return None
+    return (today or timezone.localdate()) + timedelta(days=pincode_info.delivery_days)
+
+
+def seconds_until_tomorrow():
+    """Seconds left in the local day, after which expected_delivery() moves on."""
+    now = timezone.localtime()
+    tomorrow = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), time.min))
+    return max(0, int((tomorrow - now).total_seconds()))
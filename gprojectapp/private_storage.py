@@ -0,0 +1,45 @@
+import os
+
+import cloudinary.uploader
+import cloudinary.utils
+from cloudinary_storage.storage import RawMediaCloudinaryStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Only loaded through STORAGES["private"] (gprojectapp.storage.WrappedStorage),
+# so importing the cloudinary SDK here doesn't slow down startup.
+@deconstructible
+class AuthenticatedCloudinaryStorage(RawMediaCloudinaryStorage):
+    """
+    Raw Cloudinary files with the "authenticated" delivery type: a plain URL
+    for the public id returns 401, only URLs signed with our API secret work.
+    Catalog imports and order exports (customer names, phones, addresses)
+    live here, and the signed URLs never leave the server.
+    """
+    DELIVERY_TYPE = "authenticated"
+
+    def _upload(self, name, content):
+        options = {
+            "use_filename": True, "resource_type": self._get_resource_type(name),
+            "type": self.DELIVERY_TYPE, "tags": self.TAG,
+            # Keep the name we were given (uploads already get a random directory),
+            # so fixed names like the recommendations snapshot can be found again
+            "unique_filename": False, "overwrite": True,
+        }
+        folder = os.path.dirname(name)
+        if folder:
+            options["folder"] = folder
+        return cloudinary.uploader.upload(content, **options)
+
+    def _get_url(self, name):
+        url, _ = cloudinary.utils.cloudinary_url(
+            self._prepend_prefix(name), resource_type=self._get_resource_type(name),
+            type=self.DELIVERY_TYPE, sign_url=True,
+        )
+        return url
+
+    def delete(self, name):
+        response = cloudinary.uploader.destroy(
+            name, invalidate=True, resource_type=self._get_resource_type(name), type=self.DELIVERY_TYPE,
+        )
+        return response["result"] == "ok"
@@ -0,0 +1,299 @@
+import json
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.template.base import Template
+from django.utils.text import get_valid_filename
+
+
+TOKEN_SALT = "gprojectapp.profiling"
+TOKEN_MAX_AGE = 60 * 60 * 24
+
+# The request being profiled in this thread, if any
+_profile = ContextVar("request_profile", default=None)
+
+
+# -------------------- STACK SAMPLER --------------------
+PATH_PREFIXES = sorted(
+    {str(settings.BASE_DIR), sysconfig.get_paths()["purelib"], sysconfig.get_paths()["stdlib"]},
+    key=len, reverse=True,
+)
+_labels = {}
+
+
+def frame_label(code):
+    """"function (path:line)" with the install prefixes stripped; cached per code object."""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        for prefix in PATH_PREFIXES:
+            if path.startswith(prefix):
+                path = path[len(prefix):].lstrip(os.sep)
+                break
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+    return label
+
+
+def collapse(frame):
+    """The frame's stack in collapsed-stack form, outermost call first."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack every `interval` seconds until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+# -------------------- PER-REQUEST MEASUREMENTS --------------------
+class RequestProfile:
+    def __init__(self):
+        # Inclusive render time per template name (a child includes its {% extends %} parent)
+        self.templates = defaultdict(float)
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_seconds += time.perf_counter() - started
+
+
+def install_template_timer():
+    """Wrap Template._render once; outside a profiled request it only reads a ContextVar."""
+    original = Template._render
+    if getattr(original, "profiled", False):
+        return
+
+    def _render(self, context):
+        profile = _profile.get()
+        if profile is None:
+            return original(self, context)
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            profile.templates[self.origin.template_name or self.name or "<string>"] += time.perf_counter() - started
+
+    _render.profiled = True
+    Template._render = _render
+
+
+def should_profile(request):
+    token = request.headers.get(settings.PROFILER_HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=TOKEN_MAX_AGE)
+            return True
+        except signing.BadSignature:
+            pass
+    return random.random() < settings.PROFILER_SAMPLE_RATE
+
+
+def profile_token():
+    """Value for the profiling header, valid for a day."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def profile_request(get_response, request):
+    """Run the request under the sampler and record the result under its URL name."""
+    profile = RequestProfile()
+    token = _profile.set(profile)
+    sampler = StackSampler(threading.get_ident(), settings.PROFILER_INTERVAL)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.time_query))
+            response = get_response(request)
+    finally:
+        stacks = sampler.stop()
+        _profile.reset(token)
+    duration = time.perf_counter() - started
+
+    match = getattr(request, "resolver_match", None)
+    url_name = (match.view_name if match else None) or "unresolved"
+    save_profile(url_name, stacks, {
+        "time": time.time(),
+        "path": request.path,
+        "method": request.method,
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "samples": sum(stacks.values()),
+        "queries": profile.queries,
+        "sql_ms": round(profile.sql_seconds * 1000, 2),
+        "templates": {name: round(seconds * 1000, 2) for name, seconds in profile.templates.items()},
+    })
+    return response
+
+
+# -------------------- STORAGE --------------------
+# Two append-only files per URL name: "<name>.collapsed" (one "stack count"
+# line per stack and request, the input format of flamegraph.pl and
+# speedscope) and "<name>.jsonl" (one summary per request).
+def profile_paths(url_name):
+    base = os.path.join(settings.PROFILER_DIR, get_valid_filename(url_name.replace(":", "-")))
+    return f"{base}.collapsed", f"{base}.jsonl"
+
+
+def append(path, text):
+    # One O_APPEND write per request, so concurrent workers don't interleave lines
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, text.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def save_profile(url_name, stacks, summary):
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    collapsed_path, summary_path = profile_paths(url_name)
+    summary["url_name"] = url_name
+    if stacks:
+        append(collapsed_path, "".join(f"{stack} {count}\n" for stack, count in stacks.items()))
+    append(summary_path, json.dumps(summary) + "\n")
+
+
+def load_stacks(url_name):
+    stacks = Counter()
+    collapsed_path, _ = profile_paths(url_name)
+    if os.path.exists(collapsed_path):
+        with open(collapsed_path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def load_summaries(url_name):
+    _, summary_path = profile_paths(url_name)
+    if not os.path.exists(summary_path):
+        return []
+    with open(summary_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def profiled_routes():
+    """[{url_name, requests, avg/p95/max ms, avg SQL ms and queries}], slowest on average first."""
+    if not os.path.isdir(settings.PROFILER_DIR):
+        return []
+    routes = []
+    for filename in os.listdir(settings.PROFILER_DIR):
+        if not filename.endswith(".jsonl"):
+            continue
+        with open(os.path.join(settings.PROFILER_DIR, filename), encoding="utf-8") as f:
+            summaries = [json.loads(line) for line in f if line.strip()]
+        if summaries:
+            routes.append(route_stats(summaries[0]["url_name"], summaries))
+    return sorted(routes, key=lambda route: -route["avg_ms"])
+
+
+def route_stats(url_name, summaries):
+    durations = sorted(summary["duration_ms"] for summary in summaries)
+    count = len(summaries)
+    templates = defaultdict(float)
+    for summary in summaries:
+        for name, ms in summary["templates"].items():
+            templates[name] += ms
+    return {
+        "url_name": url_name,
+        "requests": count,
+        "avg_ms": sum(durations) / count,
+        "p95_ms": durations[min(count - 1, int(count * 0.95))],
+        "max_ms": durations[-1],
+        "avg_sql_ms": sum(summary["sql_ms"] for summary in summaries) / count,
+        "avg_queries": sum(summary["queries"] for summary in summaries) / count,
+        "templates": sorted(((name, total / count) for name, total in templates.items()), key=lambda row: -row[1]),
+    }
+
+
+def clear_profiles():
+    if os.path.isdir(settings.PROFILER_DIR):
+        for filename in os.listdir(settings.PROFILER_DIR):
+            if filename.endswith((".collapsed", ".jsonl")):
+                os.remove(os.path.join(settings.PROFILER_DIR, filename))
+
+
+# -------------------- FLAMEGRAPH --------------------
+def frame_kind(label):
+    path = label.rpartition("(")[2]
+    if path.startswith("django/db") or "psycopg" in path or "sqlite3" in path:
+        return "sql"
+    if path.startswith("django/template") or path.startswith("gprojectapp/templatetags"):
+        return "template"
+    if "cloudinary" in path or path.startswith("PIL"):
+        return "media"
+    if path.startswith(("gprojectapp", "authcart", "gproject")):
+        return "app"
+    return "other"
+
+
+def flame_rects(stacks, min_fraction=0.002):
+    """
+    Boxes of an icicle-style flame graph: [{label, kind, depth, left, width, samples}]
+    with left/width in percent of all samples. Boxes narrower than
+    `min_fraction` are left out.
+    """
+    total = sum(stacks.values())
+    if not total:
+        return []
+    root = {}
+    for stack, count in stacks.items():
+        node = root
+        for label in stack.split(";"):
+            entry = node.setdefault(label, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    rects = []
+
+    def walk(children, depth, left):
+        for label in sorted(children):
+            count, grandchildren = children[label]
+            if count / total >= min_fraction:
+                rects.append({
+                    "label": label, "kind": frame_kind(label), "depth": depth,
+                    "left": left * 100 / total, "width": count * 100 / total, "samples": count,
+                    "hue": zlib.crc32(label.encode()) % 30,
+                })
+                walk(grandchildren, depth + 1, left)
+            left += count
+
+    walk(root, 0, 0)
+    return rects
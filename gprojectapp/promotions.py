@@ -0,0 +1,204 @@
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_catalog_version, catalog_version, fresh_catalog_reads
+from .models import Product, Promotion
+
+
+PROMOTIONS_CACHE_TIMEOUT = 60 * 60 * 24
+CENT = Decimal("0.01")
+ZERO = Decimal(0)
+
+Rule = namedtuple("Rule", "id name kind value min_cart_total")
+PricedCart = namedtuple("PricedCart", "lines subtotal discount total")
+
+# (catalog version, PromotionIndex) last compiled or loaded by this process
+_index = (None, None)
+
+
+# -------------------- COMPILED INDEX --------------------
+def scope_key(rule):
+    if rule.scope == "all":
+        return ("all", None)
+    if rule.scope == "brand":
+        return ("brand", rule.brand.strip().lower())
+    return (rule.scope, getattr(rule, f"{rule.scope}_id"))
+
+
+def unit_discount(rule, price):
+    if rule.kind == "percent":
+        return (price * rule.value / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    return min(rule.value, price)
+
+
+class PromotionIndex:
+    """
+    The promotions running at compile time, grouped by what they apply to.
+
+    For each (scope, target) key the rules are folded into threshold tiers:
+    ascending cart minimums, each with the best percentage and the best flat
+    rule available from that minimum up. Pricing a line is then a handful of
+    dict lookups and a bisect, however many rules overlap.
+    """
+
+    def __init__(self, rules, valid_until):
+        # Earliest start or end of a rule after compile time; stale from then on
+        self.valid_until = valid_until
+        self.rule_count = len(rules)
+        grouped = {}
+        for key, rule in rules:
+            grouped.setdefault(key, []).append(rule)
+        self.tiers = {key: self.fold(rules) for key, rules in grouped.items()}
+
+    @staticmethod
+    def fold(rules):
+        thresholds, best = [], []
+        percent = flat = None
+        for rule in sorted(rules, key=lambda rule: rule.min_cart_total):
+            if rule.kind == "percent" and (percent is None or rule.value > percent.value):
+                percent = rule
+            if rule.kind == "flat" and (flat is None or rule.value > flat.value):
+                flat = rule
+            if thresholds and thresholds[-1] == rule.min_cart_total:
+                best[-1] = (percent, flat)
+            else:
+                thresholds.append(rule.min_cart_total)
+                best.append((percent, flat))
+        return thresholds, best
+
+    def expired(self, now):
+        return self.valid_until is not None and now >= self.valid_until
+
+    def best(self, price, product_id, category_id=None, subcategory_id=None, brand=None, cart_total=ZERO):
+        """(discount per unit, Rule) of the largest discount for one product, or (0, None)."""
+        keys = (
+            ("product", product_id),
+            ("category", category_id),
+            ("subcategory", subcategory_id),
+            ("brand", (brand or "").strip().lower()),
+            ("all", None),
+        )
+        found = (ZERO, None)
+        for key in keys:
+            tiers = self.tiers.get(key)
+            if tiers is None:
+                continue
+            thresholds, best = tiers
+            i = bisect_right(thresholds, cart_total) - 1
+            if i < 0:
+                continue
+            for rule in best[i]:
+                if rule is not None:
+                    amount = unit_discount(rule, price)
+                    if amount > found[0]:
+                        found = (amount, rule)
+        return found
+
+
+def compile_promotions(now=None):
+    """Compile the active promotions into a PromotionIndex, in one query."""
+    now = now or timezone.now()
+    queryset = Promotion.objects.filter(is_active=True).filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+    rules, boundaries = [], []
+    for promotion in queryset.only(
+        "id", "name", "kind", "value", "scope", "product_id", "category_id", "subcategory_id",
+        "brand", "min_cart_total", "starts_at", "ends_at",
+    ):
+        if promotion.ends_at:
+            boundaries.append(promotion.ends_at)
+        if promotion.starts_at and promotion.starts_at > now:
+            # Not running yet; the index goes stale when it starts
+            boundaries.append(promotion.starts_at)
+            continue
+        if promotion.scope != "all" and not scope_key(promotion)[1]:
+            continue
+        rule = Rule(promotion.id, promotion.name, promotion.kind, promotion.value, promotion.min_cart_total)
+        rules.append((scope_key(promotion), rule))
+    return PromotionIndex(rules, min(boundaries, default=None))
+
+
+def promotion_index():
+    """
+    The compiled promotions, shared through the cache per catalog version and
+    kept in process memory. Promotions are catalog models, so saving one bumps
+    the version. When a rule starts or ends, the first process to notice bumps
+    the version too, so pages cached with the old offers are dropped.
+    """
+    global _index
+    now = timezone.now()
+    version = catalog_version()
+    index = _index[1] if _index[0] == version else None
+    if index is None:
+        index = cache.get(f"promotions:{version}")
+    if index is None or index.expired(now):
+        if index is not None and cache.add(f"promotions:boundary:{index.valid_until.timestamp()}", True, PROMOTIONS_CACHE_TIMEOUT):
+            version = bump_catalog_version()
+        with fresh_catalog_reads():
+            index = compile_promotions(now)
+        cache.set(f"promotions:{version}", index, PROMOTIONS_CACHE_TIMEOUT)
+    _index = (version, index)
+    return index
+
+
+# -------------------- PRICING --------------------
+def offer_label(amount, rule):
+    """Badge text for a (discount per unit, Rule) pair from PromotionIndex.best()."""
+    if rule is None:
+        return ""
+    if rule.kind == "percent":
+        return f"{rule.value.normalize():f}% off"
+    return f"₹{amount.normalize():f} off"
+
+
+def product_offer(product):
+    """Badge text for the best promotion on a product without a cart minimum, e.g. "10% off"."""
+    return offer_label(*promotion_index().best(
+        product.price, product.id, product.category_id, product.subcategory_id, product.brand,
+    ))
+
+
+def price_cart(cart):
+    """
+    Price the session cart with the current promotions: PricedCart(lines,
+    subtotal, discount, total). Each line gets its single best promotion;
+    cart minimums are checked against the subtotal before discounts. Products
+    are loaded in one query; lines whose product no longer exists are left out.
+    """
+    products = Product.objects.only(
+        "id", "name", "price", "image", "brand", "category_id", "subcategory_id",
+    ).in_bulk({item["product_id"] for item in cart.values()})
+
+    lines = []
+    for key, item in cart.items():
+        product = products.get(item["product_id"])
+        if product is not None:
+            lines.append({
+                "key": key,   # cart key (product_id or product_id-color)
+                "id": product.id,
+                "name": product.name,
+                "price": product.price,
+                "quantity": item["quantity"],
+                "subtotal": product.price * item["quantity"],
+                "image": product.image,
+                "color": item.get("color"),
+                "product": product,
+            })
+    subtotal = sum((line["subtotal"] for line in lines), ZERO)
+
+    index = promotion_index()
+    discount = ZERO
+    for line in lines:
+        product = line["product"]
+        amount, rule = index.best(
+            product.price, product.id, product.category_id, product.subcategory_id, product.brand, subtotal,
+        )
+        line["discount"] = amount * line["quantity"]
+        line["promotion"] = rule.name if rule else ""
+        line["total"] = line["subtotal"] - line["discount"]
+        discount += line["discount"]
+    return PricedCart(lines, subtotal, discount, subtotal - discount)
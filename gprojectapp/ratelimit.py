@@ -0,0 +1,189 @@
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+# Token buckets kept as GCRA "theoretical arrival times": one number per
+# bucket, the moment the bucket will be full again. Taking a token pushes it
+# forward by one interval; the request is refused if that would put it more
+# than `burst` intervals ahead of now. Same limits as a token bucket that
+# refills `requests` tokens every `per` seconds and holds up to `burst`.
+TAKE_TOKEN_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local new_tat = tat + interval
+local wait = new_tat - now - capacity
+if wait > 0 then
+    redis.call('INCR', KEYS[3])
+    return {0, tostring(wait)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+redis.call('INCR', KEYS[2])
+return {1, tostring(capacity - (new_tat - now))}
+"""
+
+OUTCOMES = ("allowed", "limited")
+
+# TAKE_TOKEN_SCRIPT registered on this process's Redis client
+_take_token_script = None
+_script_lock = threading.Lock()
+
+
+class Decision:
+    def __init__(self, scope, allowed, remaining, retry_after):
+        self.scope = scope
+        self.allowed = allowed
+        # Whole tokens left after this request
+        self.remaining = remaining
+        # Seconds until a token is available again (when refused)
+        self.retry_after = retry_after
+
+
+def bucket_settings(scope):
+    """(seconds per token, bucket capacity in seconds, burst) for a RATE_LIMITS scope."""
+    requests, per, burst = settings.RATE_LIMITS[scope]
+    interval = per / requests
+    return interval, interval * burst, burst
+
+
+def bucket_key(scope, ident):
+    return f"ratelimit:{scope}:{ident}"
+
+
+def counter_key(scope, outcome):
+    return f"ratelimit:count:{scope}:{outcome}"
+
+
+def take_token_script():
+    """
+    TAKE_TOKEN_SCRIPT on a Redis client of our own (sent by EVALSHA once
+    loaded). Keys are built with cache.make_key, so the counters it
+    increments are the ones rate_limit_counters() reads through the cache.
+    """
+    global _take_token_script
+    with _script_lock:
+        if _take_token_script is None:
+            import redis
+
+            _take_token_script = redis.Redis.from_url(settings.REDIS_URL).register_script(TAKE_TOKEN_SCRIPT)
+    return _take_token_script
+
+
+def take_token(scope, ident):
+    """Take one token from `ident`'s bucket for `scope`; constant time, one cache round trip on Redis."""
+    interval, capacity, burst = bucket_settings(scope)
+    now = time.time()
+    key = bucket_key(scope, ident)
+
+    if settings.REDIS_URL:
+        keys = [cache.make_key(k) for k in (key, counter_key(scope, "allowed"), counter_key(scope, "limited"))]
+        allowed, value = take_token_script()(keys=keys, args=[now, interval, capacity])
+        allowed, value = bool(allowed), float(value)
+    else:
+        warn_not_shared()
+        # Other backends have no atomic read-modify-write, so concurrent
+        # requests can occasionally share a token
+        tat = max(cache.get(key, now), now)
+        new_tat = tat + interval
+        wait = new_tat - now - capacity
+        allowed = wait <= 0
+        if allowed:
+            cache.set(key, new_tat, math.ceil(new_tat - now))
+            value = capacity - (new_tat - now)
+        else:
+            value = wait
+        count(scope, "allowed" if allowed else "limited")
+
+    if allowed:
+        return Decision(scope, True, min(int(value / interval + 1e-9), burst), 0)
+    return Decision(scope, False, 0, value)
+
+
+_warned = False
+
+
+def warn_not_shared():
+    global _warned
+    if not _warned:
+        _warned = True
+        logger.warning(
+            "Rate limits are only approximate without REDIS_URL: buckets are "
+            "read and written non-atomically and are not shared between hosts."
+        )
+
+
+def count(scope, outcome):
+    key = counter_key(scope, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def rate_limit_counters():
+    """{scope: {"allowed": n, "limited": n}} since the counters were last cleared."""
+    keys = [counter_key(scope, outcome) for scope in settings.RATE_LIMITS for outcome in OUTCOMES]
+    values = cache.get_many(keys)
+    return {
+        scope: {outcome: int(values.get(counter_key(scope, outcome), 0)) for outcome in OUTCOMES}
+        for scope in settings.RATE_LIMITS
+    }
+
+
+# -------------------- CLIENT IDENTITY --------------------
+def client_ip(request):
+    """
+    The client's address. Behind RATE_LIMIT_TRUSTED_PROXIES proxies it is the
+    entry that many hops from the right of X-Forwarded-For; anything further
+    left was sent by the client and can be forged.
+    """
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def client_ident(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def too_many_requests(decision):
+    response = JsonResponse({"error": "Too many requests. Please slow down."}, status=429)
+    response["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return response
+
+
+# -------------------- DECORATOR --------------------
+def rate_limit(scope):
+    """
+    Limit a view with the RATE_LIMITS[scope] bucket, one bucket per logged-in
+    user (or per IP for visitors) and scope.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            decision = take_token(scope, client_ident(request))
+            if not decision.allowed:
+                return too_many_requests(decision)
+            response = view_func(request, *args, **kwargs)
+            response["X-RateLimit-Remaining"] = str(decision.remaining)
+            return response
+        return _wrapped
+    return decorator
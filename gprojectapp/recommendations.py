@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import catalog_version
+from .metrics import cache_lookup
+from .models import Product, ProductAffinity
+
+
+RECOMMENDATIONS_VERSION_KEY = "recommendations:version"
+WRITE_BATCH_SIZE = 1000
+
+
+# -------------------- TABLE --------------------
+def write_affinities(neighbours):
+    """
+    Replace the stored neighbours of the given products. `neighbours` maps a
+    product id to its (related id, score, count) list, best first.
+    """
+    active = set(Product.objects.filter(is_active=True).values_list("id", flat=True))
+    product_ids = list(neighbours)
+
+    with transaction.atomic():
+        for i in range(0, len(product_ids), WRITE_BATCH_SIZE):
+            ProductAffinity.objects.filter(product_id__in=product_ids[i:i + WRITE_BATCH_SIZE]).delete()
+        ProductAffinity.objects.bulk_create(
+            (
+                ProductAffinity(product_id=product_id, related_id=related_id, score=score, together=count)
+                for product_id, rows in neighbours.items() if product_id in active
+                for related_id, score, count in rows if related_id in active
+            ),
+            batch_size=WRITE_BATCH_SIZE,
+        )
+    bump_recommendations_version()
+
+
+def bump_recommendations_version():
+    if not cache.add(RECOMMENDATIONS_VERSION_KEY, 1, None):
+        try:
+            cache.incr(RECOMMENDATIONS_VERSION_KEY)
+        except ValueError:
+            pass
+
+
+# -------------------- LOOKUP --------------------
+def frequently_bought_with(product_id):
+    """
+    Up to RECOMMENDATIONS_TOP_K products bought by the same customers, best
+    first, as small dicts ready for the template. Cached until the next job
+    run or catalog change.
+    """
+    version = cache.get(RECOMMENDATIONS_VERSION_KEY, 0)
+    key = f"fbt:{version}:{catalog_version()}:{product_id}"
+    items = cache.get(key)
+    cache_lookup("recommendations", items is not None)
+    if items is None:
+        affinities = (
+            ProductAffinity.objects.filter(product_id=product_id, related__is_active=True)
+            .select_related("related")
+            .only("score", "related__id", "related__name", "related__price", "related__image")
+            .order_by("-score")[:settings.RECOMMENDATIONS_TOP_K]
+        )
+        items = [
+            {
+                "id": a.related.id,
+                "name": a.related.name,
+                "price": a.related.price,
+                "image": a.related.image.url if a.related.image else "",
+                "score": a.score,
+            }
+            for a in affinities
+        ]
+        cache.set(key, items, settings.RECOMMENDATIONS_CACHE_TIMEOUT)
+    return items
+
+
+def recommended_for_cart(product_ids, limit=8):
+    """Neighbours of every product in the cart, scores summed, cart items left out."""
+    in_cart = set(product_ids)
+    merged = {}
+    for product_id in in_cart:
+        for item in frequently_bought_with(product_id):
+            if item["id"] in in_cart:
+                continue
+            if item["id"] in merged:
+                merged[item["id"]] = dict(merged[item["id"]], score=merged[item["id"]]["score"] + item["score"])
+            else:
+                merged[item["id"]] = item
+    return sorted(merged.values(), key=lambda item: -item["score"])[:limit]
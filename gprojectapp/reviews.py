@@ -0,0 +1,31 @@
+from .models import Review
+from .pagination import keyset_page
+
+
+REVIEW_PAGE_SIZE = 10
+
+# Each ordering is backed by one of the Review indexes
+REVIEW_SORTS = {
+    "recent": ("-created_at", "-id"),
+    "highest": ("-rating", "-created_at", "-id"),
+    "lowest": ("rating", "-created_at", "-id"),
+    "media": ("-created_at", "-id"),
+}
+
+
+# -------------------- REVIEW FEED --------------------
+def review_page(product_id, sort="recent", cursor=None, size=REVIEW_PAGE_SIZE):
+    """
+    One page of a product's reviews and the cursor for the next page
+    (None on the last page). Reads at most `size + 1` rows whatever the
+    total number of reviews.
+    """
+    ordering = REVIEW_SORTS.get(sort, REVIEW_SORTS["recent"])
+    reviews = (
+        Review.objects.filter(product_id=product_id)
+        .select_related("user")
+        .only("id", "rating", "comment", "image", "video", "has_media", "media_status", "created_at", "user__username")
+    )
+    if sort == "media":
+        reviews = reviews.filter(has_media=True)
+    return keyset_page(reviews, ordering, cursor, size)
@@ -0,0 +1,98 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Apps whose rows must never be read stale (every request reads the session)
+PRIMARY_ONLY_APPS = ("sessions",)
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+# Set by ReplicaRoutingMiddleware for the duration of a request. Outside a
+# request (management commands, workers) there is no state and everything
+# stays on the primary.
+_routing = ContextVar("db_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, replica):
+        # Alias reads go to, or None to keep them on the primary
+        self.replica = replica
+        # Whether anything was written to the primary during the request
+        self.wrote = False
+
+
+def choose_replica():
+    replicas = settings.REPLICA_DATABASES
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def routing(replica):
+    """Route this block's queries as one request; `state.wrote` tells if it wrote."""
+    token = _routing.set(RoutingState(replica))
+    try:
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(note_writes):
+            yield _routing.get()
+    finally:
+        _routing.reset(token)
+
+
+def note_writes(execute, sql, params, many, context):
+    state = _routing.get()
+    if state is not None and not state.wrote and sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+        # Session saves happen on most requests and are always read from the primary
+        if not any(table in sql for table in primary_only_tables()):
+            state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def primary_only_tables():
+    return [
+        f'"{model._meta.db_table}"'
+        for app_label in PRIMARY_ONLY_APPS
+        for model in apps.get_app_config(app_label).get_models()
+    ]
+
+
+@contextmanager
+def primary_db():
+    """Send this block's reads to the primary. Also usable as a view decorator."""
+    state = _routing.get()
+    if state is None:
+        yield
+        return
+    previous, state.replica = state.replica, None
+    try:
+        yield
+    finally:
+        state.replica = previous
+
+
+# -------------------- ROUTER --------------------
+class PrimaryReplicaRouter:
+    """
+    Writes always go to the primary. Reads go to the request's replica unless
+    the request is pinned to the primary (unsafe method, recent write by this
+    visitor, `primary_db()` block) or runs inside a transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.replica is None or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,128 @@
+import hashlib
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import F, Q
+
+from .cache import catalog_version, fresh_catalog_reads, single_flight
+from .metrics import cache_lookup
+from .models import Product, SubCategory
+
+
+SEARCH_CACHE_TIMEOUT = 60 * 10
+FACETS_CACHE_TIMEOUT = 60 * 60 * 24
+
+SEARCH_SORTS = {
+    "price_asc": ("price", "id"),
+    "price_desc": ("-price", "-id"),
+    "newest": ("-created_at", "-id"),
+}
+
+# Everything that decides which products a search returns, in a canonical
+# form, so equivalent query strings share one cache entry
+SearchParams = namedtuple("SearchParams", "query categories subcategories min_price max_price rating sort")
+
+# (catalog version, (subcategories, brands)) last loaded by this process
+_facets = (None, None)
+
+
+# -------------------- NORMALIZING --------------------
+def parse_decimal(value):
+    try:
+        number = Decimal(value)
+    except (InvalidOperation, TypeError):
+        return None
+    return number.normalize() if number.is_finite() and number >= 0 else None
+
+
+def search_params(params):
+    """
+    SearchParams from a QueryDict: `q` lower-cased with whitespace collapsed
+    (matching is case-insensitive anyway), slug lists sorted and deduplicated,
+    numbers parsed (unparseable ones are ignored), unknown sorts dropped.
+    """
+    return SearchParams(
+        query=" ".join(params.get("q", "").split()).lower(),
+        categories=tuple(sorted(set(filter(None, params.getlist("category"))))),
+        subcategories=tuple(sorted(set(filter(None, params.getlist("subcategory"))))),
+        min_price=parse_decimal(params.get("min_price") or None),
+        max_price=parse_decimal(params.get("max_price") or None),
+        rating=parse_decimal(params.get("rating") or None),
+        sort=params.get("sort_by") if params.get("sort_by") in SEARCH_SORTS else "",
+    )
+
+
+def search_cache_key(search):
+    digest = hashlib.md5(repr(tuple(search)).encode()).hexdigest()
+    return f"search:{catalog_version()}:{digest}"
+
+
+# -------------------- RESULTS --------------------
+def search_queryset(search):
+    products = Product.objects.filter(is_active=True)
+
+    if search.query:
+        products = products.filter(
+            Q(name__icontains=search.query) |
+            Q(description__icontains=search.query) |
+            Q(category__name__icontains=search.query) |
+            Q(subcategory__name__icontains=search.query) |
+            Q(brand__icontains=search.query)
+        )
+    if search.categories:
+        products = products.filter(category__slug__in=search.categories)
+    if search.subcategories:
+        products = products.filter(subcategory__slug__in=search.subcategories)
+    # Brands aren't filtered on (the filter is switched off in the view), so
+    # they aren't part of SearchParams either
+    if search.min_price is not None:
+        products = products.filter(price__gte=search.min_price)
+    if search.max_price is not None:
+        products = products.filter(price__lte=search.max_price)
+    if search.rating is not None:
+        # Average stars from the stored histogram: sum(star * n) >= rating * sum(n)
+        stars = [F(f"rating_summary__stars_{star}") for star in range(1, 6)]
+        products = products.alias(
+            review_count=sum(stars[1:], stars[0]),
+            review_points=sum((star * n for star, n in enumerate(stars[1:], start=2)), stars[0]),
+        ).filter(review_count__gt=0, review_points__gte=F("review_count") * search.rating)
+    if search.sort:
+        products = products.order_by(*SEARCH_SORTS[search.sort])
+    return products
+
+
+def search_product_ids(search):
+    """
+    Ordered ids of the products matching a search. Cached per catalog
+    version, so any product change retires every cached result; concurrent
+    misses for one search wait for a single query instead of all running it.
+    """
+    key = search_cache_key(search)
+    ids = cache.get(key)
+    cache_lookup("search", ids is not None)
+    if ids is None:
+        ids = single_flight(key, lambda: list(search_queryset(search).values_list("id", flat=True)), SEARCH_CACHE_TIMEOUT)
+    return ids
+
+
+def search_facets():
+    """(subcategories, brands) for the filter sidebar, cached per catalog version like the menu."""
+    global _facets
+    version = catalog_version()
+    if _facets[0] != version:
+        key = f"search:facets:{version}"
+        facets = cache.get(key)
+        cache_lookup("search_facets", facets is not None)
+        if facets is None:
+            with fresh_catalog_reads():
+                facets = (
+                    list(SubCategory.objects.all()),
+                    list(
+                        Product.objects.values_list("brand", flat=True).distinct()
+                        .exclude(brand__isnull=True).exclude(brand__exact="")
+                    ),
+                )
+            cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+        _facets = (version, facets)
+    return _facets[1]
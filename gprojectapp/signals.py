@@ -0,0 +1,82 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Product, Category, SubCategory, Specification, Color, Banner, MegaMenu, Order, Promotion
+from .orders import invalidate_order_counts
+from .order_events import record_order_event
+from .sitemaps import note_deleted
+
+
+# -------------------------
+# Catalog cache invalidation
+# -------------------------
+# Promotions too: listing badges and the compiled promotion index depend on them
+CATALOG_MODELS = (Product, Category, SubCategory, Specification, Color, Banner, MegaMenu, Promotion)
+
+
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f"catalog_save_{model.__name__}")
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f"catalog_delete_{model.__name__}")
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    note_deleted(instance.id)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def category_deleted(sender, **kwargs):
+    note_deleted()
+
+
+@receiver(m2m_changed, sender=Product.colors.through)
+def product_colors_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_catalog_version()
+
+
+# -------------------------
+# My Orders status counts
+# -------------------------
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    invalidate_order_counts(instance.user_id)
+
+
+# -------------------------
+# Product.sold (suggest ranking)
+# -------------------------
+# A queryset update: no Product signals, so orders don't bump the catalog version
+@receiver(post_save, sender=Order)
+def order_created_sold(sender, instance, created, **kwargs):
+    if created:
+        Product.objects.filter(pk=instance.product_id).update(sold=F("sold") + 1)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted_sold(sender, instance, origin=None, **kwargs):
+    # Nothing to keep in sync when the whole product is being deleted
+    if isinstance(origin, Product):
+        return
+    Product.objects.filter(pk=instance.product_id, sold__gt=0).update(sold=F("sold") - 1)
+
+
+# -------------------------
+# Order change feed
+# -------------------------
+@receiver(post_save, sender=Order)
+def order_saved_event(sender, instance, created, using, **kwargs):
+    record_order_event(instance, "created" if created else None, using=using)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted_event(sender, instance, using, **kwargs):
+    record_order_event(instance, "deleted", using=using)
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import catalog_version
+from .models import Category, Product, SubCategory
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "sitemap.xml"
+PAGES_FILE = "sitemap-pages.xml"
+MANIFEST_FILE = "manifest.json"
+# Pages that aren't derived from catalog rows
+STATIC_PAGES = ("index", "product_list", "about", "contact")
+DELETED_KEY = "sitemap:deleted:{}"
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+SITEMAPINDEX_OPEN = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+
+# -------------------- SHARDS --------------------
+# Products are sharded by id range: shard n holds ids [n * size, (n + 1) * size),
+# so a shard never exceeds the 50,000 URL limit and a changed product maps
+# straight to the one file that lists it.
+def shard_of(product_id):
+    return product_id // settings.SITEMAP_SHARD_SIZE
+
+
+def shard_file(shard):
+    return f"sitemap-products-{shard}.xml"
+
+
+def absolute(path):
+    return escape(settings.SITE_URL.rstrip("/") + path)
+
+
+def url_entry(path, lastmod=None):
+    lastmod = f"<lastmod>{lastmod.isoformat(timespec='seconds')}</lastmod>" if lastmod else ""
+    return f"<url><loc>{absolute(path)}</loc>{lastmod}</url>\n"
+
+
+def write_atomic(name, chunks):
+    path = os.path.join(settings.SITEMAP_DIR, name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+
+
+def write_product_shard(shard):
+    """Rewrite one product shard from an id-range query; returns its lastmod, or None if it is empty."""
+    size = settings.SITEMAP_SHARD_SIZE
+    rows = (
+        Product.objects.filter(is_active=True, id__gte=shard * size, id__lt=(shard + 1) * size)
+        .order_by("id").values_list("id", "updated_at")
+        .iterator(chunk_size=2000)
+    )
+    # One reverse() for the whole shard
+    path = reverse("product_detail", args=[999999999]).replace("999999999", "{}")
+    lastmod = None
+
+    def chunks():
+        nonlocal lastmod
+        yield XML_HEADER + URLSET_OPEN
+        for product_id, updated_at in rows:
+            lastmod = max(lastmod, updated_at) if lastmod else updated_at
+            yield url_entry(path.format(product_id), updated_at)
+        yield "</urlset>\n"
+
+    write_atomic(shard_file(shard), chunks())
+    if lastmod is None:
+        os.remove(os.path.join(settings.SITEMAP_DIR, shard_file(shard)))
+    return lastmod
+
+
+def write_pages():
+    """Static pages, categories and subcategories in one file; returns its lastmod."""
+    categories = list(Category.objects.order_by("id").values_list("id", "updated_at"))
+    subcategories = list(SubCategory.objects.order_by("id").values_list("id", "updated_at"))
+    lastmod = max((updated_at for _, updated_at in categories + subcategories), default=None)
+
+    entries = [url_entry(reverse(name)) for name in STATIC_PAGES]
+    entries += [url_entry(reverse("products_by_category", args=[id]), updated_at) for id, updated_at in categories]
+    entries += [url_entry(reverse("products_by_subcategory", args=[id]), updated_at) for id, updated_at in subcategories]
+    write_atomic(PAGES_FILE, [XML_HEADER, URLSET_OPEN, *entries, "</urlset>\n"])
+    return lastmod
+
+
+def write_index(manifest):
+    def entry(name, lastmod):
+        lastmod = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+        return f"<sitemap><loc>{absolute('/' + name)}</loc>{lastmod}</sitemap>\n"
+
+    entries = [entry(PAGES_FILE, manifest["pages"])]
+    entries += [entry(shard_file(int(shard)), lastmod) for shard, lastmod in sorted(manifest["shards"].items(), key=lambda item: int(item[0]))]
+    write_atomic(INDEX_FILE, [XML_HEADER, SITEMAPINDEX_OPEN, *entries, "</sitemapindex>\n"])
+
+
+# -------------------- MANIFEST --------------------
+def load_manifest():
+    """What the last run wrote: {"generated_at", "catalog_version", "pages", "shards": {shard: lastmod}}, or None."""
+    try:
+        with open(os.path.join(settings.SITEMAP_DIR, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def note_deleted(product_id=None):
+    """
+    Deleted rows leave nothing behind for the updated_at query, so remember
+    when their shard (or the pages file, for categories) last lost a row.
+    Kept in the shared cache, so every host's job sees it.
+    """
+    target = "pages" if product_id is None else shard_of(product_id)
+    cache.set(DELETED_KEY.format(target), time.time(), None)
+
+
+def changed_since(since, known_shards):
+    """(product shards, pages changed?) since `since`, from indexed updated_at lookups and deletion marks."""
+    shards = {shard_of(product_id) for product_id in Product.objects.filter(updated_at__gte=since).values_list("id", flat=True)}
+    pages = (
+        Category.objects.filter(updated_at__gte=since).exists()
+        or SubCategory.objects.filter(updated_at__gte=since).exists()
+    )
+    marks = cache.get_many([DELETED_KEY.format(target) for target in ["pages", *known_shards]])
+    for key, deleted_at in marks.items():
+        if deleted_at >= since.timestamp():
+            target = key.rpartition(":")[2]
+            if target == "pages":
+                pages = True
+            else:
+                shards.add(int(target))
+    return shards, pages
+
+
+def update_sitemaps(full=False):
+    """
+    Bring the sitemap files up to date. Only shards with products changed or
+    deleted since the last run are rewritten; the first run (or `full`)
+    writes everything. Returns (shards written, pages written?).
+    """
+    os.makedirs(settings.SITEMAP_DIR, exist_ok=True)
+    # Read before querying, so a change made during the run is picked up next time
+    started, version = timezone.now(), catalog_version()
+    manifest = None if full else load_manifest()
+
+    if manifest is None:
+        max_id = Product.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        manifest = {"pages": None, "shards": {}}
+        shards, pages = set(range(shard_of(max_id) + 1)), True
+    else:
+        shards, pages = changed_since(datetime.fromisoformat(manifest["generated_at"]), manifest["shards"])
+
+    for shard in sorted(shards):
+        lastmod = write_product_shard(shard)
+        if lastmod:
+            manifest["shards"][str(shard)] = lastmod.isoformat(timespec="seconds")
+        else:
+            manifest["shards"].pop(str(shard), None)
+    if pages:
+        lastmod = write_pages()
+        manifest["pages"] = lastmod.isoformat(timespec="seconds") if lastmod else None
+    if shards or pages:
+        write_index(manifest)
+
+    manifest.update(generated_at=started.isoformat(), catalog_version=version)
+    write_atomic(MANIFEST_FILE, [json.dumps(manifest)])
+    return sorted(shards), pages
+
+
+# -------------------- IN-PROCESS REFRESH --------------------
+_built_version = None
+_build_lock = threading.Lock()
+
+
+def _update_in_background():
+    global _built_version
+    try:
+        version = catalog_version()
+        update_sitemaps()
+        _built_version = version
+    except Exception:
+        logger.exception("Updating the sitemaps failed")
+    finally:
+        connections.close_all()
+        _build_lock.release()
+
+
+def ensure_sitemaps():
+    """Write the sitemaps if this host has none yet, else catch up; run at startup, not per request."""
+    global _built_version
+    manifest = load_manifest()
+    if manifest is None or manifest.get("catalog_version") != catalog_version():
+        update_sitemaps()
+        manifest = load_manifest()
+    _built_version = manifest["catalog_version"]
+
+
+def refresh_if_stale():
+    """
+    After a catalog change (seen through the shared catalog version), update
+    the files once in a background thread while the current ones are served.
+    """
+    if _built_version != catalog_version() and _build_lock.acquire(blocking=False):
+        threading.Thread(target=_update_in_background, name="sitemaps", daemon=True).start()
@@ -0,0 +1,179 @@
+import logging
+import os
+import posixpath
+import re
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+STATIC_TAG_RE = re.compile(r"""{%\s*static\s+['"]([^'"]+)['"]""")
+CSS_URL_RE = re.compile(r"""url\(\s*['"]?([^'")]+)['"]?\s*\)""")
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+SOURCE_MAP_RE = re.compile(r"^\s*//[#@] sourceMappingURL=.*$", re.M)
+JS_LINE_COMMENT_RE = re.compile(r"^[ \t]*//.*$", re.M)
+JS_BLOCK_COMMENT_RE = re.compile(r"^[ \t]*/\*.*?\*/[ \t]*$", re.M | re.S)
+
+logger = logging.getLogger(__name__)
+
+# Files under this prefix come from our own STATICFILES_DIRS and may be pruned
+PRUNABLE_PREFIX = "assets/"
+WEBP_SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# -------------------- TEMPLATE SCAN --------------------
+def template_static_references():
+    """Every path passed to {% static %} in the project's templates."""
+    template_dirs = [str(d) for engine in settings.TEMPLATES for d in engine.get("DIRS", [])]
+    template_dirs += [os.path.join(app.path, "templates") for app in apps.get_app_configs()]
+
+    references = set()
+    for template_dir in template_dirs:
+        for root, _, files in os.walk(template_dir):
+            for filename in files:
+                if not filename.endswith((".html", ".txt", ".xml")):
+                    continue
+                with open(os.path.join(root, filename), encoding="utf-8", errors="ignore") as f:
+                    references.update(path.strip() for path in STATIC_TAG_RE.findall(f.read()))
+    return references
+
+
+def css_references(name, content):
+    """Paths of the files a stylesheet points at with url(), relative to STATIC_ROOT."""
+    base = posixpath.dirname(name)
+    for url in CSS_URL_RE.findall(content):
+        if url.startswith(("data:", "http:", "https:", "//", "#", "/")):
+            continue
+        yield posixpath.normpath(posixpath.join(base, url.split("?")[0].split("#")[0]))
+
+
+def rebase_css_urls(content, source_name, bundle_name):
+    """Rewrite relative url()s so they still resolve from the bundle's location."""
+    source_dir = posixpath.dirname(source_name)
+    bundle_dir = posixpath.dirname(bundle_name)
+
+    def rewrite(match):
+        url = match.group(1)
+        if url.startswith(("data:", "http:", "https:", "//", "#", "/")):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(source_dir, url))
+        return f'url("{posixpath.relpath(target, bundle_dir)}")'
+
+    return CSS_URL_RE.sub(rewrite, content)
+
+
+def minify_css(content):
+    content = CSS_COMMENT_RE.sub("", content)
+    content = re.sub(r"\s+", " ", content)
+    content = re.sub(r"\s*([{};])\s*", r"\1", content)
+    return content.replace(";}", "}").strip()
+
+
+def minify_js(content):
+    """
+    Conservative whitespace/comment stripping: only comments that sit on their own
+    lines are removed and line breaks are kept, so ASI and string contents are untouched.
+    """
+    content = JS_BLOCK_COMMENT_RE.sub("", content)
+    content = JS_LINE_COMMENT_RE.sub("", content)
+    return "\n".join(line.strip() for line in content.splitlines() if line.strip())
+
+
+def webp_name(name):
+    return os.path.splitext(name)[0] + ".webp"
+
+
+# -------------------- STORAGE --------------------
+class OptimizedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Whitenoise's hashed, precompressed storage with three extra collectstatic steps:
+
+    * files under assets/ that no template (or referenced stylesheet) uses are dropped,
+    * the stylesheets and scripts in settings.STATIC_BUNDLES are combined into one file each,
+    * large JPEG/PNG images get a re-encoded WebP sibling.
+
+    Bundles and WebP files then go through the normal hashing and Brotli/gzip steps.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            self.prune_unreferenced(paths)
+            self.build_bundles(paths)
+            self.build_webp_images(paths)
+        yield from super().post_process(paths, dry_run, **options)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Templates still reference a few images that were never added. Serving the
+            # unhashed URL keeps those pages up, but the broken reference must be fixed.
+            logger.error("Static file %r is missing from the manifest; run collectstatic or fix the reference", name)
+            return name
+
+    def _replace(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
+
+    def read_text(self, paths, name):
+        storage, path = paths[name]
+        with storage.open(path) as f:
+            return f.read().decode("utf-8")
+
+    def prune_unreferenced(self, paths):
+        keep = template_static_references()
+        for members in settings.STATIC_BUNDLES.values():
+            keep.update(members)
+        for name in list(keep):
+            if name.endswith(".css") and name in paths:
+                keep.update(css_references(name, self.read_text(paths, name)))
+        keep.update(f"{name}.map" for name in list(keep))
+
+        for name in list(paths):
+            if name.startswith(PRUNABLE_PREFIX) and name not in keep:
+                del paths[name]
+                if self.exists(name):
+                    self.delete(name)
+
+    def build_bundles(self, paths):
+        for bundle_name, members in settings.STATIC_BUNDLES.items():
+            parts = []
+            for member in members:
+                content = SOURCE_MAP_RE.sub("", self.read_text(paths, member))
+                if bundle_name.endswith(".css"):
+                    parts.append(minify_css(rebase_css_urls(content, member, bundle_name)))
+                else:
+                    if not member.endswith(".min.js"):
+                        content = minify_js(content)
+                    parts.append(content.strip() + "\n;")
+            self._replace(bundle_name, "\n".join(parts).encode("utf-8"))
+            paths[bundle_name] = (self, bundle_name)
+
+    def build_webp_images(self, paths):
+        from PIL import Image
+
+        min_size = settings.STATIC_WEBP_MIN_SIZE
+        max_width = settings.STATIC_WEBP_MAX_WIDTH
+        for name in list(paths):
+            if not name.lower().endswith(WEBP_SOURCE_EXTENSIONS) or webp_name(name) in paths:
+                continue
+            storage, path = paths[name]
+            if storage.size(path) < min_size:
+                continue
+
+            with storage.open(path) as f:
+                img = Image.open(f)
+                img.load()
+            if img.width > max_width:
+                img.thumbnail((max_width, max_width * img.height // img.width), Image.Resampling.LANCZOS)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+            buffer = BytesIO()
+            img.save(buffer, format="WEBP", quality=80, method=6)
+            if buffer.tell() < storage.size(path):
+                self._replace(webp_name(name), buffer.getvalue())
+                paths[webp_name(name)] = (self, webp_name(name))
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+
+MEDIA_URL_LRU_SIZE = 4096
+MEDIA_URL_CACHE_TIMEOUT = 60 * 60 * 24
+
+# A blob may be stored before the row naming it is committed; the garbage
+# collector leaves blobs younger than this alone
+ORPHAN_GRACE = timedelta(days=1)
+
+
+# -------------------- WRAPPING --------------------
+@deconstructible
+class WrappedStorage(Storage):
+    """
+    A storage that hands every operation to another backend, given as a
+    dotted path plus options the way STORAGES entries are. The backend is
+    only built on first use, so the cloudinary SDK stays out of startup.
+    Subclasses override the operations they change.
+    """
+
+    def __init__(self, backend="django.core.files.storage.FileSystemStorage", options=None):
+        self.backend_path = backend
+        self.backend_options = options or {}
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = import_string(self.backend_path)(**self.backend_options)
+        return self._backend
+
+    @property
+    def base_backend(self):
+        """The storage at the bottom of a chain of wrappers."""
+        backend = self.backend
+        while isinstance(backend, WrappedStorage):
+            backend = backend.backend
+        return backend
+
+    def _open(self, name, mode="rb"):
+        return self.backend.open(name, mode)
+
+    def save(self, name, content, max_length=None):
+        return self.backend.save(name, content, max_length=max_length)
+
+    def delete(self, name):
+        return self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_valid_name(self, name):
+        return self.backend.get_valid_name(name)
+
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length=max_length)
+
+    def generate_filename(self, filename):
+        return self.backend.generate_filename(filename)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+# -------------------- URL MEMOIZATION --------------------
+def cloudinary_url(backend, name, transformation):
+    """A Cloudinary URL with transformations (resize, format, ...) applied."""
+    import cloudinary
+
+    resource = cloudinary.CloudinaryResource(
+        backend._prepend_prefix(name), default_resource_type=backend._get_resource_type(name),
+    )
+    return resource.build_url(**transformation)
+
+
+@deconstructible
+class CachedURLStorage(WrappedStorage):
+    """
+    Memoizes url() per file name and transformation: first in a bounded
+    per-process LRU, then in the shared cache, so a new worker doesn't
+    rebuild every URL a catalog page needs. A URL only depends on the name
+    (and the backend's settings), and saved names are never reused for
+    other content, so entries need no invalidation beyond delete().
+    """
+
+    def __init__(self, backend="django.core.files.storage.FileSystemStorage", options=None,
+                 lru_size=MEDIA_URL_LRU_SIZE, shared_cache=True):
+        super().__init__(backend, options)
+        self.lru_size = lru_size
+        self.shared_cache = shared_cache
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache_key(self, name, transformation):
+        raw = f"{self.backend_path}|{self.backend_options}|{settings.MEDIA_URL}|{name}|{sorted(transformation.items())}"
+        return "media-url:" + hashlib.md5(raw.encode()).hexdigest()
+
+    def build_url(self, name, transformation):
+        # Only Cloudinary applies transformations; other backends serve the original
+        if transformation and hasattr(self.base_backend, "_get_resource_type"):
+            return cloudinary_url(self.base_backend, name, transformation)
+        return self.backend.url(name)
+
+    def url(self, name, **transformation):
+        key = (name, tuple(sorted(transformation.items())))
+        try:
+            url = self._urls[key]
+            self._urls.move_to_end(key)
+            return url
+        except KeyError:
+            pass
+
+        url = None
+        if self.shared_cache:
+            cache_key = self.cache_key(name, transformation)
+            url = cache.get(cache_key)
+        if url is None:
+            url = self.build_url(name, transformation)
+            if self.shared_cache:
+                cache.set(cache_key, url, MEDIA_URL_CACHE_TIMEOUT)
+
+        with self._lock:
+            self._urls[key] = url
+            if len(self._urls) > self.lru_size:
+                self._urls.popitem(last=False)
+        return url
+
+    def delete(self, name):
+        with self._lock:
+            for key in [key for key in self._urls if key[0] == name]:
+                del self._urls[key]
+        if self.shared_cache:
+            cache.delete(self.cache_key(name, {}))
+        return super().delete(name)
+
+
+
+# -------------------- DEDUPLICATION --------------------
+def content_digest(content):
+    """(SHA-256 hex digest, size) of a File, read chunk by chunk and rewound."""
+    sha, size = hashlib.sha256(), 0
+    for chunk in content.chunks():
+        sha.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return sha.hexdigest(), size
+
+
+def blob_name(digest, name):
+    return f"blobs/{digest[:2]}/{digest}{os.path.splitext(name)[1].lower()}"
+
+
+@deconstructible
+class DedupStorage(WrappedStorage):
+    """
+    Stores each distinct content once, under its digest, whatever name it
+    was uploaded as. Re-uploading a photo (a duplicated product, a banner
+    saved again) returns the existing blob's name without transferring it,
+    so identical images also share one URL and one CDN cache entry.
+
+    Every save counts a reference on the blob and delete() drops one; the
+    file itself is only removed by collect_garbage(), once no file field
+    names it any more.
+    """
+
+    def save(self, name, content, max_length=None):
+        from .models import MediaBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest, size = content_digest(content)
+        while True:
+            blob = MediaBlob.objects.filter(digest=digest).first()
+            if blob is None:
+                blob = self.store_blob(name, content, digest, size, max_length)
+            # Zero rows when the collector removed the blob in between: store it again
+            if MediaBlob.objects.filter(pk=blob.pk).update(refs=F("refs") + 1):
+                return blob.name
+
+    def store_blob(self, name, content, digest, size, max_length):
+        from .models import MediaBlob
+
+        stored = self.backend.save(blob_name(digest, name), content, max_length=max_length)
+        try:
+            with transaction.atomic():
+                return MediaBlob.objects.create(digest=digest, name=stored, size=size)
+        except IntegrityError:
+            # The same content was stored concurrently; keep the other copy
+            self.backend.delete(stored)
+            return MediaBlob.objects.get(digest=digest)
+
+    def delete(self, name):
+        from .models import MediaBlob
+
+        blob = MediaBlob.objects.filter(name=name)
+        if blob.exists():
+            blob.filter(refs__gt=0).update(refs=F("refs") - 1)
+        else:
+            # Names from before deduplication (or a blob just collected) aren't shared
+            self.backend.delete(name)
+
+
+def referenced_names():
+    """Counter of stored names across every file field on the default storage."""
+    counts = Counter()
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and field.storage is default_storage:
+                names = model._base_manager.exclude(**{f"{field.attname}__isnull": True}).exclude(**{field.attname: ""})
+                counts.update(names.values_list(field.attname, flat=True).iterator())
+    return counts
+
+
+def collect_garbage(grace=ORPHAN_GRACE, dry_run=False):
+    """
+    Recount blob references from the file fields and remove blobs nothing
+    names. A blob saved again while this runs has its count changed, which
+    the conditional updates below notice, so it is kept. Returns (blobs
+    removed, bytes freed).
+    """
+    from .models import MediaBlob
+
+    seen = dict(MediaBlob.objects.values_list("id", "refs"))
+    counts = referenced_names()
+    cutoff = timezone.now() - grace
+    removed = freed = 0
+    for blob in MediaBlob.objects.filter(id__in=seen).iterator():
+        refs = counts.get(blob.name, 0)
+        if refs:
+            if refs != seen[blob.id] and not dry_run:
+                MediaBlob.objects.filter(pk=blob.pk, refs=seen[blob.id]).update(refs=refs)
+        elif blob.created_at < cutoff:
+            if not dry_run:
+                if not MediaBlob.objects.filter(pk=blob.pk, refs=seen[blob.id]).delete()[0]:
+                    continue
+                # With the row gone, this deletes the file and drops any memoized URL
+                default_storage.delete(blob.name)
+            removed += 1
+            freed += blob.size
+    return removed, freed
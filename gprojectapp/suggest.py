@@ -0,0 +1,235 @@
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import connections
+from django.urls import reverse
+
+from .cache import catalog_import_running, catalog_version, fresh_catalog_reads
+from .models import Product, Category, SubCategory
+
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_LIMIT = 8
+MIN_QUERY_LENGTH = 2
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SHARED_LATEST_KEY = "suggest:latest"
+SHARED_ENTRIES_TIMEOUT = 24 * 60 * 60
+BUILD_LOCK_KEY = "suggest:building"
+BUILD_LOCK_TIMEOUT = 5 * 60
+# Catalog versions move on every product save, import chunk and promotion,
+# so the shared entries are rebuilt at most this often (and not during an import)
+REBUILD_INTERVAL = 60
+# How often a process with an out-of-date index looks in the cache for a newer one
+CHECK_INTERVAL = 5
+
+Suggestion = namedtuple("Suggestion", "label kind url popularity tokens")
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return TOKEN_RE.findall(text)
+
+
+# -------------------- INDEX --------------------
+class SuggestIndex:
+    """
+    Sorted-array prefix index. Entries are stored most popular first, and every
+    word of every label points back at its entry, so one bisect finds all
+    entries with a word starting with the query.
+    """
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: (-entry.popularity, entry.label))
+        pairs = sorted(
+            (token, rank)
+            for rank, entry in enumerate(self.entries)
+            for token in set(entry.tokens)
+        )
+        self.tokens = [token for token, _ in pairs]
+        self.ranks = [rank for _, rank in pairs]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def prefix_range(self, prefix):
+        lo = bisect_left(self.tokens, prefix)
+        return lo, bisect_left(self.tokens, prefix + "\x7f", lo)
+
+    def search(self, query, limit=SUGGEST_LIMIT):
+        words = tokenize(query)
+        if not words:
+            return []
+        # Look up by the word with the fewest matches, then check the others
+        lo, hi = min((self.prefix_range(word) for word in words), key=lambda r: r[1] - r[0])
+
+        candidates = set(self.ranks[lo:hi])
+        if len(words) == 1:
+            return [self.entries[rank] for rank in heapq.nsmallest(limit, candidates)]
+
+        results = []
+        for rank in sorted(candidates):
+            entry = self.entries[rank]
+            if all(any(token.startswith(word) for token in entry.tokens) for word in words):
+                results.append(entry)
+                if len(results) == limit:
+                    break
+        return results
+
+
+def search_url(**params):
+    return f"{reverse('search')}?{urlencode(params)}"
+
+
+def build_entries():
+    """
+    Suggestions for active product names, brands, categories and subcategories,
+    ranked by orders (Product.sold, so no join on the orders table).
+    """
+    entries = []
+    brands, categories, subcategories = {}, {}, {}
+
+    products = Product.objects.filter(is_active=True).values_list(
+        "id", "name", "brand", "category_id", "subcategory_id", "sold",
+    )
+    for product_id, name, brand, category_id, subcategory_id, sold in products.iterator(chunk_size=5000):
+        entries.append(Suggestion(name, "product", reverse("product_detail", args=[product_id]), sold, tokenize(name)))
+        if brand and brand.strip():
+            brands[brand.strip()] = brands.get(brand.strip(), 0) + sold + 1
+        categories[category_id] = categories.get(category_id, 0) + sold
+        subcategories[subcategory_id] = subcategories.get(subcategory_id, 0) + sold
+
+    for brand, popularity in brands.items():
+        entries.append(Suggestion(brand, "brand", search_url(q=brand), popularity, tokenize(brand)))
+
+    for category_id, name, slug in Category.objects.values_list("id", "name", "slug"):
+        popularity = categories.get(category_id, 0) + 1
+        entries.append(Suggestion(name, "category", search_url(category=slug), popularity, tokenize(name)))
+
+    for subcategory_id, name, slug in SubCategory.objects.values_list("id", "name", "slug"):
+        popularity = subcategories.get(subcategory_id, 0) + 1
+        entries.append(Suggestion(name, "subcategory", search_url(subcategory=slug), popularity, tokenize(name)))
+
+    return entries
+
+
+# -------------------- SHARED ENTRIES --------------------
+# One process builds the entries for a catalog version and stores them in the
+# cache; every other worker loads them from there instead of querying.
+def entries_key(version):
+    return f"suggest:entries:{version}"
+
+
+def rebuild_due(latest):
+    return not catalog_import_running() and time.time() - latest["built_at"] >= REBUILD_INTERVAL
+
+
+def publish_entries(version):
+    """Build the entries for `version` and share them; None if another process is building."""
+    if not cache.add(BUILD_LOCK_KEY, True, BUILD_LOCK_TIMEOUT):
+        return None
+    try:
+        with fresh_catalog_reads():
+            entries = build_entries()
+        cache.set(entries_key(version), entries, SHARED_ENTRIES_TIMEOUT)
+        # Entries first: whoever reads the pointer can load them
+        cache.set(SHARED_LATEST_KEY, {"version": version, "built_at": time.time()}, SHARED_ENTRIES_TIMEOUT)
+    finally:
+        cache.delete(BUILD_LOCK_KEY)
+    return entries
+
+
+def shared_entries(have=None):
+    """
+    (catalog version, entries) this process should serve, or None to keep its
+    index built from version `have`. Shared entries that are behind the
+    catalog are rebuilt first when a rebuild is due.
+    """
+    # Read the version first so a change made mid-build triggers another rebuild
+    version = catalog_version()
+    latest = cache.get(SHARED_LATEST_KEY)
+    rebuild = latest is None or (latest["version"] != version and rebuild_due(latest))
+    if not rebuild and latest["version"] == have:
+        return None
+
+    entries = None if rebuild else cache.get(entries_key(latest["version"]))
+    if entries is None:
+        # Never built, due for a rebuild, or evicted from the cache
+        built = publish_entries(version)
+        if built is not None:
+            return version, built
+        # Another process is building; serve what was shared before
+        if latest is None or latest["version"] == have:
+            return None
+        entries = cache.get(entries_key(latest["version"]))
+    return None if entries is None else (latest["version"], entries)
+
+
+# -------------------- PROCESS-WIDE INSTANCE --------------------
+_index = None
+_index_version = None
+_checked_at = 0
+_build_lock = threading.Lock()
+
+
+def warm_suggest_index():
+    """Load (or build) the index now instead of on the first suggest request."""
+    with _build_lock:
+        if _index is None or _index_version != catalog_version():
+            _refresh()
+    return _index
+
+
+def _refresh():
+    global _index, _index_version, _checked_at
+    _checked_at = time.monotonic()
+    shared = shared_entries(_index_version)
+    if shared is None:
+        if _index is not None:
+            return
+        # First start with another process still building: don't wait for it
+        shared = catalog_version(), build_entries()
+    version, entries = shared
+    _index, _index_version = SuggestIndex(entries), version
+
+
+def _refresh_in_background():
+    try:
+        _refresh()
+    except Exception:
+        logger.exception("Refreshing the search suggest index failed")
+    finally:
+        connections.close_all()
+        _build_lock.release()
+
+
+def current_index():
+    """
+    This process's index. After a catalog change (seen through the shared
+    catalog version) a background thread picks up the shared entries, or
+    rebuilds them, while the old index keeps answering.
+    """
+    if _index is None:
+        return warm_suggest_index()
+    if (
+        _index_version != catalog_version()
+        and time.monotonic() - _checked_at >= CHECK_INTERVAL
+        and _build_lock.acquire(blocking=False)
+    ):
+        threading.Thread(target=_refresh_in_background, name="suggest-index", daemon=True).start()
+    return _index
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    if len(query.strip()) < MIN_QUERY_LENGTH:
+        return []
+    return current_index().search(query, limit)
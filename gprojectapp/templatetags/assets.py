@@ -0,0 +1,49 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from gprojectapp.staticfiles import webp_name
+
+register = template.Library()
+
+
+def bundles_enabled():
+    return not settings.DEBUG and name_in_manifest(next(iter(settings.STATIC_BUNDLES), ""))
+
+
+def name_in_manifest(name):
+    return name in getattr(staticfiles_storage, "hashed_files", {})
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    <link>/<script> tags for a bundle from settings.STATIC_BUNDLES: the single
+    built file once collectstatic has made it, otherwise each member file.
+    """
+    files = [name] if bundles_enabled() else settings.STATIC_BUNDLES[name]
+    if name.endswith(".css"):
+        return format_html_join("\n", '<link href="{}" rel="stylesheet">', ((static(f),) for f in files))
+    return format_html_join("\n", '<script src="{}"></script>', ((static(f),) for f in files))
+
+
+@register.simple_tag
+def preload(path, as_type, mime_type=""):
+    """<link rel=preload> for a static file, pointing at its WebP version when there is one."""
+    if as_type == "image" and name_in_manifest(webp_name(path)):
+        path, mime_type = webp_name(path), "image/webp"
+    if as_type == "font":
+        return format_html('<link rel="preload" href="{}" as="font" type="{}" crossorigin>', static(path), mime_type)
+    if mime_type:
+        return format_html('<link rel="preload" href="{}" as="{}" type="{}">', static(path), as_type, mime_type)
+    return format_html('<link rel="preload" href="{}" as="{}">', static(path), as_type)
+
+
+@register.simple_tag
+def webp_source(path):
+    """<source> for the WebP version collectstatic made of a static image, if any."""
+    if not name_in_manifest(webp_name(path)):
+        return ""
+    return format_html('<source srcset="{}" type="image/webp">', static(webp_name(path)))
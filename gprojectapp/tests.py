@@ -1,3 +1,471 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import promotions, suggest
+from .cache import CATALOG_CHANGED_KEY, catalog_version, fresh_catalog_reads, mark_catalog_import
+from .importtime import IMPORT_BUDGET_MS, profile_startup
+from .middleware import ReplicaRoutingMiddleware
+from .models import Category, MediaBlob, Order, OrderExport, Product, Promotion, Review
+from .pagination import decode_cursor, encode_cursor
+from .promotions import ZERO, PromotionIndex, Rule, promotion_index
+from .reviews import REVIEW_SORTS
+from .routers import primary_db, routing
+from .storage import ORPHAN_GRACE, CachedURLStorage, collect_garbage, referenced_names
+
+
+# Local files instead of Cloudinary, for anything that builds media URLs
+FILE_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class StartupImportTests(SimpleTestCase):
+    """Cold starts on every deploy: keep django.setup() lean."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.profile = profile_startup()
+
+    def test_heavy_dependencies_load_lazily(self):
+        self.assertEqual(self.profile.eager_lazy_modules(), [])
+
+    def test_import_time_within_budget(self):
+        self.assertLess(
+            self.profile.total_ms, IMPORT_BUDGET_MS,
+            f"Startup imports took {self.profile.total_ms:.0f} ms; see `manage.py profile_startup`",
+        )
+
+
+class CursorTests(TestCase):
+    """Cursors come from the query string, so any value must be handled."""
+
+    MALFORMED = ([[1], 5], [{"a": 1}, 5], [5, [1]], ["2024-13-45", 5], [None, 5], [1], "x", {"a": 1})
+
+    def cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def test_malformed_cursors_are_ignored(self):
+        for values in self.MALFORMED:
+            with self.subTest(values=values):
+                self.assertIsNone(decode_cursor(self.cursor(values), REVIEW_SORTS["recent"], Review))
+        for cursor in ("not base64!", "", "e30"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, REVIEW_SORTS["recent"], Review))
+
+    def test_review_feed_serves_first_page_for_malformed_cursor(self):
+        for values in self.MALFORMED:
+            with self.subTest(values=values):
+                response = self.client.get("/products/1/reviews/", {"cursor": self.cursor(values)})
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.json()["next_cursor"])
+
+    def test_valid_cursor_round_trips(self):
+        review = Review(id=7, created_at=timezone.now())
+        cursor = encode_cursor(review, REVIEW_SORTS["recent"])
+        self.assertEqual(decode_cursor(cursor, REVIEW_SORTS["recent"], Review), [review.created_at, 7])
+
+
+class PromotionIndexTests(SimpleTestCase):
+    """Choosing a discount from the compiled tiers, without the database."""
+
+    def index(self, *rules):
+        return PromotionIndex([(("all", None), Rule(i, f"rule {i}", kind, Decimal(value), Decimal(minimum)))
+                               for i, (kind, value, minimum) in enumerate(rules, start=1)], None)
+
+    def test_larger_of_percent_and_flat_per_price(self):
+        index = self.index(("percent", "10", "0"), ("flat", "15", "0"))
+        amount, rule = index.best(Decimal("100"), 1)
+        self.assertEqual((amount, rule.kind), (Decimal("15"), "flat"))
+        amount, rule = index.best(Decimal("500"), 1)
+        self.assertEqual((amount, rule.kind), (Decimal("50.00"), "percent"))
+        # A flat discount never exceeds the price
+        amount, rule = index.best(Decimal("10"), 1)
+        self.assertEqual((amount, rule.kind), (Decimal("10"), "flat"))
+
+    def test_percent_is_rounded_to_paise(self):
+        amount, _ = self.index(("percent", "12.5", "0")).best(Decimal("9.99"), 1)
+        self.assertEqual(amount, Decimal("1.25"))
+
+    def test_tiers_follow_min_cart_total(self):
+        index = self.index(("percent", "5", "0"), ("percent", "10", "1000"), ("flat", "50", "2000"))
+        price = Decimal("300")
+        self.assertEqual(index.best(price, 1, cart_total=Decimal("999.99"))[0], Decimal("15.00"))
+        self.assertEqual(index.best(price, 1, cart_total=Decimal("1000"))[0], Decimal("30.00"))
+        self.assertEqual(index.best(price, 1, cart_total=Decimal("2000"))[0], Decimal("50"))
+        # Lower tiers stay available above their minimum
+        self.assertEqual(index.best(Decimal("1000"), 1, cart_total=Decimal("2500"))[0], Decimal("100.00"))
+
+    def test_no_rule_below_its_minimum(self):
+        index = self.index(("flat", "50", "1000"))
+        self.assertEqual(index.best(Decimal("300"), 1, cart_total=Decimal("999")), (ZERO, None))
+
+    def test_best_rule_across_scopes(self):
+        index = PromotionIndex([
+            (("all", None), Rule(1, "site", "percent", Decimal("20"), ZERO)),
+            (("product", 7), Rule(2, "product", "percent", Decimal("5"), ZERO)),
+        ], None)
+        self.assertEqual(index.best(Decimal("100"), 7)[1].name, "site")
+
+
+@override_settings(STORAGES=FILE_STORAGES)
+class PromotionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        promotions._index = (None, None)
+        self.category = Category.objects.create(name="Shoes", slug="shoes")
+        Product.objects.bulk_create([
+            Product(name="Runner", category=self.category, price=Decimal("1000"), image="products/runner.jpg"),
+            Product(name="Sock", category=self.category, price=Decimal("100"), image="products/sock.jpg"),
+        ])
+        self.runner, self.sock = Product.objects.get(name="Runner"), Product.objects.get(name="Sock")
+
+    def test_expiry_bumps_catalog_version_once(self):
+        now = timezone.now()
+        Promotion.objects.create(name="Sale", kind="percent", value=Decimal("10"), scope="all", ends_at=now + timedelta(hours=1))
+        self.assertEqual(promotion_index().best(self.runner.price, self.runner.id)[0], Decimal("100.00"))
+        version = catalog_version()
+
+        with mock.patch("django.utils.timezone.now", return_value=now + timedelta(hours=2)):
+            index = promotion_index()
+            self.assertEqual(index.best(self.runner.price, self.runner.id), (ZERO, None))
+            self.assertEqual(catalog_version(), version + 1)
+            promotion_index()
+            # Another process noticing the same boundary doesn't bump again
+            promotions._index = (None, None)
+            cache.delete(f"promotions:{version + 1}")
+            promotion_index()
+        self.assertEqual(catalog_version(), version + 1)
+
+    def test_future_promotion_starts_on_time(self):
+        now = timezone.now()
+        Promotion.objects.create(name="Later", kind="flat", value=Decimal("50"), scope="all", starts_at=now + timedelta(hours=1))
+        self.assertEqual(promotion_index().best(self.sock.price, self.sock.id), (ZERO, None))
+        with mock.patch("django.utils.timezone.now", return_value=now + timedelta(hours=2)):
+            self.assertEqual(promotion_index().best(self.sock.price, self.sock.id)[0], Decimal("50"))
+
+    def test_order_confirmation_stores_discounted_totals(self):
+        Promotion.objects.create(name="Shoe week", kind="percent", value=Decimal("10"), scope="category", category=self.category)
+        Promotion.objects.create(name="Big cart", kind="flat", value=Decimal("150"), scope="product", product=self.runner,
+                                 min_cart_total=Decimal("2000"))
+        user = User.objects.create_user("buyer", password="pw")
+        self.client.force_login(user)
+        session = self.client.session
+        session.update({
+            "cart": {
+                str(self.runner.id): {"product_id": self.runner.id, "quantity": 2},
+                str(self.sock.id): {"product_id": self.sock.id, "quantity": 3},
+            },
+            "full_name": "Buyer", "phone": "9999999999", "address_line": "1 Road",
+            "city": "Noida", "state": "Uttar Pradesh", "pincode": "201301", "payment_method": "cod",
+        })
+        session.save()
+
+        response = self.client.get(reverse("order_confirmation"))
+        self.assertEqual(response.status_code, 200)
+        orders = {order.product_id: order for order in Order.objects.filter(user=user)}
+        # Subtotal 2300 reaches the runner's flat tier, which beats 10% of 1000
+        self.assertEqual((orders[self.runner.id].discount, orders[self.runner.id].total_price), (300.0, 1700.0))
+        self.assertEqual(orders[self.runner.id].promotion, "Big cart")
+        self.assertEqual((orders[self.sock.id].discount, orders[self.sock.id].total_price), (30.0, 270.0))
+        self.assertEqual(orders[self.sock.id].promotion, "Shoe week")
+        self.assertNotIn("cart", self.client.session)
+
+
+class CachedURLStorageTests(SimpleTestCase):
+    """URL memoization over a local stand-in for Cloudinary."""
+
+    def setUp(self):
+        cache.clear()
+        self.location = self.enterContext(tempfile.TemporaryDirectory())
+
+    def storage(self, **kwargs):
+        return CachedURLStorage(
+            "django.core.files.storage.FileSystemStorage",
+            {"location": self.location, "base_url": "/media/"},
+            **kwargs,
+        )
+
+    def test_lru_evicts_least_recently_used(self):
+        storage = self.storage(lru_size=2, shared_cache=False)
+        with mock.patch.object(storage.backend, "url", wraps=storage.backend.url) as url:
+            storage.url("a.jpg")
+            storage.url("b.jpg")
+            storage.url("a.jpg")
+            storage.url("c.jpg")
+            self.assertEqual(url.call_count, 3)
+            self.assertEqual([name for name, _ in storage._urls], ["a.jpg", "c.jpg"])
+            self.assertEqual(storage.url("b.jpg"), "/media/b.jpg")
+            self.assertEqual(url.call_count, 4)
+
+    def test_transformations_are_memoized_separately(self):
+        storage = self.storage(shared_cache=False)
+        storage.url("a.jpg")
+        storage.url("a.jpg", width=200)
+        self.assertEqual(len(storage._urls), 2)
+
+    def test_shared_cache_fills_other_processes(self):
+        first = self.storage()
+        self.assertEqual(first.url("a.jpg"), "/media/a.jpg")
+        self.assertEqual(cache.get(first.cache_key("a.jpg", {})), "/media/a.jpg")
+
+        # A fresh instance stands in for another worker with an empty LRU
+        second = self.storage()
+        with mock.patch.object(second.backend, "url") as url:
+            self.assertEqual(second.url("a.jpg"), "/media/a.jpg")
+        url.assert_not_called()
+
+    def test_delete_drops_memoized_urls(self):
+        storage = self.storage()
+        name = storage.save("a.jpg", ContentFile(b"image"))
+        storage.url(name)
+        storage.url(name, width=200)
+        storage.delete(name)
+        self.assertEqual(storage._urls, {})
+        self.assertIsNone(cache.get(storage.cache_key(name, {})))
+        self.assertFalse(storage.exists(name))
+
+
+class DedupStorageTests(TestCase):
+    """Reference counting and garbage collection of content-addressed blobs."""
+
+    def setUp(self):
+        self.location = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(STORAGES={
+            **FILE_STORAGES,
+            "default": {
+                "BACKEND": "gprojectapp.storage.DedupStorage",
+                "OPTIONS": {"backend": "django.core.files.storage.FileSystemStorage", "options": {"location": self.location}},
+            },
+        }))
+        self.storage = default_storage
+
+    def blob(self, name="photo.jpg", content=b"same pixels"):
+        stored = self.storage.save(name, ContentFile(content))
+        return MediaBlob.objects.get(name=stored)
+
+    def age(self, blob, **delta):
+        MediaBlob.objects.filter(pk=blob.pk).update(created_at=timezone.now() - ORPHAN_GRACE - timedelta(**delta))
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save("products/a.jpg", ContentFile(b"same pixels"))
+        second = self.storage.save("banners/b.jpg", ContentFile(b"same pixels"))
+        self.assertEqual(first, second)
+        self.assertEqual(MediaBlob.objects.get().refs, 2)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.location)), 1)
+
+    def test_delete_drops_a_reference_and_keeps_the_file(self):
+        blob = self.blob()
+        self.storage.save("other.jpg", ContentFile(b"same pixels"))
+        self.storage.delete(blob.name)
+        blob.refresh_from_db()
+        self.assertEqual(blob.refs, 1)
+        self.assertTrue(self.storage.exists(blob.name))
+
+    def test_collect_garbage(self):
+        category = Category.objects.create(name="Shoes", slug="shoes")
+        referenced = self.blob("a.jpg", b"referenced")
+        Product.objects.bulk_create([Product(name="Runner", category=category, price=Decimal("1"), image=referenced.name)])
+        orphan = self.blob("b.jpg", b"orphan")
+        young = self.blob("c.jpg", b"young orphan")
+        for blob in (referenced, orphan):
+            self.age(blob, hours=1)
+        # A stale count is corrected from the file fields
+        MediaBlob.objects.filter(pk=referenced.pk).update(refs=5)
+
+        self.assertEqual(collect_garbage(dry_run=True), (1, orphan.size))
+        self.assertTrue(MediaBlob.objects.filter(pk=orphan.pk).exists())
+
+        self.assertEqual(collect_garbage(), (1, orphan.size))
+        self.assertFalse(MediaBlob.objects.filter(pk=orphan.pk).exists())
+        self.assertFalse(self.storage.exists(orphan.name))
+        self.assertEqual(MediaBlob.objects.get(pk=referenced.pk).refs, 1)
+        self.assertTrue(self.storage.exists(referenced.name))
+        self.assertTrue(self.storage.exists(young.name))
+
+    def test_blob_saved_again_during_collection_survives(self):
+        orphan = self.blob("b.jpg", b"orphan")
+        self.age(orphan, hours=1)
+
+        def counts_then_upload():
+            counts = referenced_names()
+            # Uploaded again after the references were counted
+            self.storage.save("again.jpg", ContentFile(b"orphan"))
+            return counts
+
+        with mock.patch("gprojectapp.storage.referenced_names", side_effect=counts_then_upload):
+            self.assertEqual(collect_garbage(), (0, 0))
+        self.assertEqual(MediaBlob.objects.get(pk=orphan.pk).refs, 2)
+        self.assertTrue(self.storage.exists(orphan.name))
+
+
+class OrderExportPermissionTests(TestCase):
+    def staff(self, username, *codenames):
+        user = User.objects.create_user(username, password="pw", is_staff=True)
+        user.user_permissions.set(Permission.objects.filter(codename__in=codenames))
+        return user
+
+    def test_export_needs_order_view_permission(self):
+        url = reverse("admin:gprojectapp_order_export")
+        self.client.force_login(self.staff("clerk"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff("manager", "view_order"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Disposition"].split(";")[0], "attachment")
+
+    def test_download_limited_to_own_exports(self):
+        owner = self.staff("owner", "view_orderexport")
+        order_export = OrderExport.objects.create(status="done", requested_by=owner)
+        url = reverse("admin:gprojectapp_orderexport_download", args=[order_export.id])
+
+        self.client.force_login(self.staff("clerk"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff("other", "view_orderexport"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        changelist = self.client.get(reverse("admin:gprojectapp_orderexport_changelist"))
+        self.assertEqual(list(changelist.context["cl"].queryset), [])
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    # Not TestCase: reads inside a transaction stay on the primary by design.
+    # "replica" mirrors the test database (see DATABASES in settings)
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_go_to_the_replica(self):
+        Category.objects.create(name="Shoes", slug="shoes")
+        with routing("replica"):
+            with CaptureQueriesContext(connections["replica"]) as replica_queries:
+                self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(len(replica_queries), 1)
+        # Outside a request nothing is routed
+        self.assertEqual(Product.objects.all().db, "default")
+
+    def test_writes_and_pinned_reads_go_to_the_primary(self):
+        with routing("replica") as state:
+            self.assertEqual(Product.objects.all().db, "replica")
+            with primary_db():
+                self.assertEqual(Product.objects.all().db, "default")
+            self.assertEqual(Product.objects.all().db, "replica")
+
+            category = Category.objects.create(name="Shoes", slug="shoes")
+            self.assertEqual(category._state.db, "default")
+            self.assertTrue(state.wrote)
+
+    def test_fresh_catalog_reads_use_the_primary_after_a_change(self):
+        with routing("replica"):
+            with fresh_catalog_reads():
+                self.assertEqual(Product.objects.all().db, "replica")
+            cache.set(CATALOG_CHANGED_KEY, True)
+            with fresh_catalog_reads():
+                self.assertEqual(Product.objects.all().db, "default")
+
+    def test_session_writes_do_not_pin(self):
+        from django.contrib.sessions.backends.db import SessionStore
+
+        with routing("replica") as state:
+            SessionStore().create()
+        self.assertFalse(state.wrote)
+
+    def test_write_pins_the_visitor_to_the_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(Product.objects.all().db)
+            if request.GET.get("write"):
+                Category.objects.create(name="Shoes", slug="shoes")
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        cookie = "db_primary_until"
+
+        response = middleware(factory.get("/"))
+        self.assertNotIn(cookie, response.cookies)
+
+        response = middleware(factory.get("/", {"write": "1"}))
+        pinned_until = float(response.cookies[cookie].value)
+        self.assertGreater(pinned_until, time.time())
+
+        request = factory.get("/")
+        request.COOKIES[cookie] = str(pinned_until)
+        middleware(request)
+        request = factory.get("/")
+        request.COOKIES[cookie] = str(time.time() - 1)
+        middleware(request)
+        # Unsafe methods never use the replica
+        middleware(factory.post("/"))
+
+        self.assertEqual(seen, ["replica", "replica", "default", "replica", "default"])
+
+
+@override_settings(STORAGES=FILE_STORAGES)
+class SuggestEntriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Jaggery", slug="jaggery")
+        self.product = Product.objects.create(name="Jaggery cubes", category=self.category, price=Decimal("90"))
+        user = User.objects.create_user("buyer")
+        self.orders = [
+            Order.objects.create(user=user, product=self.product, quantity=1, total_price=90, address="a", phone="1")
+            for _ in range(2)
+        ]
+
+    def test_orders_keep_sold_up_to_date(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.sold, 2)
+        self.orders[0].delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.sold, 1)
+
+    def test_entries_are_built_once_and_shared(self):
+        version, entries = suggest.shared_entries()
+        self.assertEqual(
+            {(entry.label, entry.popularity) for entry in entries},
+            {("Jaggery cubes", 2), ("Jaggery", 3)},
+        )
+        # Another worker loads them without touching the database
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest.shared_entries(), (version, entries))
+            self.assertIsNone(suggest.shared_entries(version))
+
+    def test_rebuilds_are_debounced(self):
+        version, _ = suggest.shared_entries()
+        Product.objects.create(name="Jaggery powder", category=self.category, price=Decimal("60"))
+        self.assertNotEqual(catalog_version(), version)
+        with self.assertNumQueries(0):
+            self.assertIsNone(suggest.shared_entries(version))
+
+        later = time.time() + suggest.REBUILD_INTERVAL
+        with mock.patch("gprojectapp.suggest.time.time", return_value=later):
+            mark_catalog_import()
+            with self.assertNumQueries(0):
+                self.assertIsNone(suggest.shared_entries(version))
+            mark_catalog_import(running=False)
+            new_version, entries = suggest.shared_entries(version)
+        self.assertEqual(new_version, catalog_version())
+        self.assertIn("Jaggery powder", {entry.label for entry in entries})
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import MediaUpload, UploadChunk
+
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# Magic numbers checked against the first bytes of the upload
+MEDIA_SIGNATURES = (
+    ("image", "image/jpeg", lambda head: head.startswith(b"\xff\xd8\xff")),
+    ("image", "image/png", lambda head: head.startswith(b"\x89PNG\r\n\x1a\n")),
+    ("image", "image/webp", lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP"),
+    ("video", "video/mp4", lambda head: head[4:8] == b"ftyp" and head[8:10] != b"qt"),
+    ("video", "video/quicktime", lambda head: head[4:8] == b"ftyp" and head[8:10] == b"qt"),
+    ("video", "video/webm", lambda head: head.startswith(b"\x1a\x45\xdf\xa3")),
+)
+SNIFF_SIZE = 16
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_media_type(head):
+    for kind, content_type, matches in MEDIA_SIGNATURES:
+        if matches(head):
+            return kind, content_type
+    return None, None
+
+
+# -------------------- UPLOAD SESSION --------------------
+def start_upload(user, kind, filename, size):
+    """Validate the declared file before any bytes are sent."""
+    limits = settings.REVIEW_UPLOAD_MAX_SIZE
+    if kind not in limits:
+        raise UploadError("Only image and video uploads are supported.")
+    if size <= 0:
+        raise UploadError("Empty file.")
+    if size > limits[kind]:
+        raise UploadError(f"File too large (max {limits[kind] // (1024 * 1024)}MB).", status=413)
+
+    return MediaUpload.objects.create(
+        user=user,
+        kind=kind,
+        filename=get_valid_filename(os.path.basename(filename)) or kind,
+        size=size,
+    )
+
+
+def append_chunk(upload, stream, offset, length):
+    """
+    Read one chunk of the request body, a block at a time, and store it as an
+    UploadChunk row. Offsets must follow on from what was already received,
+    so a client resumes by asking for the current offset and sending from there.
+    """
+    if upload.status != "uploading":
+        raise UploadError("Upload already finished.", status=409)
+    if offset != upload.received:
+        raise UploadError("Offset does not match the bytes received so far.", status=409)
+    if length <= 0 or offset + length > upload.size:
+        raise UploadError("Chunk goes past the declared file size.", status=413)
+
+    data = bytearray()
+    if offset == 0:
+        data += stream.read(min(SNIFF_SIZE, length))
+        kind, content_type = sniff_media_type(bytes(data))
+        if kind != upload.kind:
+            MediaUpload.objects.filter(pk=upload.pk, status="uploading").update(status="failed", updated_at=timezone.now())
+            upload.status = "failed"
+            raise UploadError("File content does not look like a supported image or video.", status=415)
+        upload.content_type = content_type
+
+    try:
+        while len(data) < length:
+            block = stream.read(min(READ_BLOCK_SIZE, length - len(data)))
+            if not block:
+                break
+            data += block
+    finally:
+        # Keep whatever arrived, even from an interrupted request
+        if data:
+            save_chunk(upload, offset, bytes(data))
+    return upload
+
+
+def save_chunk(upload, offset, data):
+    received = offset + len(data)
+    status = "complete" if received == upload.size else "uploading"
+    with transaction.atomic():
+        # Only one request can move `received` on from this offset; a
+        # concurrent one sending the same chunk matches no row and gets a 409
+        claimed = MediaUpload.objects.filter(pk=upload.pk, status="uploading", received=offset).update(
+            received=received, status=status, content_type=upload.content_type, updated_at=timezone.now(),
+        )
+        if not claimed:
+            upload.refresh_from_db(fields=["received", "status"])
+            raise UploadError("Offset does not match the bytes received so far.", status=409)
+        UploadChunk.objects.create(upload=upload, offset=offset, data=data)
+    upload.received, upload.status = received, status
+
+
+def claim_uploads(review, upload_ids):
+    """
+    Attach the review author's finished, unattached uploads to the review, at
+    most one image and one video; returns how many were attached. The update
+    only takes uploads still unattached, so when two submits race for the
+    same uploads each one goes to a single review.
+    """
+    ids = []
+    for value in upload_ids:
+        try:
+            ids.append(uuid.UUID(value))
+        except ValueError:
+            continue
+    unattached = MediaUpload.objects.filter(user=review.user, status="complete", review__isnull=True)
+    by_kind = {upload.kind: upload.id for upload in unattached.filter(id__in=ids).only("id", "kind")}
+    return unattached.filter(id__in=by_kind.values()).update(review=review)
+
+
+# -------------------- BACKGROUND STORAGE --------------------
+def store_upload(upload):
+    """Hand a finished upload to the storage backend and attach it to its review."""
+    review = upload.review
+    field = review.image if upload.kind == "image" else review.video
+    try:
+        # Reassembled in this process's own temp dir, a chunk at a time
+        with tempfile.TemporaryFile() as f:
+            for data in upload.chunks.order_by("offset").values_list("data", flat=True).iterator(chunk_size=1):
+                f.write(data)
+            f.seek(0)
+            field.save(upload.filename, File(f, upload.filename), save=False)
+    except Exception:
+        upload.status = "failed"
+        upload.save(update_fields=["status", "updated_at"])
+        review.media_status = "failed"
+        review.save(update_fields=["media_status"])
+        raise
+
+    upload.status = "stored"
+    upload.save(update_fields=["status", "updated_at"])
+    upload.chunks.all().delete()
+
+    if not review.uploads.exclude(status="stored").exists():
+        review.media_status = "ready"
+    review.save(update_fields=[upload.kind, "has_media", "media_status"])
+
+
+def pending_uploads():
+    return MediaUpload.objects.filter(status="complete", review__isnull=False).select_related("review")
+
+
+def expire_stale_uploads(max_age=timedelta(days=1)):
+    """
+    Drop uploads that were never finished or never attached to a review
+    (their chunks go with them), and the chunks of attached ones that failed.
+    """
+    cutoff = timezone.now() - max_age
+    UploadChunk.objects.filter(upload__status="failed", upload__updated_at__lt=cutoff).delete()
+    stale = MediaUpload.objects.filter(updated_at__lt=cutoff, review__isnull=True).exclude(status="stored")
+    return stale.delete()[1].get(MediaUpload._meta.label, 0)
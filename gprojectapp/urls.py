@@ -1,18 +1,21 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('remove-from-cart/<str:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('clear-from-cart/<str:product_id>/', views.clear_from_cart, name='clear_from_cart'),
     path('clear-cart/', views.clear_cart, name='clear_cart'),
+    path('cart/summary/', views.cart_summary, name='cart_summary'),
     path('update-cart/<str:product_id>/<str:action>/', views.update_cart, name='update_cart'),
 
 
     # Checkout flow
     path('checkout/', views.checkout, name='checkout'),
     path('checkout/address/', views.address_page, name='address_page'),
+    path('checkout/pincode/<str:pincode>/', views.pincode_lookup, name='pincode_lookup'),
     path('checkout/payment/', views.payment_page, name='payment_page'),
     path('checkout/confirmation/', views.order_confirmation, name='order_confirmation'),
 
@@ -26,8 +29,18 @@ urlpatterns = [
     path('orders/<int:order_id>/track/', views.track_order, name='track_order'),
     path("orders/<int:order_id>/track/", views.track_order, name="track_order"),
 path("orders/<int:order_id>/track/api/", views.track_order_api, name="track_order_api"),
+    path("api/orders/changes/", views.order_changes_api, name="order_changes_api"),
+    path("metrics", views.metrics, name="metrics"),
+    path("monitoring/rate-limits/", views.rate_limit_stats, name="rate_limit_stats"),
+    path("monitoring/profiles/", views.profiles, name="profiles"),
+    path("monitoring/profiles/<str:url_name>/", views.profile_detail, name="profile_detail"),
     path('products/<int:product_id>/', views.product_detail, name='product_detail'),
+    path('products/<int:product_id>/reviews/', views.product_reviews, name='product_reviews'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
      path("search/", views.search_products, name="search_products"),
+    path("search/suggest/", views.search_suggest, name="search_suggest"),
+    re_path(r"^(?P<name>sitemap(-[a-z0-9-]+)?\.xml)$", views.sitemap_file, name="sitemap_file"),
     path('search/', views.product_list, name='search'),
       path("category/<int:category_id>/", views.products_by_category, name="products_by_category"),
     path("subcategory/<int:subcategory_id>/", views.products_by_subcategory, name="products_by_subcategory"),
@@ -1,49 +1,79 @@
+import base64
+import json
 from math import ceil
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
-from django.contrib import messages
+from django.http import JsonResponse, HttpResponse, Http404
+from django.middleware.csrf import get_token
+from django.contrib import admin, messages
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import logout
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_POST
+from django.views.static import serve
+from django.conf import settings
+from django.contrib.auth import authenticate, logout
 from django.template.loader import render_to_string
-from django.db.models import Q
 from django.db import transaction
 from .models import Category, SubCategory, Product
 
 # Import models
-from .models import Product, Contact, Order, UserProfile, Review, Banner, Category, SubCategory
+from .models import Product, Contact, Order, UserProfile, Review, Banner, Category, SubCategory, MediaUpload
 from .forms import UserProfileForm
+from .cache import anonymous_page_cache, catalog_version, fresh_catalog_reads
+from .routers import primary_db
+from .ratelimit import rate_limit, rate_limit_counters
+from .metrics import CARTS_CREATED, ORDER_LINES, ORDER_REVENUE, ORDERS_PLACED, render_metrics
+from .cart import CartError, apply_operations, summarize
+from .profiling import clear_profiles, flame_rects, load_stacks, load_summaries, profile_token, profiled_routes, route_stats
+from .loaders import load_product_detail
+from .reviews import review_page, REVIEW_SORTS
+from .recommendations import frequently_bought_with, recommended_for_cart
+from .suggest import suggest
+from .search import search_facets, search_params, search_product_ids
+from .orders import ORDER_STATUSES, order_page, order_status_counts
+from .order_events import FEED_BATCH_SIZE, FEED_MAX_BATCH_SIZE, event_json, order_changes
+from .listing import listing_context, product_cards_by_category, product_cards_in_order
+from .promotions import price_cart, product_offer
+from .pincodes import PINCODE_RE, expected_delivery, lookup_pincode, seconds_until_tomorrow
+from .sitemaps import refresh_if_stale
+from .context_processors import menu_categories
+from .uploads import UploadError, start_upload, append_chunk, claim_uploads
 
 
 # -------------------- HOME PAGE --------------------
+@anonymous_page_cache
 def index(request):
     allProds = []
 
-    # Only get categories that have products
-    categories = Category.objects.filter(product__isnull=False).distinct()
+    # One narrow query for every card; categories come from the menu cache
+    cards = product_cards_by_category(Product.objects.all())
 
-    for cat in categories:
-        prod = Product.objects.filter(category=cat)
+    # Only categories that have products
+    for cat in menu_categories():
+        prod = cards.get(cat.id)
+        if not prod:
+            continue
         n = len(prod)
         nSlides = ceil(n / 4)
         allProds.append([prod, range(1, nSlides + 1), nSlides, cat])
 
-    cart_count = sum(item["quantity"] for item in request.session.get("cart", {}).values())
-    return render(request, 'index.html', {'allProds': allProds, 'cart_count': cart_count})
+    return render(request, 'index.html', {'allProds': allProds})
 
 
 # -------------------- BANNERS --------------------
 def home(request):
     banners = Banner.objects.filter(is_active=True).order_by('-created_at')
-    cart_count = sum(item["quantity"] for item in request.session.get("cart", {}).values())
-    return render(request, 'home.html', {'banners': banners, 'cart_count': cart_count})
+    return render(request, 'home.html', {'banners': banners})
 
 
 # -------------------- CART FUNCTIONS --------------------
+@rate_limit("cart")
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     color_id = request.GET.get("color") or request.POST.get("color")
 
     cart = request.session.get("cart", {})
+    if not cart:
+        CARTS_CREATED.inc()
     key = f"{product_id}-{color_id}" if color_id else str(product_id)
 
     if key in cart:
@@ -64,6 +94,39 @@ def add_to_cart(request, product_id):
     })
 
 
+@require_POST
+@rate_limit("cart")
+def cart_batch(request):
+    """
+    Apply a batch of cart operations in one session read-modify-write:
+    {"ops": [{"op": "add" | "set" | "remove", "key": "<product id>[-<color id>]", "quantity": n}, ...]}.
+    Either every operation applies or none does; the response is the full cart summary.
+    """
+    previous = request.session.get("cart", {})
+    try:
+        operations = json.loads(request.body).get("ops")
+        cart = apply_operations(previous, operations)
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "Expected a JSON object with an \"ops\" list."}, status=400)
+    except CartError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if cart and not previous:
+        CARTS_CREATED.inc()
+    request.session["cart"] = cart
+    return JsonResponse(summarize(cart))
+
+
+def cart_summary(request):
+    """Per-visitor bits punched into pages served from the shared page cache."""
+    cart = request.session.get("cart", {})
+    return JsonResponse({
+        "cart_count": sum(item["quantity"] for item in cart.values()),
+        "csrf_token": get_token(request),
+    })
+
+
+@rate_limit("cart")
 def remove_from_cart(request, product_id):
     cart = request.session.get('cart', {})
 
@@ -82,6 +145,7 @@ def remove_from_cart(request, product_id):
 
 
 
+@rate_limit("cart")
 def clear_from_cart(request, product_id):
     cart = request.session.get('cart', {})
     cart.pop(product_id, None)
@@ -96,6 +160,7 @@ def clear_cart(request):
     return redirect('checkout')
 
 
+@rate_limit("cart")
 def update_cart(request, product_id, action):
     cart = request.session.get('cart', {})
 
@@ -118,122 +183,189 @@ def update_cart(request, product_id, action):
     return redirect('checkout')
 
 # -------------------- ADDRESS PAGE --------------------
+ADDRESS_FIELDS = ("full_name", "phone", "address_line", "city", "state", "pincode")
+
+
 @login_required
+@primary_db()
 def address_page(request):
     cart = request.session.get("cart", {})
     if not cart:
         messages.error(request, "Your cart is empty.")
         return redirect("index")
 
-    cart_items = []
-    total_price = 0
-    for key, item in cart.items():
-        product = Product.objects.get(id=item["product_id"])
-        qty = item["quantity"]
-        subtotal = product.price * qty
-        cart_items.append({
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "quantity": qty,
-            "subtotal": subtotal,
-            "image": product.image,
-            "color": item.get("color"),
-        })
-        total_price += subtotal
+    priced = price_cart(cart)
 
+    address, pincode_error = {}, None
     if request.method == "POST":
-        request.session["full_name"] = request.POST.get("full_name")
-        request.session["phone"] = request.POST.get("phone")
-        request.session["address_line"] = request.POST.get("address_line")
-        request.session["city"] = request.POST.get("city")
-        request.session["state"] = request.POST.get("state")
-        request.session["pincode"] = request.POST.get("pincode")
-        return redirect("payment_page")
+        address = {field: request.POST.get(field, "").strip() for field in ADDRESS_FIELDS}
+        place = lookup_pincode(address["pincode"])
+        if place is None and (settings.PINCODE_REQUIRE_KNOWN or not PINCODE_RE.match(address["pincode"])):
+            pincode_error = "Please enter a valid 6-digit pincode."
+        elif place is not None and not place.serviceable:
+            pincode_error = f"Sorry, we don't deliver to {place.city} ({place.pincode}) yet."
+        else:
+            if place is not None:
+                # The index is authoritative for the state; the city may be a locality
+                address["city"] = address["city"] or place.city
+                address["state"] = place.state
+            request.session.update(address)
+            return redirect("payment_page")
+
+    return render(request, "address.html", {
+        "address": address,
+        "pincode_error": pincode_error,
+        "cart_items": priced.lines,
+        "subtotal": priced.subtotal,
+        "discount": priced.discount,
+        "total_price": priced.total,
+    })
 
-    return render(request, "address.html", {"cart_items": cart_items, "total_price": total_price})
+
+def pincode_lookup(request, pincode):
+    """City, state and delivery estimate for the address form, from the offline pincode index."""
+    place = lookup_pincode(pincode)
+    if place is None:
+        return JsonResponse({"error": "Unknown pincode."}, status=404)
+    delivery_date = expected_delivery(place)
+    response = JsonResponse({
+        **place._asdict(),
+        "expected_delivery": delivery_date.isoformat() if delivery_date else None,
+    })
+    # The estimate is counted from today, so it mustn't be reused after midnight
+    response["Cache-Control"] = f"public, max-age={min(3600, seconds_until_tomorrow())}"
+    return response
 
 
 # -------------------- PAYMENT PAGE --------------------
 @login_required
+@primary_db()
 def payment_page(request):
     cart = request.session.get("cart", {})
     if not cart:
         messages.error(request, "Your cart is empty.")
         return redirect('index')
 
-    total_price = 0
-    for key, item in cart.items():
-        product = Product.objects.get(id=item["product_id"])
-        qty = item["quantity"]
-        total_price += product.price * qty
+    priced = price_cart(cart)
 
     if request.method == 'POST':
         payment_method = request.POST.get('payment_method')
         request.session['payment_method'] = payment_method
         return redirect('order_confirmation')
 
-    return render(request, 'payment.html', {'total_price': total_price})
+    return render(request, 'payment.html', {'total_price': priced.total})
 
 
 # -------------------- CHECKOUT PAGE --------------------
 @login_required
+@primary_db()
 def checkout(request):
     cart = request.session.get("cart", {})
     if not cart:
         messages.error(request, "Your cart is empty.")
         return redirect('index')
 
-    cart_items = []
-    total_price = 0
-    for key, item in cart.items():
-        product = Product.objects.get(id=item["product_id"])
-        qty = item["quantity"]
-        subtotal = product.price * qty
-        cart_items.append({
-            "key": key,   # cart key (product_id or product_id-color)
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "quantity": qty,
-            "subtotal": subtotal,
-            "image": product.image,
-            "color": item.get("color"),
-        })
-        total_price += subtotal
-
-    return render(request, "checkout.html", {"cart_items": cart_items, "total_price": total_price})
+    priced = price_cart(cart)
+    return render(request, "checkout.html", {
+        "cart_items": priced.lines,
+        "subtotal": priced.subtotal,
+        "discount": priced.discount,
+        "total_price": priced.total,
+        "recommendations": recommended_for_cart([item["id"] for item in priced.lines]),
+    })
 
 # -------------------- PRODUCT DETAIL & REVIEW --------------------
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    reviews = product.reviews.all()
+    with fresh_catalog_reads():
+        product = load_product_detail(product_id)
 
     if request.method == "POST" and request.user.is_authenticated:
         rating = request.POST.get("rating")
         comment = request.POST.get("comment")
-        image = request.FILES.get("image")
-        video = request.FILES.get("video")
-
-        Review.objects.create(
-            product=product,
-            user=request.user,
-            rating=rating,
-            comment=comment,
-            image=image,
-            video=video,
-        )
+        # Media arrives beforehand through the chunked upload endpoints and is
+        # moved to storage by the process_uploads worker
+        with transaction.atomic():
+            review = Review.objects.create(
+                product=product,
+                user=request.user,
+                rating=rating,
+                comment=comment,
+                media_status="none",
+            )
+            if claim_uploads(review, request.POST.getlist("upload_ids")):
+                Review.objects.filter(pk=review.pk).update(media_status="processing")
         return redirect("product_detail", product_id=product.id)
 
+    reviews, next_cursor = review_page(product.id)
     return render(request, "product_detail.html", {
         "product": product,
         "reviews": reviews,
-        "average_rating": product.average_rating(),
+        "next_cursor": next_cursor,
+        "rating_summary": product.get_rating_summary(),
+        "frequently_bought": frequently_bought_with(product.id),
+        "offer": product_offer(product),
+        "catalog_version": catalog_version(),
     })
 
 
+def product_reviews(request, product_id):
+    """Next page of the review feed as an HTML fragment, for "Load more"."""
+    sort = request.GET.get("sort", "recent")
+    if sort not in REVIEW_SORTS:
+        sort = "recent"
+    reviews, next_cursor = review_page(product_id, sort=sort, cursor=request.GET.get("cursor"))
+    html = render_to_string("partials/review_list.html", {"reviews": reviews}, request=request)
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
+# -------------------- REVIEW MEDIA UPLOADS --------------------
+@login_required
+@require_POST
+def upload_start(request):
+    try:
+        size = int(request.POST.get("size", 0))
+        upload = start_upload(request.user, request.POST.get("kind"), request.POST.get("filename", ""), size)
+    except ValueError:
+        return JsonResponse({"error": "Invalid file size."}, status=400)
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+
+    return JsonResponse({
+        "upload_id": str(upload.id),
+        "offset": upload.received,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+    })
+
+
+@login_required
+@primary_db()
+def upload_chunk(request, upload_id):
+    """
+    GET returns how many bytes were received, so an interrupted upload can resume.
+    PATCH appends the request body at the `Upload-Offset` header position.
+    """
+    upload = get_object_or_404(MediaUpload, id=upload_id, user=request.user)
+
+    if request.method == "PATCH":
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            length = int(request.headers.get("Content-Length", ""))
+        except ValueError:
+            return JsonResponse({"error": "Upload-Offset and Content-Length headers are required."}, status=400)
+        if length > settings.UPLOAD_CHUNK_SIZE:
+            return JsonResponse({"error": "Chunk too large."}, status=413)
+
+        try:
+            append_chunk(upload, request, offset, length)
+        except UploadError as e:
+            return JsonResponse({"error": str(e), "offset": upload.received, "status": upload.status}, status=e.status)
+
+    return JsonResponse({"offset": upload.received, "status": upload.status})
+
+
 # -------------------- ORDER FUNCTIONS --------------------
 @login_required
+@primary_db()
 def order_confirmation(request):
     cart = request.session.get("cart", {})
     if not cart:
@@ -243,21 +375,28 @@ def order_confirmation(request):
     phone = request.session.get('phone')
     address = f"{request.session.get('address_line')}, {request.session.get('city')}, {request.session.get('state')} - {request.session.get('pincode')}"
     payment_method = request.session.get('payment_method') or 'cod'
+    delivery_date = expected_delivery(lookup_pincode(request.session.get('pincode')))
 
-    for key, item in cart.items():
-        product = Product.objects.get(id=item["product_id"])
-        qty = item["quantity"]
+    priced = price_cart(cart)
+    for line in priced.lines:
         Order.objects.create(
             user=request.user,
-            product=product,
-            quantity=qty,
-            total_price=product.price * qty,
+            product=line["product"],
+            quantity=line["quantity"],
+            total_price=float(line["total"]),
+            discount=float(line["discount"]),
+            promotion=line["promotion"],
             address=address,
             phone=phone,
             payment_status='Completed' if payment_method != 'cod' else 'Pending',
             status='Pending',
             payment_method=payment_method,
+            expected_delivery=delivery_date,
         )
+    # Only known methods become label values; the session value comes from a form
+    ORDERS_PLACED.inc(payment_method if payment_method in dict(Order.PAYMENT_METHOD_CHOICES) else "other")
+    ORDER_LINES.inc(amount=len(priced.lines))
+    ORDER_REVENUE.inc(amount=float(priced.total))
 
     # Clear session
     keys_to_clear = ['cart', 'full_name', 'phone', 'address_line', 'city', 'state', 'pincode', 'payment_method']
@@ -274,8 +413,18 @@ def order_confirmation(request):
 
 @login_required
 def orders(request):
-    user_orders = Order.objects.filter(user=request.user).order_by('-order_date')
-    return render(request, "orders.html", {"orders": user_orders})
+    status = request.GET.get("status")
+    if status not in ORDER_STATUSES:
+        status = None
+    user_orders, next_cursor = order_page(request.user.id, status=status, cursor=request.GET.get("cursor"))
+    counts = order_status_counts(request.user.id)
+    return render(request, "orders.html", {
+        "orders": user_orders,
+        "next_cursor": next_cursor,
+        "status": status,
+        "status_tabs": [(None, "All", counts["all"])] + [(s, s, counts[s]) for s in ORDER_STATUSES],
+        "is_first_page": not request.GET.get("cursor"),
+    })
 
 
 @login_required
@@ -284,8 +433,10 @@ def track_order(request, order_id):
     return render(request, "track_order.html", {"order": order})
 
 
+@login_required
+@rate_limit("track")
 def track_order_api(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order, id=order_id, user=request.user)
     timeline_html = render_to_string("order_timeline.html", {"order": order})
     return JsonResponse({
         "status": order.status,
@@ -294,6 +445,105 @@ def track_order_api(request, order_id):
     })
 
 
+# -------------------- ORDER CHANGE FEED --------------------
+def staff_api_user(request):
+    """The staff user behind a session or HTTP Basic credentials (for server-to-server consumers), or None."""
+    if request.user.is_authenticated:
+        return request.user if request.user.is_staff else None
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, _, password = base64.b64decode(credentials).decode("utf-8").partition(":")
+    except ValueError:
+        return None
+    user = authenticate(request, username=username, password=password)
+    return user if user is not None and user.is_staff else None
+
+
+def order_changes_api(request):
+    """
+    Order events after `cursor`, oldest first: {"events", "next_cursor", "has_more"}.
+    Start without a cursor, then pass back `next_cursor` each time. `wait=N`
+    holds an empty response up to N seconds for new events (long polling).
+    """
+    if staff_api_user(request) is None:
+        response = JsonResponse({"error": "Staff credentials required."}, status=401)
+        response["WWW-Authenticate"] = 'Basic realm="orders"'
+        return response
+    try:
+        limit = min(max(int(request.GET.get("limit", FEED_BATCH_SIZE)), 1), FEED_MAX_BATCH_SIZE)
+        wait = max(int(request.GET.get("wait", 0)), 0)
+        events, next_cursor, has_more = order_changes(request.GET.get("cursor"), limit, wait)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "events": [event_json(event) for event in events],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    })
+
+
+# -------------------- MONITORING --------------------
+def metrics(request):
+    """Prometheus scrape endpoint, summed over every worker; staff session or Basic auth."""
+    if staff_api_user(request) is None:
+        response = HttpResponse("Staff credentials required.\n", status=401, content_type="text/plain")
+        response["WWW-Authenticate"] = 'Basic realm="metrics"'
+        return response
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@staff_member_required
+def rate_limit_stats(request):
+    """Allowed/limited request counts per rate-limit scope, for dashboards and alerts."""
+    return JsonResponse({"rate_limits": rate_limit_counters()})
+
+
+@staff_member_required
+def profiles(request):
+    """Routes sampled by SamplingProfilerMiddleware, slowest first."""
+    if request.method == "POST":
+        clear_profiles()
+        messages.success(request, "Profiles cleared.")
+        return redirect("profiles")
+    return render(request, "monitoring/profiles.html", {
+        **admin.site.each_context(request),
+        "title": "Request profiles",
+        "routes": profiled_routes(),
+        "enabled": settings.PROFILER_ENABLED,
+        "sample_rate": settings.PROFILER_SAMPLE_RATE,
+        "header": settings.PROFILER_HEADER,
+        "token": profile_token(),
+    })
+
+
+@staff_member_required
+def profile_detail(request, url_name):
+    summaries = load_summaries(url_name)
+    if not summaries:
+        raise Http404("No profiles for this route.")
+    stacks = load_stacks(url_name)
+    if request.GET.get("format") == "collapsed":
+        response = HttpResponse(
+            "".join(f"{stack} {count}\n" for stack, count in stacks.items()), content_type="text/plain; charset=utf-8"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{url_name}.collapsed"'
+        return response
+
+    rects = flame_rects(stacks)
+    return render(request, "monitoring/profile_detail.html", {
+        **admin.site.each_context(request),
+        "title": f"Profile: {url_name}",
+        "url_name": url_name,
+        "route": route_stats(url_name, summaries),
+        "recent": summaries[-20:][::-1],
+        "rects": rects,
+        "flame_height": (max((rect["depth"] for rect in rects), default=0) + 1) * 18,
+        "total_samples": sum(stacks.values()),
+    })
+
+
 # -------------------- PROFILE --------------------
 @login_required
 def profile_view(request):
@@ -353,15 +603,15 @@ def logout_view(request):
     return redirect("index")
 
 # -------------------- OTHER PAGES --------------------
+@anonymous_page_cache
 def product_list(request):
     products = Product.objects.all()
-    cart_count = sum(item["quantity"] for item in request.session.get("cart", {}).values())
-    return render(request, 'product_list.html', {'products': products, 'cart_count': cart_count})
+    return render(request, 'product_list.html', listing_context(products))
 
 
+@anonymous_page_cache
 def about(request):
-    cart_count = sum(item["quantity"] for item in request.session.get("cart", {}).values())
-    return render(request, 'about.html', {'cart_count': cart_count})
+    return render(request, 'about.html')
 
 
 def contact(request):
@@ -374,87 +624,56 @@ def contact(request):
         )
         messages.success(request, "Your message has been sent successfully.")
         return redirect('contact')
-    cart_count = sum(item["quantity"] for item in request.session.get("cart", {}).values())
-    return render(request, 'contact.html', {'cart_count': cart_count})
+    return render(request, 'contact.html')
 
 
 # -------------------- SEARCH & FILTER --------------------
 def search_products(request):
-    query = request.GET.get("q", "")
-    categories = request.GET.getlist("category")  # list of category slugs
-    subcategories = request.GET.getlist("subcategory")  # list of subcategory slugs
-    brands = request.GET.getlist("brand")  # list of brand names
-    min_price = request.GET.get("min_price")
-    max_price = request.GET.get("max_price")
-    rating_filter = request.GET.get("rating")
-    sort_by = request.GET.get("sort_by")
-
-    products = Product.objects.filter(is_active=True)
-
-    # 🔹 Text Search
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(subcategory__name__icontains=query) |
-            Q(brand__icontains=query)
-        )
-
-    # 🔹 Category Slug Filter
-    if categories:
-        products = products.filter(category__slug__in=categories)
-
-    # 🔹 SubCategory Slug Filter
-    if subcategories:
-        products = products.filter(subcategory__slug__in=subcategories)
-
-    # 🔹 Brand Filter
-    # if brands:
-    #     products = products.filter(brand__in=brands)
-
-    # 🔹 Price Range
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
-
-    # 🔹 Rating Filter
-    if rating_filter:
-        products = products.filter(rating__gte=rating_filter)
-
-    # 🔹 Sorting
-    if sort_by == "price_asc":
-        products = products.order_by("price")
-    elif sort_by == "price_desc":
-        products = products.order_by("-price")
-    elif sort_by == "newest":
-        products = products.order_by("-created_at")
-
-    # 🔹 For filters
-    all_categories = Category.objects.all()
-    all_subcategories = SubCategory.objects.all()
-    all_brands = (
-        Product.objects.values_list("brand", flat=True)
-        .distinct()
-        .exclude(brand__isnull=True)
-        .exclude(brand__exact="")
-    )
-
-    return render(request, "product_list.html", {
-        "products": products,
-        "categories": all_categories,
-        "subcategories": all_subcategories,
-        "brands": all_brands,
+    # Filtering works on the normalized parameters; the template echoes the raw ones
+    search = search_params(request.GET)
+    subcategories, brands = search_facets()
+
+    return render(request, "product_list.html", listing_context(
+        product_cards_in_order(search_product_ids(search)),
+        categories=menu_categories(),
+        subcategories=subcategories,
+        brands=brands,
+        query=request.GET.get("q", ""),
+        selected_categories=request.GET.getlist("category"),  # list of slugs
+        selected_subcategories=request.GET.getlist("subcategory"),  # list of slugs
+        selected_brands=request.GET.getlist("brand"),
+        min_price=request.GET.get("min_price"),
+        max_price=request.GET.get("max_price"),
+        rating_filter=request.GET.get("rating"),
+        sort_by=request.GET.get("sort_by"),
+    ))
+
+def search_suggest(request):
+    """Typeahead suggestions for the navbar search box, from the in-memory index."""
+    query = request.GET.get("q", "")[:100]
+    response = JsonResponse({
         "query": query,
-        "selected_categories": categories,  # list of slugs
-        "selected_subcategories": subcategories,  # list of slugs
-        "selected_brands": brands,
-        "min_price": min_price,
-        "max_price": max_price,
-        "rating_filter": rating_filter,
-        "sort_by": sort_by
+        "suggestions": [
+            {"label": s.label, "kind": s.kind, "url": s.url}
+            for s in suggest(query)
+        ],
     })
+    response["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+# -------------------- SITEMAPS --------------------
+def sitemap_file(request, name):
+    """
+    A pre-written sitemap file, served like a static file (conditional GETs
+    get a 304). Never queries the catalog; a stale set is updated in the
+    background.
+    """
+    refresh_if_stale()
+    response = serve(request, name, document_root=settings.SITEMAP_DIR)
+    response["Cache-Control"] = "public, max-age=3600"
+    return response
+
 
 def category_view(request, slug):
     category = get_object_or_404(Category, slug=slug)
@@ -472,27 +691,22 @@ def subcategory_view(request, cat_slug, sub_slug):
         "products": products
     })
 # Products by category
+@anonymous_page_cache
 def products_by_category(request, category_id):
     category = get_object_or_404(Category, id=category_id)
     products = Product.objects.filter(category=category)
-    return render(request, "products_by_category.html", {"category": category, "products": products})
+    return render(request, "product_list.html", listing_context(
+        products, category=category, selected_categories=[category],
+    ))
 
 # Products by subcategory
+@anonymous_page_cache
 def products_by_subcategory(request, subcategory_id):
     subcategory = get_object_or_404(SubCategory, id=subcategory_id)
     products = Product.objects.filter(subcategory=subcategory)
-
-    context = {
-        "subcategory": subcategory,
-        "products": products,
-        # provide defaults so template does not break
-        "selected_categories": [],
-        "selected_subcategories": [subcategory],
-        "selected_brands": [],
-        "min_price": None,
-        "max_price": None,
-    }
-    return render(request, "product_list.html", context)
+    return render(request, "product_list.html", listing_context(
+        products, subcategory=subcategory, selected_subcategories=[subcategory],
+    ))
 
 
 def mega_menu(request):
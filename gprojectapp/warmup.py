@@ -0,0 +1,81 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.template import engines
+from django.urls import get_resolver, URLPattern, URLResolver
+
+from .context_processors import menu_categories
+from .pincodes import pincode_index
+from .promotions import promotion_index
+from .sitemaps import ensure_sitemaps
+from .suggest import warm_suggest_index
+
+
+logger = logging.getLogger(__name__)
+
+
+def compile_urlpatterns(patterns):
+    # Route regexes are compiled lazily on first use; touch them all now
+    for pattern in patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            compile_urlpatterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            pattern.lookup_str
+
+
+def warm_url_resolver():
+    resolver = get_resolver()
+    compile_urlpatterns(resolver.url_patterns)
+    # Builds the reverse lookup tables used by every {% url %}
+    resolver.reverse_dict
+
+
+def warm_templates():
+    """Compile the project's templates into the cached template loader; returns how many."""
+    count = 0
+    for backend in engines.all():
+        for directory in backend.template_dirs:
+            if not str(directory).startswith(str(settings.BASE_DIR)):
+                continue
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith((".html", ".txt")):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory)
+                    try:
+                        backend.get_template(name)
+                        count += 1
+                    except Exception:
+                        logger.warning("Could not precompile template %s", name, exc_info=True)
+    return count
+
+
+WARM_UP_STEPS = (
+    ("url resolver", warm_url_resolver),
+    ("templates", warm_templates),
+    ("menu categories", menu_categories),
+    ("promotions", promotion_index),
+    ("pincode index", pincode_index),
+    ("sitemaps", ensure_sitemaps),
+    ("search suggest index", warm_suggest_index),
+)
+
+
+def warm_up():
+    """
+    Do the work a process would otherwise do on its first requests. Each step
+    is independent and only logged if it fails (e.g. database not migrated).
+    Returns {step: seconds}.
+    """
+    timings = {}
+    for name, step in WARM_UP_STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning("Warm-up step %r failed", name, exc_info=True)
+        timings[name] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,88 @@
+"""
+Gunicorn settings for the web process (see Procfile).
+
+Worker and thread counts are sized from the CPUs and memory the container
+actually gets; WEB_CONCURRENCY and GUNICORN_THREADS override them.
+"""
+import os
+
+
+def cpu_count():
+    # cgroup v2 CPU quota ("max 100000" when unlimited), else the CPUs we may run on
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def memory_limit_mb():
+    # cgroup v2, then v1, then physical memory
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value != "max" and int(value) < 1 << 60:
+                return int(value) // (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 1024
+
+
+# Resident memory of one worker once warm; preloading shares most of the code pages
+WORKER_MEMORY_MB = int(os.environ.get("WORKER_MEMORY_MB", 180))
+
+
+def default_workers():
+    by_cpu = 2 * cpu_count() + 1
+    # Leave a fifth of the memory for the master and the OS
+    by_memory = int(memory_limit_mb() * 0.8) // WORKER_MEMORY_MB
+    return max(1, min(by_cpu, by_memory))
+
+
+workers = int(os.environ.get("WEB_CONCURRENCY") or default_workers())
+# Threads cover requests blocked on the database, Cloudinary or Redis. Each
+# thread keeps its own database connection (CONN_MAX_AGE), so
+# workers * threads must fit the database's connection limit.
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Import and warm the app once in the master (gproject/wsgi.py) so workers
+# share it copy-on-write and start answering immediately
+preload_app = True
+
+# Recycle workers to cap slow memory growth; the jitter keeps them from all
+# restarting at the same moment
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def child_exit(server, worker):
+    # Fold the exited worker's metrics file into the shared archive
+    from gprojectapp.metrics import merge_dead_processes
+
+    merge_dead_processes()
+
+
+def post_worker_init(worker):
+    # The master's caches date from when it started; a recycled worker
+    # refreshes whatever changed since (menu, suggest index) before serving
+    from gprojectapp.warmup import warm_up
+
+    timings = warm_up()
+    worker.log.info(
+        "Worker %s warmed up in %.0f ms", worker.pid, sum(timings.values()) * 1000
+    )